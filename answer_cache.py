@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_DB_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join("index_cache", "answers.sqlite3"))
+# Cosine similarity above which a cached question counts as the same question. text-embedding-ada-002
+# scores nearly all text above 0.7, and different questions about one document often reach 0.93-0.96,
+# while rephrasings of one question usually score 0.97 or more
+DEFAULT_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+DEFAULT_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r'\s+', ' ', question).strip().lower().rstrip("?!. ")
+
+
+def answer_scope(doc_key, settings, model):
+    """Cache scope for answers about one document with given retrieval settings and model"""
+    payload = json.dumps({"doc": doc_key, "settings": settings, "model": model}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Persistent cache of answers with exact and near-duplicate question lookup.
+
+    Exact lookups hash the normalized question. Near-duplicate lookups compare
+    the question embedding with the embeddings of cached questions in the same
+    scope. Entries expire after a TTL and the least recently used entries are
+    evicted beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        db_path=DEFAULT_DB_PATH,
+        threshold=DEFAULT_THRESHOLD,
+        ttl_seconds=DEFAULT_TTL_SECONDS,
+        max_entries=DEFAULT_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        # scope -> (row ids, normalized question vectors)
+        self._vectors = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                question_hash TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB,
+                answer TEXT NOT NULL,
+                payload TEXT,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                UNIQUE (scope, question_hash)
+            );
+            CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+            CREATE INDEX IF NOT EXISTS answers_created ON answers (created);
+        """)
+        self._db.commit()
+
+    def _entry(self, row, match, similarity=1.0):
+        row_id, question, answer, payload = row
+        self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), row_id))
+        self._db.commit()
+        return {
+            "question": question,
+            "answer": answer,
+            "payload": json.loads(payload or "{}"),
+            "match": match,
+            "similarity": similarity,
+        }
+
+    def get_exact(self, scope, question):
+        """Cached entry for the same normalized question, or None"""
+        question_hash = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, question, answer, payload FROM answers"
+                " WHERE scope = ? AND question_hash = ? AND created >= ?",
+                (scope, question_hash, time.time() - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            self.exact_hits += 1
+            return self._entry(row, "exact")
+
+    def _scope_vectors(self, scope):
+        if scope not in self._vectors:
+            rows = self._db.execute(
+                "SELECT id, vector FROM answers WHERE scope = ? AND vector IS NOT NULL AND created >= ?",
+                (scope, time.time() - self.ttl_seconds),
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            matrix = np.vstack([np.frombuffer(row[1], dtype="float32") for row in rows]) if rows else None
+            self._vectors[scope] = (ids, matrix)
+        return self._vectors[scope]
+
+    def get_similar(self, scope, vector):
+        """
+        Cached entry whose question embedding is closest to vector, if above the threshold.
+
+        Counts a miss when nothing qualifies, so call it after get_exact.
+        """
+        query = np.asarray(vector, dtype="float32")
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            ids, matrix = self._scope_vectors(scope)
+            if matrix is not None:
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    row = self._db.execute(
+                        "SELECT id, question, answer, payload FROM answers WHERE id = ? AND created >= ?",
+                        (ids[best], time.time() - self.ttl_seconds),
+                    ).fetchone()
+                    if row is not None:
+                        self.semantic_hits += 1
+                        return self._entry(row, "semantic", float(similarities[best]))
+            self.misses += 1
+            return None
+
+    def lookup(self, scope, question, embed_query):
+        """
+        Look a question up in both layers.
+
+        The question is only embedded when there is no exact hit, and the vector
+        is returned so a miss can reuse it for retrieval and put().
+
+        Args:
+            scope: Scope from answer_scope()
+            question: Question text
+            embed_query: Function embedding a question, or None to skip the
+                near-duplicate layer (e.g. when retrieval must stay offline)
+
+        Returns:
+            (entry or None, question vector or None)
+        """
+        entry = self.get_exact(scope, question)
+        if entry is not None:
+            return entry, None
+        if embed_query is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+        vector = embed_query(question)
+        return self.get_similar(scope, vector), vector
+
+    def put(self, scope, question, vector, answer, payload=None):
+        """Store an answer, then expire and evict old entries"""
+        question_hash = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+        blob = None
+        if vector is not None:
+            vector = np.asarray(vector, dtype="float32")
+            blob = (vector / (np.linalg.norm(vector) or 1.0)).tobytes()
+        now = time.time()
+        with self._lock:
+            replaced = self._db.execute(
+                "SELECT 1 FROM answers WHERE scope = ? AND question_hash = ?", (scope, question_hash)
+            ).fetchone() is not None
+            cursor = self._db.execute(
+                "INSERT OR REPLACE INTO answers"
+                " (scope, question_hash, question, vector, answer, payload, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, question_hash, question, blob, answer, json.dumps(payload or {}), now, now),
+            )
+            row_id = cursor.lastrowid
+            removed = self._db.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl_seconds,)).rowcount > 0
+            if self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0] > self.max_entries:
+                removed |= self._db.execute(
+                    "DELETE FROM answers WHERE id NOT IN"
+                    " (SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,),
+                ).rowcount > 0
+            self._db.commit()
+
+            if removed:
+                # Expired and evicted rows can belong to any scope
+                self._vectors.clear()
+            elif replaced:
+                self._vectors.pop(scope, None)
+            elif scope in self._vectors and blob is not None:
+                ids, matrix = self._vectors[scope]
+                row = np.frombuffer(blob, dtype="float32")[None, :]
+                self._vectors[scope] = (ids + [row_id], row if matrix is None else np.vstack([matrix, row]))
+
+    def clear(self):
+        """Remove every cached answer"""
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+            self._vectors.clear()
+
+    def stats(self):
+        """Lookup counts and hit rate since this cache object was created"""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "lookups": lookups,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,380 @@
+"""
+Headless asyncio HTTP API for indexing PDFs and answering questions about them.
+
+Endpoints:
+    POST /documents                  Upload a PDF (multipart field "file", or a raw
+                                     application/pdf body with ?name=) and queue it for indexing
+    GET  /documents                  List known documents and their ingestion status
+    GET  /documents/{doc_id}         Ingestion status and progress of one document
+    POST /documents/{doc_id}/query   Answer {"question": ...}; optional "retrieval_mode",
+                                     "lexical_weight" and "stream" (server-sent events)
+    GET  /health                     Queue depths and per-stage latency summaries
+    GET  /metrics                    Stage timings and token counters in Prometheus text format
+
+Ingestion and queries run on bounded worker pools; when their queues are full
+the server answers 429 with a Retry-After header instead of piling up work.
+Indexed documents live in a DocumentRegistry, so idle ones are evicted from
+memory under its budget and reloaded from the index cache, and pages without
+a text layer are recognized and merged in the background.
+
+Usage:
+    python api_server.py --host 127.0.0.1 --port 8000
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from answer_cache import AnswerCache
+from document_registry import DocumentRegistry
+from index_cache import content_hash
+from ingest import build_vector_store
+from lexical_index import BM25Index
+from metrics import REGISTRY, span
+from qa_engine import QAEngine
+from retrieval import LEXICAL_WEIGHT, RETRIEVAL_MODE, RETRIEVAL_MODES, HybridRetriever
+from streaming import TokenStreamHandler
+
+API_DATA_DIR = os.getenv("API_DATA_DIR", "api_data")
+# Documents indexed at the same time, and documents allowed to wait for a slot
+API_INGEST_WORKERS = int(os.getenv("API_INGEST_WORKERS", "2"))
+API_INGEST_QUEUE_SIZE = int(os.getenv("API_INGEST_QUEUE_SIZE", "8"))
+# Questions answered at the same time, and questions in flight before answering 429
+API_QUERY_WORKERS = int(os.getenv("API_QUERY_WORKERS", "16"))
+API_MAX_PENDING_QUERIES = int(os.getenv("API_MAX_PENDING_QUERIES", "64"))
+API_MAX_UPLOAD_BYTES = int(float(os.getenv("API_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+# Seconds the status of a finished ingestion is kept; ready documents stay queryable through the registry
+API_JOB_TTL = float(os.getenv("API_JOB_TTL", "3600"))
+# Seconds clients are asked to wait after a 429
+RETRY_AFTER_SECONDS = 1
+
+
+class DocumentJob:
+    """Ingestion state of an uploaded document; its indexes are kept by the registry"""
+
+    def __init__(self, doc_id, name, pdf_bytes):
+        self.doc_id = doc_id
+        self.name = name
+        # Released once the registry has its own copy
+        self.pdf_bytes = pdf_bytes
+        self.status = "queued"
+        self.error = None
+        self.page_count = 0
+        self.pages_done = 0
+        self.chunk_count = 0
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self):
+        """JSON-serializable status"""
+        return {
+            "doc_id": self.doc_id,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "page_count": self.page_count,
+            "pages_done": self.pages_done,
+            "chunk_count": self.chunk_count,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+def document_status(document):
+    """JSON-serializable status of a ready document whose job has expired"""
+    return {
+        "doc_id": document.doc_id,
+        "name": document.name,
+        "status": "ready",
+        "error": None,
+        "page_count": document.meta.get("page_count", 0),
+        "pages_done": document.meta.get("page_count", 0),
+        "chunk_count": document.chunk_count,
+        "created": None,
+        "finished": None,
+    }
+
+
+def too_busy(message):
+    """429 response asking the client to retry later"""
+    return web.json_response(
+        {"error": message}, status=429, headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+class QAService:
+    """Request handlers and worker pools of the HTTP API"""
+
+    def __init__(
+        self,
+        engine=None,
+        data_dir=API_DATA_DIR,
+        ingest_workers=API_INGEST_WORKERS,
+        ingest_queue_size=API_INGEST_QUEUE_SIZE,
+        query_workers=API_QUERY_WORKERS,
+        max_pending_queries=API_MAX_PENDING_QUERIES,
+        registry=None,
+        job_ttl=API_JOB_TTL,
+    ):
+        self.engine = engine or QAEngine(answer_cache=AnswerCache())
+        self.registry = registry or DocumentRegistry(self.engine.embeddings, document_dir=os.path.join(data_dir, "documents"))
+        # doc_id -> DocumentJob of recent uploads; finished ones expire after job_ttl
+        self.jobs = {}
+        self.job_ttl = job_ttl
+        self.ingest_workers = ingest_workers
+        self.ingest_queue = asyncio.Queue(maxsize=ingest_queue_size)
+        self.ingest_executor = ThreadPoolExecutor(max_workers=ingest_workers, thread_name_prefix="ingest")
+        self.query_executor = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix="query")
+        self.max_pending_queries = max_pending_queries
+        self.pending_queries = 0
+        self._worker_tasks = []
+
+    async def start(self, app):
+        """Start the ingestion workers"""
+        self._worker_tasks = [asyncio.create_task(self._ingest_worker()) for _ in range(self.ingest_workers)]
+
+    async def stop(self, app):
+        """Stop the workers and release pooled resources"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self.ingest_executor.shutdown(wait=False, cancel_futures=True)
+        self.query_executor.shutdown(wait=False, cancel_futures=True)
+        self.engine.close()
+
+    async def _ingest_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.ingest_queue.get()
+            try:
+                await loop.run_in_executor(self.ingest_executor, self._ingest, job)
+            finally:
+                self.ingest_queue.task_done()
+
+    def _ingest(self, job):
+        """Open a document in the registry, which loads its indexes from the index cache or builds them"""
+        job.status = "indexing"
+
+        def on_progress(pages_done, page_count, chunk_count):
+            job.pages_done, job.page_count, job.chunk_count = pages_done, page_count, chunk_count
+
+        def build(pdf_path):
+            lexical_index = BM25Index()
+            vector_store, stats = build_vector_store(
+                pdf_path, self.engine.document_embeddings(), on_progress=on_progress, lexical_index=lexical_index
+            )
+            return vector_store, lexical_index, stats
+
+        try:
+            with span("api.open"):
+                document = self.registry.open(job.pdf_bytes, job.name, build)
+            job.page_count = job.pages_done = document.meta.get("page_count", 0)
+            job.chunk_count = document.chunk_count
+            job.status = "ready"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        job.pdf_bytes = None
+        job.finished = time.time()
+
+    def _expire(self):
+        """Drop finished jobs older than job_ttl"""
+        now = time.time()
+        for doc_id, job in list(self.jobs.items()):
+            if job.finished is not None and now - job.finished > self.job_ttl:
+                del self.jobs[doc_id]
+
+    async def _document(self, doc_id):
+        """A ready document from the registry, reloaded from the index cache if it was evicted; None if unknown"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.query_executor, self.registry.get, doc_id)
+
+    async def upload(self, request):
+        """POST /documents"""
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            pdf_bytes, name = None, None
+            async for part in reader:
+                if part.name == "file":
+                    name = part.filename or "document.pdf"
+                    pdf_bytes = await part.read()
+                    break
+            if pdf_bytes is None:
+                return web.json_response({"error": "multipart upload needs a 'file' field"}, status=400)
+        else:
+            pdf_bytes = await request.read()
+            name = request.query.get("name", "document.pdf")
+        if not pdf_bytes.startswith(b"%PDF"):
+            return web.json_response({"error": "body is not a PDF"}, status=400)
+
+        doc_id = content_hash(pdf_bytes)
+        self._expire()
+        job = self.jobs.get(doc_id)
+        if job is not None and job.status != "failed":
+            # A ready job is reused only while the registry can still open its index
+            document = await self._document(doc_id) if job.status == "ready" else None
+            if job.status != "ready" or document is not None:
+                return web.json_response(job.to_dict(), status=200 if job.status == "ready" else 202)
+
+        job = DocumentJob(doc_id, os.path.basename(name), pdf_bytes)
+        try:
+            self.ingest_queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return too_busy("ingestion queue is full")
+        self.jobs[doc_id] = job
+        return web.json_response(job.to_dict(), status=202)
+
+    async def list_documents(self, request):
+        """GET /documents"""
+        self._expire()
+        documents = [job.to_dict() for job in self.jobs.values()]
+        documents += [
+            {"doc_id": doc_id, "name": name, "status": "ready"}
+            for doc_id, name in self.registry.known_documents() if doc_id not in self.jobs
+        ]
+        return web.json_response(documents)
+
+    async def status(self, request):
+        """GET /documents/{doc_id}"""
+        doc_id = request.match_info["doc_id"]
+        job = self.jobs.get(doc_id)
+        if job is not None:
+            return web.json_response(job.to_dict())
+        document = await self._document(doc_id)
+        if document is None:
+            return web.json_response({"error": "unknown document"}, status=404)
+        return web.json_response(document_status(document))
+
+    async def query(self, request):
+        """POST /documents/{doc_id}/query"""
+        doc_id = request.match_info["doc_id"]
+        job = self.jobs.get(doc_id)
+        if job is not None and job.status != "ready":
+            return web.json_response({"error": f"document is {job.status}", **job.to_dict()}, status=409)
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({"error": "body must be JSON"}, status=400)
+        if not isinstance(body, dict):
+            return web.json_response({"error": "body must be a JSON object"}, status=400)
+        try:
+            lexical_weight = float(body.get("lexical_weight", LEXICAL_WEIGHT))
+        except (TypeError, ValueError):
+            lexical_weight = None
+        if lexical_weight is None or not math.isfinite(lexical_weight):
+            return web.json_response({"error": "lexical_weight must be a number between 0 and 1"}, status=400)
+        lexical_weight = min(max(lexical_weight, 0.0), 1.0)
+        question = str(body.get("question", "")).strip()
+        mode = body.get("retrieval_mode", RETRIEVAL_MODE)
+        if not question or mode not in RETRIEVAL_MODES:
+            return web.json_response(
+                {"error": f"needs a question and a retrieval_mode in {', '.join(RETRIEVAL_MODES)}"}, status=400
+            )
+        if self.pending_queries >= self.max_pending_queries:
+            return too_busy("too many questions in flight")
+
+        self.pending_queries += 1
+        try:
+            document = await self._document(doc_id)
+            if document is None:
+                error = "unknown document" if job is None else "document is no longer in the index cache; upload it again"
+                return web.json_response({"error": error}, status=404)
+            retriever = HybridRetriever(document.vector_store, document.lexical_index, mode, lexical_weight)
+            # The answer cache key changes as OCR text is merged into the document
+            if body.get("stream"):
+                return await self._stream_answer(request, retriever, question, doc_id, document.doc_key)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self.query_executor, self.engine.answer, retriever, question, None, document.doc_key
+            )
+            return web.json_response(dict(result, doc_id=doc_id, question=question))
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=502)
+        finally:
+            self.pending_queries -= 1
+
+    async def _stream_answer(self, request, retriever, question, doc_id, doc_key):
+        """Stream answer tokens as server-sent events, ending with a "done" event holding the full result"""
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+        handler = TokenStreamHandler(lambda token: loop.call_soon_threadsafe(tokens.put_nowait, token))
+        answer_future = loop.run_in_executor(self.query_executor, self.engine.answer, retriever, question, handler, doc_key)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(event, data):
+            await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+
+        while True:
+            next_token = asyncio.ensure_future(tokens.get())
+            done, _ = await asyncio.wait({next_token, answer_future}, return_when=asyncio.FIRST_COMPLETED)
+            if next_token in done:
+                await send("token", next_token.result())
+                continue
+            next_token.cancel()
+            break
+        while not tokens.empty():
+            await send("token", tokens.get_nowait())
+
+        try:
+            await send("done", dict(answer_future.result(), doc_id=doc_id, question=question))
+        except Exception as e:
+            await send("error", {"error": str(e)})
+        await response.write_eof()
+        return response
+
+    async def health(self, request):
+        """GET /health"""
+        return web.json_response({
+            "ingest_queue": self.ingest_queue.qsize(),
+            "ingest_queue_size": self.ingest_queue.maxsize,
+            "pending_queries": self.pending_queries,
+            "max_pending_queries": self.max_pending_queries,
+            "documents": self.registry.stats(),
+            "latency": REGISTRY.snapshot()["stages"],
+        })
+
+    async def metrics(self, request):
+        """GET /metrics"""
+        return web.Response(text=REGISTRY.prometheus_text(), content_type="text/plain")
+
+
+def create_app(service=None):
+    """Build the aiohttp application around a QAService"""
+    service = service or QAService()
+    app = web.Application(client_max_size=API_MAX_UPLOAD_BYTES)
+    app["service"] = service
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    app.add_routes([
+        web.post("/documents", service.upload),
+        web.get("/documents", service.list_documents),
+        web.get("/documents/{doc_id}", service.status),
+        web.post("/documents/{doc_id}/query", service.query),
+        web.get("/health", service.health),
+        web.get("/metrics", service.metrics),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API for indexing PDFs and answering questions about them")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        parser.error("OPENAI_API_KEY is not set")
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import time
+# Start of this script run, for APP_PROFILE
+RUN_STARTED = time.perf_counter()
 import os
 import tempfile
 import streamlit as st
@@ -5,19 +8,46 @@ import json
 import base64
 import shutil
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-from langchain_openai import OpenAIEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain.chains.question_answering import load_qa_chain
-from langchain_openai import OpenAI
 from logo import get_logo_html
-from pdfutils import find_page_and_highlight, get_pdf_download_link, cleanup_temp_pdf
+from settings import EMBEDDING_BACKEND, EMBEDDING_BACKENDS, format_stats
+from lexical_index import BM25Index
+from retrieval import LEXICAL_WEIGHT, RETRIEVAL_MODE, RETRIEVAL_MODES, HybridRetriever
+from ingest import build_vector_store, chunk_texts, page_hash, update_vector_store
+from metrics import REGISTRY, observe, span
+# LangChain, FAISS, the OpenAI client and PyMuPDF are imported where they are
+# first needed (building the QA engine, opening a PDF, answering), so the
+# welcome page does not wait for them; the modules above do not import them
 
 # Load environment variables
 load_dotenv()
 
+# Set APP_PROFILE=1 to print how long each section of every script run takes
+APP_PROFILE = os.getenv("APP_PROFILE", "0") == "1"
+run_profile = {"last": RUN_STARTED, "sections": {}}
+
+def profile_mark(section):
+    """Record the time since the previous mark as a section of this script run (APP_PROFILE)"""
+    if not APP_PROFILE:
+        return
+    now = time.perf_counter()
+    run_profile["sections"][section] = now - run_profile["last"]
+    run_profile["last"] = now
+
+def report_profile():
+    """Print the sections of this script run and record them as app.run stages"""
+    if not APP_PROFILE:
+        return
+    total = time.perf_counter() - RUN_STARTED
+    for section, seconds in run_profile["sections"].items():
+        observe(f"app.run.{section}", seconds)
+    observe("app.run", total)
+    sections = ", ".join(f"{section} {seconds * 1000:.1f} ms" for section, seconds in run_profile["sections"].items())
+    print(f"Script run: {total * 1000:.1f} ms ({sections})")
+
+profile_mark("imports")
+
 # Page config
 st.set_page_config(
     page_title="PDF Knowledge Assistant",
@@ -34,7 +64,8 @@ if 'theme' not in st.session_state:
 def toggle_theme():
     st.session_state.theme = 'dark' if st.session_state.theme == 'light' else 'light'
 
-# Custom CSS
+# Custom CSS, built once per theme
+@lru_cache(maxsize=None)
 def get_custom_css(theme):
     if theme == 'dark':
         return """
@@ -272,8 +303,6 @@ def get_custom_css(theme):
 st.markdown(get_custom_css(st.session_state.theme), unsafe_allow_html=True)
 
 # Initialize session state variables
-if 'vector_store' not in st.session_state:
-    st.session_state.vector_store = None
 if 'file_processed' not in st.session_state:
     st.session_state.file_processed = False
 if 'pdf_name' not in st.session_state:
@@ -290,10 +319,22 @@ if 'feedback' not in st.session_state:
     st.session_state.feedback = {}
 if 'pdf_path' not in st.session_state:
     st.session_state.pdf_path = None
-if 'highlighted_pdfs' not in st.session_state:
-    st.session_state.highlighted_pdfs = {}
-if 'pdf_data' not in st.session_state:
-    st.session_state.pdf_data = None
+if 'embedding_stats' not in st.session_state:
+    st.session_state.embedding_stats = None
+if 'doc_id' not in st.session_state:
+    st.session_state.doc_id = None
+if 'search_library' not in st.session_state:
+    st.session_state.search_library = False
+if 'library_filter' not in st.session_state:
+    st.session_state.library_filter = []
+if 'retrieval_mode' not in st.session_state:
+    st.session_state.retrieval_mode = RETRIEVAL_MODE
+if 'lexical_weight' not in st.session_state:
+    st.session_state.lexical_weight = LEXICAL_WEIGHT
+if 'embedding_backend' not in st.session_state:
+    st.session_state.embedding_backend = EMBEDDING_BACKEND
+if 'ingesting' not in st.session_state:
+    st.session_state.ingesting = False
 
 # Check for API key
 api_key = os.getenv("OPENAI_API_KEY")
@@ -301,88 +342,292 @@ if api_key == "your-api-key-here":
     st.error("⚠️ OpenAI API key is not set. Please update your .env file with your API key.")
     st.stop()
 
-def read_pdf(pdf_file):
-    """Extract text from a PDF file"""
-    pdf_reader = PdfReader(pdf_file)
-    st.session_state.page_count = len(pdf_reader.pages)
-    
-    raw_text = ''
-    for page in pdf_reader.pages:
-        content = page.extract_text()
-        if content:
-            raw_text += content
-    
-    st.session_state.char_count = len(raw_text)
-    return raw_text
-
-def split_text(raw_text):
-    """Split text into manageable chunks"""
-    text_splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=900,
-        chunk_overlap=200,
-        length_function=len,
+# Library mode keeps every processed PDF in a shared multi-document corpus
+LIBRARY_ENABLED = bool(os.getenv("CORPUS_DIR"))
+
+@st.cache_resource
+def load_qa_engine(embedding_backend):
+    """Create the QA engine shared by every session using an embedding backend"""
+    from answer_cache import AnswerCache
+    from qa_engine import QAEngine
+    
+    return QAEngine(answer_cache=AnswerCache(), embedding_backend_name=embedding_backend)
+
+@st.cache_resource
+def load_document_registry(embedding_backend):
+    """Open the process-wide store of PDFs indexed with an embedding backend, shared by every session"""
+    from document_registry import DocumentRegistry
+    
+    return DocumentRegistry(load_qa_engine(embedding_backend).embeddings)
+
+@st.cache_resource
+def load_ingest_jobs(embedding_backend):
+    """Process-wide pool indexing PDFs in the background for every session using an embedding backend"""
+    from ingest_jobs import IngestJobs
+    
+    return IngestJobs(load_document_registry(embedding_backend), load_qa_engine(embedding_backend).document_embeddings)
+
+def get_qa_engine():
+    """QA engine for this session's embedding backend"""
+    return load_qa_engine(st.session_state.embedding_backend)
+
+def get_document_registry():
+    """Document registry for this session's embedding backend"""
+    return load_document_registry(st.session_state.embedding_backend)
+
+def get_ingest_jobs():
+    """Background indexing pool for this session's embedding backend"""
+    return load_ingest_jobs(st.session_state.embedding_backend)
+
+@st.cache_resource
+def get_corpus():
+    """Open the process-wide document library, embedded with the configured backend"""
+    from corpus import CorpusIndex
+    
+    return CorpusIndex(
+        os.getenv("CORPUS_DIR"), load_qa_engine(EMBEDDING_BACKEND).embeddings, index_type=os.getenv("CORPUS_INDEX_TYPE", "auto")
     )
-    texts = text_splitter.split_text(raw_text)
-    st.session_state.text_chunks = len(texts)
-    return texts
 
-def create_vector_store(texts):
-    """Create a FAISS vector store from text chunks"""
-    embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-    return FAISS.from_texts(texts, embeddings)
+def library_available():
+    """The library only holds vectors of the configured embedding backend"""
+    return LIBRARY_ENABLED and st.session_state.embedding_backend == EMBEDDING_BACKEND
+
+def add_to_library(document):
+    """Add a shared document to the library unless it is already there"""
+    corpus = get_corpus()
+    if not corpus.contains(document.doc_id):
+        with span("app.library_add"):
+            corpus.add_vector_store(document.doc_id, document.name, document.vector_store, document.meta)
+
+def create_vector_store(pdf_path, on_progress=None):
+    """
+    Stream a PDF into a FAISS vector store and a BM25 index over the same chunks.
+    
+    Returns:
+        (vector_store, lexical_index, stats) with the embedding cache stats in stats
+    """
+    embeddings = get_qa_engine().document_embeddings()
+    lexical_index = BM25Index()
+    vector_store, stats = build_vector_store(pdf_path, embeddings, on_progress=on_progress, lexical_index=lexical_index)
+    stats["embedding_stats"] = embeddings.stats()
+    return vector_store, lexical_index, stats
 
-def answer_question(vector_store, question):
-    """Answer a question using the PDF content"""
-    chain = load_qa_chain(OpenAI(openai_api_key=os.getenv("OPENAI_API_KEY")), chain_type="stuff")
-    docs = vector_store.similarity_search(question)
-    answer = chain.run(input_documents=docs, question=question)
+def answer_question(retriever, question, pdf_path=None, stream_handler=None, doc_key=None):
+    """
+    Answer a question using the PDF content, streaming tokens to stream_handler if given.
     
-    # Get the relevant text chunks
-    relevant_chunks = [doc.page_content for doc in docs]
+    Returns:
+        (answer, highlights, pages, relevant_chunks, cache_match) where
+        highlights lists the (page number, rectangles) matching the best chunk,
+        searched only on the pages it came from; pages are rendered when the
+        source is shown. cache_match is "exact", "semantic" or None for a fresh answer
+    """
+    from pdfutils import find_highlights
     
-    return answer, None, [], relevant_chunks
+    result = get_qa_engine().answer(retriever, question, stream_handler, doc_key)
+    
+    highlights = []
+    best_match = result.get("best_match")
+    if pdf_path and best_match and best_match["pages"]:
+        with span("app.highlight"):
+            highlights = find_highlights(pdf_path, best_match["text"], pages=best_match["pages"])
+    
+    return result["answer"], highlights, result["pages"], result["relevant_chunks"], result["cache_match"]
+
+def display_performance_panel():
+    """Collapsible per-stage timings and token counters of this process"""
+    if not REGISTRY.enabled:
+        return
+    snapshot = REGISTRY.snapshot()
+    if not snapshot["stages"]:
+        return
+    with st.expander("Performance"):
+        registry = get_document_registry().stats()
+        st.caption(
+            f"Shared documents: {registry['documents']} loaded ({registry['mapped']} memory-mapped), "
+            f"{registry['memory_bytes'] / 1024 / 1024:.1f} of {registry['memory_budget'] / 1024 / 1024:.0f} MB"
+        )
+        jobs = get_ingest_jobs().stats()
+        if jobs:
+            st.caption("Indexing jobs: " + ", ".join(f"{count} {status}" for status, count in sorted(jobs.items())))
+        total = snapshot["stages"].get("answer.total")
+        if total:
+            st.caption(
+                f"Answer latency: {total['mean_ms']:.0f} ms mean, "
+                f"{total['max_ms']:.0f} ms max over {total['count']} questions"
+            )
+        st.table([
+            {"Stage": stage, "Count": stats["count"], "Mean ms": round(stats["mean_ms"], 1), "Max ms": round(stats["max_ms"], 1)}
+            for stage, stats in snapshot["stages"].items()
+        ])
+        if snapshot["counters"]:
+            st.table([{"Counter": name, "Value": value} for name, value in snapshot["counters"].items()])
+        st.download_button(
+            "Download metrics (Prometheus)", REGISTRY.prometheus_text(), file_name="metrics.prom", mime="text/plain"
+        )
 
 def display_chat_history():
     """Display the chat history"""
-    for message in st.session_state.chat_history:
+    for index, message in enumerate(st.session_state.chat_history):
         is_user = message["role"] == "user"
         content = message["content"]["answer"] if not is_user else message["content"]
-        display_chat_message(content, is_user)
+        display_chat_message(content, is_user, index)
 
 def process_pdf(uploaded_file):
-    """Process an uploaded PDF file"""
-    with st.spinner("Processing PDF, please wait..."):
-        # Create a permanent file in the app directory
-        os.makedirs("temp_pdfs", exist_ok=True)
-        pdf_path = os.path.join("temp_pdfs", uploaded_file.name)
-        
-        # Save the uploaded file
-        with open(pdf_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
-        
-        st.session_state.pdf_name = uploaded_file.name
-        st.session_state.pdf_path = pdf_path
-        st.session_state.pdf_data = uploaded_file.getvalue()  # Store the PDF data in session state
-        
-        # Process PDF
-        progress_bar = st.progress(0)
-        
-        # Read PDF
-        raw_text = read_pdf(pdf_path)
-        progress_bar.progress(33)
-        
-        # Split text
-        texts = split_text(raw_text)
-        progress_bar.progress(66)
-        
-        # Create vector store
-        st.session_state.vector_store = create_vector_store(texts)
-        progress_bar.progress(100)
-        
+    """
+    Queue an uploaded PDF for indexing in the background.
+    
+    The session follows the job by doc_id, which is also kept in the URL so a
+    reloaded page picks the job or the indexed PDF up again.
+    """
+    job = get_ingest_jobs().submit(uploaded_file.getvalue(), uploaded_file.name)
+    st.session_state.doc_id = job.doc_id
+    st.session_state.pdf_name = uploaded_file.name
+    st.session_state.pdf_path = None
+    st.session_state.ingesting = True
+    st.session_state.file_processed = True
+    st.query_params["doc"] = job.doc_id
+    st.query_params["embeddings"] = st.session_state.embedding_backend
+    st.rerun()
+
+def finish_ingest(job):
+    """Switch the session from its indexing job to the indexed PDF, or report the failure"""
+    st.session_state.ingesting = False
+    document = get_document_registry().get(st.session_state.doc_id) if job is None or job.status == "done" else None
+    if document is None:
+        error = job.error if job is not None and job.error else "indexing was interrupted"
+        st.session_state.file_processed = False
+        st.session_state.doc_id = None
+        st.query_params.clear()
+        st.error(f"Could not process the PDF: {error}")
+        return
+    built = job is not None and job.build_stats is not None
+    use_document(document, st.session_state.pdf_name or document.name, built)
+    if built:
+        st.toast("PDF processed successfully! You can now ask questions.")
+        if st.session_state.embedding_stats:
+            st.toast(format_stats(st.session_state.embedding_stats))
+    else:
+        st.toast("Loaded previously processed PDF.")
+
+@st.fragment(run_every=1.0)
+def display_ingest_progress():
+    """Poll the session's indexing job and switch to the indexed PDF once it is done"""
+    job = get_ingest_jobs().get(st.session_state.doc_id)
+    if job is None or job.done:
+        st.rerun()
+    progress = job.progress()
+    if progress["status"] == "queued":
+        st.progress(0.0, text="Waiting for an indexing worker...")
+        return
+    st.progress(
+        min(progress["pages_done"] / max(progress["page_count"], 1), 1.0),
+        text=f"Indexed {progress['chunk_count']} chunks from {progress['pages_done']}/{progress['page_count']} pages",
+    )
+    if progress["chunk_count"]:
+        st.caption("You can already ask about the pages indexed so far.")
+
+def sync_session_document():
+    """Finish a completed indexing job, or reattach a reloaded page to the PDF named in its URL"""
+    if st.session_state.ingesting:
+        job = get_ingest_jobs().get(st.session_state.doc_id)
+        if job is None or job.done:
+            finish_ingest(job)
+        return
+    doc_id = st.query_params.get("doc")
+    if st.session_state.file_processed or not doc_id:
+        return
+    if st.query_params.get("embeddings") in EMBEDDING_BACKENDS:
+        st.session_state.embedding_backend = st.query_params["embeddings"]
+    job = get_ingest_jobs().get(doc_id)
+    if job is not None and not job.done:
+        st.session_state.doc_id = doc_id
+        st.session_state.pdf_name = job.name
+        st.session_state.ingesting = True
         st.session_state.file_processed = True
+        return
+    document = get_document_registry().get(doc_id)
+    if document is None:
+        st.query_params.clear()
+        return
+    use_document(document, document.name, built=False)
+
+def display_ocr_status():
+    """Caption on pages without a text layer and their background OCR"""
+    document = get_document_registry().get(st.session_state.doc_id)
+    textless = len(document.meta.get("textless_pages", [])) if document else 0
+    if not textless:
+        return
+    status = get_document_registry().ocr_status(document.doc_id)
+    if status is None and not document.meta.get("ocr_pages"):
+        st.caption(f"{textless} pages have no text layer and no OCR engine is available; they are not searchable.")
+    elif status is not None and status["done"] < status["pages"]:
+        st.caption(f"Scanned pages: {status['done']}/{status['pages']} recognized; the rest become searchable as OCR finishes.")
+    else:
+        st.caption(f"Scanned pages: {len(document.meta.get('ocr_pages', []))}/{textless} indexed with OCR.")
+
+def use_document(document, name, built):
+    """Point the session at a shared document"""
+    st.session_state.doc_id = document.doc_id
+    st.session_state.pdf_name = name
+    st.session_state.pdf_path = document.pdf_path
+    st.session_state.page_count = document.meta.get("page_count", 0)
+    st.session_state.char_count = document.meta.get("char_count", 0)
+    st.session_state.text_chunks = document.chunk_count
+    # Embedding stats only describe a build this session triggered
+    st.session_state.embedding_stats = document.build_stats["embedding_stats"] if built and document.build_stats else None
+    if library_available():
+        add_to_library(document)
+    st.session_state.file_processed = True
+    st.query_params["doc"] = document.doc_id
+    st.query_params["embeddings"] = st.session_state.embedding_backend
+
+def update_vector_store_from(previous, pdf_path):
+    """
+    Derive a new revision's indexes from the previous revision's, re-embedding only changed pages.
     
-    st.success("PDF processed successfully! You can now ask questions.")
+    Returns:
+        (vector_store, lexical_index, stats) like create_vector_store
+    """
+    from pdfutils import extract_pages
+    
+    registry = get_document_registry()
+    # The shared copy is read-only and memory-mapped; update a private writable one
+    cached = registry.index_cache.load(previous.key, get_qa_engine().embeddings) if previous else None
+    if cached is None:
+        return create_vector_store(pdf_path)
+    vector_store, _, meta = cached
+    old_page_hashes = meta.get("page_hashes") or [page_hash(page) for page in extract_pages(previous.pdf_path)]
+    embeddings = get_qa_engine().document_embeddings()
+    vector_store, stats = update_vector_store(pdf_path, vector_store, old_page_hashes, embeddings)
+    stats["embedding_stats"] = embeddings.stats()
+    # Chunk positions changed, so the lexical index is rebuilt from the updated store
+    return vector_store, BM25Index.from_texts(chunk_texts(vector_store)), stats
+
+def process_revision(uploaded_file):
+    """Switch the session to a new revision of its PDF, re-indexing only the pages that changed"""
+    previous = get_document_registry().get(st.session_state.doc_id)
+    built = False
+    
+    def build(pdf_path):
+        nonlocal built
+        built = True
+        return update_vector_store_from(previous, pdf_path)
+    
+    with st.spinner("Updating the index to the new revision..."):
+        document = get_document_registry().open(uploaded_file.getvalue(), uploaded_file.name, build)
+        if library_available() and previous is not None and previous.doc_id != document.doc_id:
+            get_corpus().remove_document(previous.doc_id)
+        use_document(document, uploaded_file.name, built)
+    
+    stats = document.build_stats if built else None
+    if stats and "changed_pages" in stats:
+        st.success(
+            f"Updated to the new revision: {len(stats['changed_pages'])} changed pages, "
+            f"{stats['removed_chunks']} chunks removed and {stats['added_chunks']} added."
+        )
+    else:
+        st.success("Loaded the new revision.")
 
 def export_chat_history():
     """Generate a downloadable file with chat history"""
@@ -418,22 +663,48 @@ def export_chat_history():
     href = f'<a href="data:application/json;base64,{b64}" download="{filename}">Download Chat History</a>'
     return href
 
-def display_chat_message(message, is_user=False):
-    """Display a chat message with appropriate styling"""
+def chat_message_html(message, is_user=False):
+    """HTML for a chat message with appropriate styling"""
     avatar = "👤" if is_user else "🤖"
     avatar_class = "user-avatar" if is_user else "assistant-avatar"
     message_class = "user" if is_user else "assistant"
     
-    st.markdown(f"""
+    return f"""
         <div class="chat-message {message_class}">
             <div class="avatar {avatar_class}">{avatar}</div>
             <div class="content">{message}</div>
         </div>
-    """, unsafe_allow_html=True)
+    """
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def display_highlights(content):
+    """Show the highlighted page previews of an answer, with single-page PDF downloads"""
+    from pdfutils import render_highlights
+    
+    pdf_path, doc_id = st.session_state.pdf_path, st.session_state.doc_id
+    highlights = content.get("highlights") or []
+    # Previews are rendered (or found in the highlight cache) only when the source is shown
+    for page_num, image_path in render_highlights(pdf_path, highlights, doc_id):
+        st.image(image_path, caption=f"Page {page_num + 1}")
+    for page_num, spans in highlights:
+        # The page PDF is only rendered when the button is clicked
+        st.download_button(
+            f"Download highlighted page {page_num + 1}",
+            lambda hit=(page_num, spans): read_bytes(render_highlights(pdf_path, [hit], doc_id, fmt="pdf")[0][1]),
+            file_name=f"{os.path.splitext(st.session_state.pdf_name)[0]}-page-{page_num + 1}.pdf",
+            mime="application/pdf", key=f"page_pdf_{doc_id}_{page_num}_{hash(tuple(spans))}",
+        )
+
+def display_chat_message(message, is_user=False, index=None):
+    """Display a chat message with appropriate styling; index is its position in the chat history"""
+    st.markdown(chat_message_html(message, is_user), unsafe_allow_html=True)
     
     # Add "Show Source" button for assistant messages if we have a PDF
     if not is_user and st.session_state.pdf_path and st.session_state.file_processed:
-        if st.button("📖 Show Source", key=f"source_{len(st.session_state.chat_history)}"):
+        if st.button("📖 Show Source", key=f"source_{len(st.session_state.chat_history) if index is None else index}"):
             # Get the last question from chat history
             last_question = next((msg for msg in reversed(st.session_state.chat_history) if msg["role"] == "user"), None)
             if last_question:
@@ -441,6 +712,10 @@ def display_chat_message(message, is_user=False):
                 for msg in reversed(st.session_state.chat_history):
                     if msg["role"] == "assistant" and "relevant_chunks" in msg["content"]:
                         st.markdown("### 📚 Source Text:")
+                        if msg["content"].get("pages"):
+                            page_list = ", ".join(str(page + 1) for page in msg["content"]["pages"])
+                            st.markdown(f"**Pages:** {page_list}")
+                        display_highlights(msg["content"])
                         for i, chunk in enumerate(msg["content"]["relevant_chunks"], 1):
                             st.markdown(f"""
                             <div class="info-card">
@@ -450,6 +725,9 @@ def display_chat_message(message, is_user=False):
                             """, unsafe_allow_html=True)
                         break
 
+sync_session_document()
+profile_mark("setup")
+
 # Sidebar
 with st.sidebar:
     st.markdown(get_logo_html(), unsafe_allow_html=True)
@@ -458,12 +736,26 @@ with st.sidebar:
     
     st.subheader("Upload your PDF")
     uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
+    st.selectbox(
+        "Embeddings",
+        EMBEDDING_BACKENDS,
+        key="embedding_backend",
+        format_func=lambda backend: {"openai": "OpenAI API", "hashing": "Local (hashing)", "onnx": "Local (ONNX model)"}[backend],
+        disabled=st.session_state.file_processed,
+        help="Local backends embed on this machine's CPU without API calls; each backend keeps its own indexes",
+    )
     
     if uploaded_file is not None and not st.session_state.file_processed:
         if st.button("Process PDF"):
             process_pdf(uploaded_file)
     
-    if st.session_state.file_processed:
+    if st.session_state.ingesting:
+        st.markdown("---")
+        st.subheader("Processing")
+        st.caption(st.session_state.pdf_name)
+        display_ingest_progress()
+    
+    if st.session_state.file_processed and not st.session_state.ingesting:
         st.markdown("---")
         st.subheader("PDF Information")
         st.markdown(f"""
@@ -474,23 +766,55 @@ with st.sidebar:
             <p><strong>Text chunks:</strong> {st.session_state.text_chunks}</p>
         </div>
         """, unsafe_allow_html=True)
+        display_ocr_status()
+        
+        revision_file = st.file_uploader(
+            "Upload a new revision", type="pdf", key="revision_file",
+            help="Only the pages that changed since the current revision are re-indexed",
+        )
+        if revision_file is not None and st.button("Update Index"):
+            process_revision(revision_file)
+        
+        if library_available():
+            st.markdown("---")
+            st.subheader("Library")
+            library_docs = get_corpus().documents()
+            doc_names = {doc["doc_id"]: doc["name"] for doc in library_docs}
+            st.caption(
+                f"{len(library_docs)} documents, {sum(doc['chunk_count'] for doc in library_docs):,} chunks, "
+                f"{get_corpus().index_bytes() / 1024 / 1024:.1f} MB index"
+            )
+            st.checkbox("Search the whole library", key="search_library")
+            if st.session_state.search_library:
+                st.multiselect(
+                    "Limit to documents",
+                    options=list(doc_names),
+                    format_func=lambda doc_id: doc_names.get(doc_id, doc_id[:12]),
+                    key="library_filter",
+                )
+        
+        st.markdown("---")
+        st.subheader("Retrieval")
+        st.selectbox(
+            "Retrieval mode",
+            RETRIEVAL_MODES,
+            key="retrieval_mode",
+            help="Hybrid fuses keyword (BM25) and semantic rankings; lexical needs no embedding calls",
+        )
+        if st.session_state.retrieval_mode == "hybrid":
+            st.slider("Keyword weight", 0.0, 1.0, step=0.05, key="lexical_weight")
+        
+        answer_stats = get_qa_engine().answer_cache.stats()
+        if answer_stats["lookups"]:
+            st.caption(
+                f"Answer cache: {answer_stats['hit_rate']:.0%} hit rate "
+                f"({answer_stats['exact_hits']} exact, {answer_stats['semantic_hits']} similar, "
+                f"{answer_stats['misses']} misses)"
+            )
+        display_performance_panel()
         
         if st.button("Process New PDF"):
-            # Clean up any temporary files
-            if st.session_state.pdf_path and os.path.exists(st.session_state.pdf_path):
-                try:
-                    os.remove(st.session_state.pdf_path)
-                except:
-                    pass
-            
-            for pdf_path in st.session_state.highlighted_pdfs.values():
-                if pdf_path and os.path.exists(pdf_path):
-                    try:
-                        os.remove(pdf_path)
-                    except:
-                        pass
-            
-            st.session_state.vector_store = None
+            # The PDF and highlighted pages are shared with other sessions and cleaned up by cache eviction
             st.session_state.file_processed = False
             st.session_state.pdf_name = ""
             st.session_state.page_count = 0
@@ -499,10 +823,14 @@ with st.sidebar:
             st.session_state.chat_history = []
             st.session_state.feedback = {}
             st.session_state.pdf_path = None
-            st.session_state.highlighted_pdfs = {}
-            st.session_state.pdf_data = None
+            st.session_state.embedding_stats = None
+            st.session_state.doc_id = None
+            st.session_state.ingesting = False
+            st.query_params.clear()
             st.rerun()
 
+profile_mark("sidebar")
+
 # Main content
 if not st.session_state.file_processed:
     st.title("📚 PDF Knowledge Assistant")
@@ -566,18 +894,69 @@ else:
             # Add user question to chat history
             st.session_state.chat_history.append({"role": "user", "content": user_question})
             
+            # Show the question and stream the answer into a placeholder as tokens arrive
+            display_chat_message(user_question, is_user=True)
+            answer_placeholder = st.empty()
+            streamed_tokens = []
+            
+            def on_token(token):
+                streamed_tokens.append(token)
+                answer_placeholder.markdown(chat_message_html("".join(streamed_tokens) + "▌"), unsafe_allow_html=True)
+            
+            from streaming import TokenStreamHandler
+            
+            stream_handler = TokenStreamHandler(on_token)
+            
             # Get answer
             with st.spinner("Thinking..."):
                 try:
-                    answer, highlighted_pdf, pages, relevant_chunks = answer_question(st.session_state.vector_store, user_question)
+                    job = get_ingest_jobs().get(st.session_state.doc_id) if st.session_state.ingesting else None
+                    retriever = job.partial_retriever(
+                        st.session_state.retrieval_mode, st.session_state.lexical_weight
+                    ) if job is not None else None
+                    if retriever is not None:
+                        # Still indexing: answer from the chunks indexed so far, without caching the answer
+                        pdf_path = job.pdf_path
+                        doc_key = None
+                    else:
+                        # The shared document may have been evicted since the last rerun; get() reloads it
+                        document = get_document_registry().get(st.session_state.doc_id)
+                        if document is None:
+                            if st.session_state.ingesting:
+                                raise RuntimeError("No pages are indexed yet; please wait a moment")
+                            raise RuntimeError("This PDF is no longer in the index cache; please process it again")
+                        retriever = HybridRetriever(
+                            document.vector_store,
+                            document.lexical_index,
+                            st.session_state.retrieval_mode,
+                            st.session_state.lexical_weight,
+                        )
+                        pdf_path = document.pdf_path
+                        doc_key = document.doc_key
+                    if library_available() and st.session_state.search_library:
+                        # Library answers may come from other documents, so skip highlighting;
+                        # library searches are vector only
+                        from corpus import CorpusView
+                        
+                        library = CorpusView(get_corpus(), st.session_state.library_filter or None)
+                        retriever = HybridRetriever(library)
+                        pdf_path = None
+                        doc_key = library.doc_key()
+                    answer, highlights, pages, relevant_chunks, cache_match = answer_question(
+                        retriever, user_question, pdf_path, stream_handler, doc_key
+                    )
+                    if stream_handler.time_to_first_token is not None:
+                        observe("answer.time_to_first_token", stream_handler.time_to_first_token)
                     # Add assistant answer to chat history
                     st.session_state.chat_history.append({
                         "role": "assistant", 
                         "content": {
                             "answer": answer,
-                            "highlighted_pdf": highlighted_pdf,
+                            "highlights": highlights,
                             "pages": pages,
-                            "relevant_chunks": relevant_chunks
+                            "relevant_chunks": relevant_chunks,
+                            "time_to_first_token": stream_handler.time_to_first_token,
+                            "cache_match": cache_match
                         }
                     })
                 except Exception as e:
@@ -598,7 +977,10 @@ else:
         if st.session_state.chat_history:
             st.markdown(export_chat_history(), unsafe_allow_html=True)
 
-# Cleanup temporary files when the app stops
+profile_mark("main")
+
+# Cleanup temporary files when the app stops; the registry's PDFs under the
+# index cache are kept and deleted along with their index cache entries
 def cleanup_temp_files():
     temp_dir = "temp_pdfs"
     if os.path.exists(temp_dir):
@@ -607,6 +989,11 @@ def cleanup_temp_files():
         except:
             pass
 
-# Register the cleanup function to run on session end
-import atexit
-atexit.register(cleanup_temp_files) 
\ No newline at end of file
+# Register the cleanup function once per process rather than on every script run
+@st.cache_resource
+def register_cleanup():
+    import atexit
+    atexit.register(cleanup_temp_files)
+
+register_cleanup()
+report_profile() 
\ No newline at end of file
@@ -0,0 +1 @@
+"""Benchmarks for the PDF Knowledge Assistant; run modules with `python -m benchmarks.<name>`."""
@@ -0,0 +1,94 @@
+"""
+Compare embedding throughput and query latency of the local CPU backends with
+the remote path (the OpenAI client behind the request scheduler, talking to the
+fake API server with a simulated network latency).
+
+The ONNX backend is included when EMBEDDING_ONNX_MODEL names an exported model,
+both with float32 and int8 weights.
+
+Usage:
+    python -m benchmarks.bench_embeddings --chunks 2000 --queries 200 --latency 0.05
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from langchain_openai import OpenAIEmbeddings
+
+from benchmarks.synthetic import make_paragraph, make_vocabulary
+from embedding_scheduler import ScheduledEmbeddings
+from fake_servers import FakeOpenAIServer
+from ingest import CHUNK_SIZE, EMBEDDING_MODEL
+from local_embeddings import EMBEDDING_ONNX_MODEL, EMBEDDING_THREADS, HashingEmbeddings, OnnxEmbeddings
+
+
+def make_texts(count, words, seed):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    return [make_paragraph(rng, vocabulary, words) for _ in range(count)]
+
+
+def bench_backend(embeddings, chunks, queries):
+    """Chunks per second for one embed_documents call and per-query latency in milliseconds"""
+    embeddings.embed_query(queries[0])
+    start = time.perf_counter()
+    embeddings.embed_documents(chunks)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "chunks_per_second": len(chunks) / elapsed,
+        "query_median_ms": statistics.median(latencies),
+        "query_p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--remote-queries", type=int, default=20, help="Remote queries wait on the network; time fewer")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the fake API server adds to every request")
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    # Chunks of about CHUNK_SIZE characters and questions of about a dozen words
+    chunks = make_texts(args.chunks, CHUNK_SIZE // 7, args.seed)
+    queries = make_texts(args.queries, 12, args.seed + 1)
+
+    results = {"chunks": args.chunks, "threads": args.threads, "remote_latency_seconds": args.latency}
+    with FakeOpenAIServer(latency=args.latency) as server:
+        client = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL, openai_api_key="bench", base_url=server.base_url,
+            max_retries=0, check_embedding_ctx_length=False,
+        )
+        remote = ScheduledEmbeddings(client, model=EMBEDDING_MODEL, tokens_per_minute=0)
+        results["remote"] = bench_backend(remote, chunks, queries[:args.remote_queries])
+
+    results["hashing"] = bench_backend(HashingEmbeddings(threads=args.threads), chunks, queries)
+    if EMBEDDING_ONNX_MODEL:
+        for quantize in (False, True):
+            onnx = OnnxEmbeddings(quantize=quantize, threads=args.threads)
+            results[onnx.model] = bench_backend(onnx, chunks, queries)
+
+    for name, result in results.items():
+        if isinstance(result, dict) and name != "remote":
+            result["throughput_vs_remote"] = result["chunks_per_second"] / results["remote"]["chunks_per_second"]
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
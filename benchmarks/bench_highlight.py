@@ -0,0 +1,123 @@
+"""
+Compare the shingle-indexed matcher behind find_page_and_highlight with the
+original difflib scan over every paragraph of every page.
+
+Usage:
+    python -m benchmarks.bench_highlight --pages 500 --queries 50
+"""
+import argparse
+import difflib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+
+from fitz import open as fitz_open  # PyMuPDF
+
+from benchmarks.synthetic import make_synthetic_pdf
+from fuzzy_index import ParagraphIndex
+from highlight_cache import HighlightCache
+from pdfutils import find_page_and_highlight
+
+
+def legacy_scan(pdf_path, search_text, threshold=0.6):
+    """Matching loop of the original find_page_and_highlight, without annotation"""
+    pdf_document = fitz_open(pdf_path)
+    matching_pages = []
+    search_text = re.sub(r'\s+', ' ', search_text).strip()
+    for page_num, page in enumerate(pdf_document):
+        text = page.get_text()
+        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        for paragraph in paragraphs:
+            paragraph = re.sub(r'\s+', ' ', paragraph).strip()
+            similarity = difflib.SequenceMatcher(None, search_text.lower(), paragraph.lower()).ratio()
+            if similarity > threshold:
+                matching_pages.append(page_num)
+                break
+    pdf_document.close()
+    return matching_pages
+
+
+def make_queries(content, count, drop_rate, seed):
+    """Pick random paragraphs and drop a fraction of their words"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        page_num = rng.randrange(len(content))
+        words = rng.choice(content[page_num]).split()
+        kept = [word for word in words if rng.random() >= drop_rate] or words
+        queries.append((page_num, " ".join(kept)))
+    return queries
+
+
+def time_queries(match, queries):
+    start = time.perf_counter()
+    found = sum(1 for page_num, text in queries if page_num in match(text))
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": len(queries),
+        "total_seconds": elapsed,
+        "ms_per_query": elapsed / max(len(queries), 1) * 1000,
+        "recall": found / max(len(queries), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--paragraphs-per-page", type=int, default=4)
+    parser.add_argument("--words-per-paragraph", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--legacy-queries", type=int, default=5, help="The original scan is slow; time fewer queries")
+    parser.add_argument("--drop-rate", type=float, default=0.1, help="Fraction of query words removed")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    pdf_path = os.path.join(tempfile.mkdtemp(), "bench.pdf")
+    content = make_synthetic_pdf(pdf_path, args.pages, args.paragraphs_per_page, args.words_per_paragraph, args.seed)
+    queries = make_queries(content, args.queries, args.drop_rate, args.seed)
+
+    start = time.perf_counter()
+    index = ParagraphIndex.from_pdf(pdf_path)
+    build_seconds = time.perf_counter() - start
+
+    results = {
+        "pages": args.pages,
+        "paragraphs": len(index.paragraphs),
+        "index_build_seconds": build_seconds,
+        "indexed": time_queries(lambda text: index.best_matches(text, args.threshold), queries),
+        "legacy_scan": time_queries(
+            lambda text: legacy_scan(pdf_path, text, args.threshold), queries[:args.legacy_queries]
+        ),
+    }
+
+    # End to end, including annotation and rendering the matching pages, first
+    # into an empty highlight cache and then again from the cache
+    cache_dir = tempfile.mkdtemp()
+    cache = HighlightCache(cache_dir)
+    for run in ("cold", "warm"):
+        start = time.perf_counter()
+        for _, text in queries:
+            find_page_and_highlight(pdf_path, text, args.threshold, cache=cache)
+        results[f"find_page_and_highlight_{run}_ms_per_query"] = (
+            (time.perf_counter() - start) / max(len(queries), 1) * 1000
+        )
+    results["rendered_kb_per_query"] = sum(size for _, _, size in cache.entries()) / max(len(queries), 1) / 1024
+    results["pdf_kb"] = os.path.getsize(pdf_path) / 1024
+    shutil.rmtree(cache_dir)
+    results["speedup"] = results["legacy_scan"]["ms_per_query"] / max(results["indexed"]["ms_per_query"], 1e-9)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    os.remove(pdf_path)
+
+
+if __name__ == "__main__":
+    main()
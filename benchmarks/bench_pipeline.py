@@ -0,0 +1,277 @@
+"""
+Time every stage of the ingestion and query pipeline on synthetic PDFs with
+deterministic in-process fake embedding and LLM backends, and compare the
+results with a stored baseline.
+
+Stages:
+    read_pdf                  pdfutils.extract_pages
+    split_text                ingest.iter_chunks over the extracted pages
+    embedding                 embedding every chunk through the request scheduler
+    create_vector_store       ingest.build_vector_store (read, split, embed, FAISS and BM25)
+    similarity_search         FAISS similarity search, per query
+    hybrid_search             BM25 + vector retrieval, per query
+    answer_question           QAEngine.answer with the fake LLM, per query
+    highlight_index           building the paragraph index of find_page_and_highlight
+    find_page_and_highlight   pdfutils.find_page_and_highlight with a warm index and cold page cache, per query
+
+Usage:
+    python -m benchmarks.bench_pipeline --pages 10,100 --save-baseline baseline.json
+    python -m benchmarks.bench_pipeline --pages 10,100 --baseline baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+from benchmarks.fakes import HashEmbeddings, make_fake_llm
+from benchmarks.synthetic import make_synthetic_pdf
+from embedding_scheduler import ScheduledEmbeddings, approximate_token_count
+from fuzzy_index import ParagraphIndex
+from ingest import EMBEDDING_MODEL, build_vector_store, get_text_splitter, iter_chunks
+from lexical_index import BM25Index
+from highlight_cache import HighlightCache
+from pdfutils import extract_pages, find_page_and_highlight
+from qa_engine import QAEngine
+from retrieval import HybridRetriever
+
+PACKAGES = ("PyPDF2", "PyMuPDF", "faiss-cpu", "langchain", "langchain-community", "langchain-openai", "numpy")
+
+
+def package_versions():
+    """Installed versions of the libraries the pipeline depends on"""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def summarize(samples):
+    """Milliseconds statistics of a list of durations in seconds"""
+    samples_ms = [seconds * 1000 for seconds in samples]
+    return {
+        "median_ms": statistics.median(samples_ms),
+        "min_ms": min(samples_ms),
+        "max_ms": max(samples_ms),
+        "runs": len(samples_ms),
+    }
+
+
+def timed(function, repeat, warmup=0):
+    """Run function warmup untimed times, then repeat timed times; return (durations, last result)"""
+    for _ in range(warmup):
+        function()
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def make_queries(content, count, seed, words=12):
+    """Questions made of a run of words from random paragraphs"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        paragraph = rng.choice(rng.choice(content)).split()
+        start = rng.randrange(max(len(paragraph) - words, 1))
+        queries.append(" ".join(paragraph[start:start + words]))
+    return queries
+
+
+def scheduled_fake_embeddings(dims):
+    """Fake backend behind the real request scheduler, without throttling, retry delays or tokenizer downloads"""
+    return ScheduledEmbeddings(
+        HashEmbeddings(dims), model=EMBEDDING_MODEL, tokens_per_minute=0, count_tokens=approximate_token_count
+    )
+
+
+def bench_document(pdf_path, content, args):
+    """Time every stage on one document; its caches are written next to pdf_path"""
+    stages = {}
+    queries = make_queries(content, args.queries, args.seed)
+
+    durations, pages = timed(lambda: extract_pages(pdf_path, workers=args.workers), args.repeat, warmup=1)
+    stages["read_pdf"] = summarize(durations)
+
+    durations, chunks = timed(lambda: list(iter_chunks(pages, get_text_splitter())), args.repeat, warmup=1)
+    stages["split_text"] = summarize(durations)
+    texts = [text for text, _ in chunks]
+
+    embeddings = scheduled_fake_embeddings(args.dims)
+    durations, _ = timed(lambda: embeddings.embed_documents(texts), args.repeat, warmup=1)
+    stages["embedding"] = summarize(durations)
+
+    def create():
+        lexical_index = BM25Index()
+        vector_store, _ = build_vector_store(pdf_path, embeddings, workers=args.workers, lexical_index=lexical_index)
+        return vector_store, lexical_index
+
+    durations, (vector_store, lexical_index) = timed(create, args.repeat, warmup=1)
+    stages["create_vector_store"] = summarize(durations)
+
+    per_query = []
+    for query in queries:
+        per_query.extend(timed(lambda: vector_store.similarity_search(query), 1)[0])
+    stages["similarity_search"] = summarize(per_query)
+
+    hybrid = HybridRetriever(vector_store, lexical_index, "hybrid")
+    per_query = []
+    for query in queries:
+        per_query.extend(timed(lambda: hybrid.search(query), 1)[0])
+    stages["hybrid_search"] = summarize(per_query)
+
+    engine = QAEngine(
+        llm=make_fake_llm(), embedding_backend=embeddings, warm_up=False,
+        embedding_cache_path=os.path.splitext(pdf_path)[0] + "-embeddings.sqlite3", count_tokens=approximate_token_count,
+    )
+    retriever = HybridRetriever(vector_store, lexical_index, "vector")
+    per_query = []
+    best_matches = []
+    for query in queries:
+        durations, result = timed(lambda: engine.answer(retriever, query), 1)
+        per_query.extend(durations)
+        best_matches.append(result["best_match"])
+    stages["answer_question"] = summarize(per_query)
+    engine.close()
+
+    durations, _ = timed(lambda: ParagraphIndex.from_pdf(pdf_path), args.repeat, warmup=1)
+    stages["highlight_index"] = summarize(durations)
+
+    # Render into an empty highlight cache so every query pays for rendering
+    cache_dir = tempfile.mkdtemp()
+    cache = HighlightCache(cache_dir)
+    per_query = []
+    for best_match in best_matches:
+        if not best_match:
+            continue
+        durations, _ = timed(
+            lambda: find_page_and_highlight(pdf_path, best_match["text"], pages=best_match["pages"], cache=cache), 1
+        )
+        per_query.extend(durations)
+    shutil.rmtree(cache_dir)
+    if per_query:
+        stages["find_page_and_highlight"] = summarize(per_query)
+
+    return {"pages": len(pages), "chunks": len(texts), "stages": stages}
+
+
+def compare(results, baseline, threshold, min_delta_ms, statistic="min_ms"):
+    """
+    Compare stage times with a baseline.
+
+    A stage regresses when its statistic is more than threshold (as a fraction)
+    slower and more than min_delta_ms slower in absolute terms.
+
+    Returns:
+        (rows, regressions) as lists of dicts
+    """
+    rows = []
+    for document, current in results["documents"].items():
+        base_document = baseline.get("documents", {}).get(document)
+        if not base_document:
+            continue
+        for stage, stats in current["stages"].items():
+            base = base_document["stages"].get(stage)
+            if not base:
+                continue
+            ratio = stats[statistic] / max(base[statistic], 1e-9)
+            rows.append({
+                "document": document,
+                "stage": stage,
+                "baseline_ms": base[statistic],
+                "current_ms": stats[statistic],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold and stats[statistic] - base[statistic] > min_delta_ms,
+            })
+    return rows, [row for row in rows if row["regression"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,100", help="Comma-separated page counts of the synthetic documents")
+    parser.add_argument("--paragraphs-per-page", type=int, default=4)
+    parser.add_argument("--words-per-paragraph", type=int, default=60, help="Controls text density")
+    parser.add_argument("--queries", type=int, default=20, help="Queries timed per document for per-query stages")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each whole-document stage")
+    parser.add_argument("--dims", type=int, default=1536, help="Fake embedding dimensions")
+    parser.add_argument("--workers", type=int, help="Page extraction processes (default: PDF_EXTRACT_WORKERS)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare with results stored at this path")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Store these results as a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before a stage is flagged (0.25 = 25%%)")
+    parser.add_argument(
+        "--statistic", choices=("min", "median"), default="min",
+        help="Timing compared with the baseline; the fastest run is least disturbed by other load (default: %(default)s)",
+    )
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in ("paragraphs_per_page", "words_per_paragraph", "queries", "dims", "seed")}
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "packages": package_versions(),
+        },
+        "config": config,
+        "documents": {},
+    }
+
+    work_dir = tempfile.mkdtemp()
+    for page_count in (int(pages) for pages in args.pages.split(",")):
+        pdf_path = os.path.join(work_dir, f"bench-{page_count}.pdf")
+        content = make_synthetic_pdf(pdf_path, page_count, args.paragraphs_per_page, args.words_per_paragraph, args.seed)
+        print(f"Benchmarking {page_count} pages...", file=sys.stderr)
+        results["documents"][f"pages={page_count}"] = bench_document(pdf_path, content, args)
+        os.remove(pdf_path)
+    shutil.rmtree(work_dir)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Warning: baseline was recorded with different settings", file=sys.stderr)
+        rows, regressions = compare(results, baseline, args.threshold, args.min_delta_ms, f"{args.statistic}_ms")
+        results["comparison"] = {
+            "baseline": args.baseline,
+            "statistic": args.statistic,
+            "threshold": args.threshold,
+            "rows": rows,
+        }
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['document']:>12} {row['stage']:<24} {row['baseline_ms']:10.2f} ms -> "
+                f"{row['current_ms']:10.2f} ms  x{row['ratio']:.2f} {flag}",
+                file=sys.stderr,
+            )
+        failed = bool(regressions)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure recall@k, index memory and query latency of the corpus index for
+every index type and compression, with and without exact re-ranking.
+
+Vectors are random points of a low-dimensional subspace projected to the
+embedding size plus a little noise, which gives them the low intrinsic
+dimension of text embeddings. They are stored once in a temporary corpus; the index is then rebuilt for
+each configuration. Recall is measured against an exact float32 search.
+
+Usage:
+    python -m benchmarks.bench_vectors --chunks 20000 --dims 1536 --queries 200
+    python -m benchmarks.bench_vectors --types flat,hnsw --compressions none,int8,pq --rerank 1,4
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from corpus import COMPRESSIONS, CorpusIndex, choose_compression
+
+
+def make_vectors(count, dims, latent_dims, noise, seed, projection_seed=0):
+    """Unit vectors near a random latent_dims-dimensional subspace shared by every call with the same projection_seed"""
+    projection = np.random.default_rng(projection_seed).standard_normal((latent_dims, dims)).astype("float32")
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, latent_dims)).astype("float32") @ projection
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors += noise / np.sqrt(dims) * rng.standard_normal((count, dims)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_config(corpus, queries, truth, k):
+    """Recall@k against the exact neighbors, plus query latency"""
+    latencies = []
+    found = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = corpus.search_by_vector(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += len({doc.metadata["chunk_id"] for doc, _ in results} & set(expected))
+    latencies.sort()
+    return {
+        "recall_at_k": found / (len(queries) * k),
+        "query_median_ms": latencies[len(latencies) // 2],
+        "query_p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--latent-dims", type=int, default=32, help="Intrinsic dimension of the vectors")
+    parser.add_argument("--noise", type=float, default=0.1, help="Length of the noise added off the subspace")
+    parser.add_argument("--types", default="flat,hnsw,ivf", help="Comma separated index types")
+    parser.add_argument("--compressions", default=",".join(COMPRESSIONS), help="Comma separated compressions")
+    parser.add_argument("--rerank", default="1,4", help="Comma separated re-rank factors (1 = no re-ranking)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.chunks, args.dims, args.latent_dims, args.noise, args.seed + 1)
+    queries = make_vectors(args.queries, args.dims, args.latent_dims, args.noise, args.seed + 2)
+
+    corpus_dir = tempfile.mkdtemp()
+    corpus = CorpusIndex(corpus_dir, index_type="flat")
+    corpus.add_document("bench", "bench", [f"chunk {i}" for i in range(args.chunks)], vectors=vectors)
+    # Chunk ids are assigned in insertion order starting at 1
+    exact = faiss.IndexFlatL2(args.dims)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    truth = truth + 1
+
+    results = {"chunks": args.chunks, "dims": args.dims, "k": args.k, "float32_bytes": vectors.nbytes, "configs": []}
+    for index_type in args.types.split(","):
+        for compression in args.compressions.split(","):
+            corpus.index_type, corpus.compression = index_type, compression
+            start = time.perf_counter()
+            corpus.rebuild(save=False)
+            build_seconds = time.perf_counter() - start
+            index_bytes = int(faiss.serialize_index(corpus.index).nbytes)
+            for rerank in (int(factor) for factor in args.rerank.split(",")):
+                if rerank > 1 and compression == "none":
+                    continue
+                corpus.rerank = rerank
+                config = {
+                    "index_type": index_type,
+                    "compression": choose_compression(compression, args.chunks),
+                    "rerank": rerank,
+                    "index_mb": index_bytes / 1024 / 1024,
+                    "bytes_per_vector": index_bytes / args.chunks,
+                    "build_seconds": build_seconds,
+                }
+                config.update(bench_config(corpus, queries, truth, args.k))
+                results["configs"].append(config)
+                print(
+                    f"{index_type:5} {config['compression']:8} rerank={rerank}  recall@{args.k}={config['recall_at_k']:.3f}  "
+                    f"{config['index_mb']:8.1f} MB  {config['query_median_ms']:.2f} ms"
+                )
+    shutil.rmtree(corpus_dir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import hashlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake import FakeListLLM
+
+FAKE_ANSWER = "This is a deterministic benchmark answer."
+
+
+class HashEmbeddings(Embeddings):
+    """In-process embeddings: a deterministic unit vector seeded by the text's hash"""
+
+    def __init__(self, dims=1536):
+        self.dims = dims
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dims).astype("float32")
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def make_fake_llm():
+    """LLM that always returns FAKE_ANSWER"""
+    return FakeListLLM(responses=[FAKE_ANSWER])
@@ -0,0 +1,59 @@
+import random
+
+from fitz import Rect
+from fitz import open as fitz_open  # PyMuPDF
+
+
+def make_vocabulary(size=5000, seed=0):
+    """Deterministic list of pseudo-words"""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def make_paragraph(rng, vocabulary, words):
+    """Random paragraph with a few numbers mixed in"""
+    tokens = []
+    for _ in range(words):
+        if rng.random() < 0.03:
+            tokens.append(str(rng.randint(1, 9999)))
+        else:
+            tokens.append(rng.choice(vocabulary))
+    return " ".join(tokens).capitalize() + "."
+
+
+def make_synthetic_pdf(path, pages=100, paragraphs_per_page=4, words_per_paragraph=60, seed=0):
+    """
+    Write a PDF of random paragraphs, each in its own text block.
+
+    Args:
+        path: Output path
+        pages: Number of pages
+        paragraphs_per_page: Paragraphs (text blocks) per page
+        words_per_paragraph: Words per paragraph; controls text density
+        seed: Random seed, so the same arguments always produce the same document
+
+    Returns:
+        List of pages, each a list of its paragraph texts
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    document = fitz_open()
+    content = []
+    height = 720 / paragraphs_per_page
+    for _ in range(pages):
+        page = document.new_page()
+        paragraphs = []
+        for i in range(paragraphs_per_page):
+            paragraph = make_paragraph(rng, vocabulary, words_per_paragraph)
+            top = 36 + i * height
+            if page.insert_textbox(Rect(36, top, 576, top + height - 6), paragraph, fontsize=7) < 0:
+                raise ValueError("Paragraph does not fit on the page; lower words_per_paragraph or paragraphs_per_page")
+            paragraphs.append(paragraph)
+        content.append(paragraphs)
+    document.save(path)
+    document.close()
+    return content
@@ -0,0 +1,183 @@
+import os
+
+from langchain.docstore.document import Document
+
+from embedding_scheduler import get_token_counter
+from lexical_index import tokenize
+
+# Most prompt tokens spent on retrieved chunks; 0 disables the budget
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Set to 1 to diversify chunks with maximal marginal relevance
+CONTEXT_MMR = os.getenv("CONTEXT_MMR", "0") == "1"
+# Relevance vs. novelty trade-off of MMR (1.0 = relevance only)
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Candidates retrieved per selected chunk when MMR is on
+MMR_FETCH_MULTIPLIER = 2
+# Text left over after removing overlaps is dropped below this many characters
+MIN_PIECE_CHARS = 40
+
+
+def uncovered_ranges(start, end, covered):
+    """Parts of [start, end) outside the sorted, non-overlapping covered ranges"""
+    ranges = []
+    position = start
+    for covered_start, covered_end in covered:
+        if covered_end <= position:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > position:
+            ranges.append((position, covered_start))
+        position = max(position, covered_end)
+    if position < end:
+        ranges.append((position, end))
+    return ranges
+
+
+def offsets_match(doc, start, end, earlier):
+    """Whether a chunk's offsets agree with its length and with the text of the earlier chunks it overlaps"""
+    if end - start != len(doc.page_content):
+        return False
+    for other_start, other_end, other_text in earlier:
+        overlap_start, overlap_end = max(start, other_start), min(end, other_end)
+        if overlap_start < overlap_end and (
+            doc.page_content[overlap_start - start:overlap_end - start]
+            != other_text[overlap_start - other_start:overlap_end - other_start]
+        ):
+            return False
+    return True
+
+
+def remove_overlap(docs):
+    """
+    Drop text already present in an earlier chunk.
+
+    Chunks of the same document overlap by up to CHUNK_OVERLAP characters.
+    Using their document character offsets, each chunk keeps only the text no
+    earlier chunk covered; chunks left with nothing are dropped. Offsets are
+    only trusted when they span the chunk's text and the overlapping text
+    matches; other chunks (including those of older indexes without offsets)
+    are only dropped when they repeat an earlier one.
+
+    Returns:
+        New list of Documents in the same order
+    """
+    # doc_id -> sorted (start, end) ranges and (start, end, text) of trusted chunks
+    covered = {}
+    trusted = {}
+    seen_texts = set()
+    result = []
+    for doc in docs:
+        start, end = doc.metadata.get("start_index"), doc.metadata.get("end_index")
+        doc_id = doc.metadata.get("doc_id")
+        if start is None or end is None or not offsets_match(doc, start, end, trusted.get(doc_id, [])):
+            if doc.page_content not in seen_texts:
+                seen_texts.add(doc.page_content)
+                result.append(doc)
+            continue
+
+        seen_texts.add(doc.page_content)
+        ranges = covered.setdefault(doc_id, [])
+        pieces = [
+            doc.page_content[piece_start - start:piece_end - start].strip()
+            for piece_start, piece_end in uncovered_ranges(start, end, ranges)
+        ]
+        pieces = [piece for piece in pieces if len(piece) >= MIN_PIECE_CHARS]
+        ranges.append((start, end))
+        ranges.sort()
+        trusted.setdefault(doc_id, []).append((start, end, doc.page_content))
+        if not pieces:
+            continue
+        text = "\n".join(pieces)
+        result.append(doc if text == doc.page_content else Document(page_content=text, metadata=doc.metadata))
+    return result
+
+
+def mmr_select(docs, k, lambda_mult=CONTEXT_MMR_LAMBDA):
+    """
+    Pick k chunks balancing retrieval rank and novelty.
+
+    Relevance decreases linearly with the retrieval rank, and similarity is the
+    Jaccard overlap of the chunks' terms, so no embedding calls are needed.
+    """
+    if len(docs) <= k:
+        return list(docs)
+    terms = [set(tokenize(doc.page_content)) for doc in docs]
+    relevance = [1 - rank / len(docs) for rank in range(len(docs))]
+    selected = [0]
+    while len(selected) < k:
+        best, best_score = None, None
+        for i in range(len(docs)):
+            if i in selected:
+                continue
+            redundancy = max(len(terms[i] & terms[j]) / (len(terms[i] | terms[j]) or 1) for j in selected)
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return [docs[i] for i in selected]
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the context sent to the LLM.
+
+    Overlapping text is removed, chunks are optionally diversified with MMR,
+    and whole chunks are packed in rank order until the token budget is spent.
+    The top chunk is always kept, truncated if it alone exceeds the budget.
+    """
+
+    def __init__(
+        self, model, token_budget=CONTEXT_TOKEN_BUDGET, mmr=CONTEXT_MMR, mmr_lambda=CONTEXT_MMR_LAMBDA, count_tokens=None,
+    ):
+        self.token_budget = token_budget
+        self.mmr = mmr
+        self.mmr_lambda = mmr_lambda
+        self.count_tokens = count_tokens or get_token_counter(model)
+
+    @property
+    def settings(self):
+        """Settings that change the packed context, for answer cache keys"""
+        return {"token_budget": self.token_budget, "mmr": self.mmr, "mmr_lambda": self.mmr_lambda if self.mmr else None}
+
+    def fetch_k(self, k):
+        """Chunks to retrieve for k packed chunks"""
+        return k * MMR_FETCH_MULTIPLIER if self.mmr else k
+
+    def pack(self, docs, k):
+        """
+        Args:
+            docs: Retrieved Documents, best first (fetch_k(k) of them)
+            k: Most chunks to keep
+
+        Returns:
+            (packed Documents, stats) where stats holds the chunk counts and
+            the context tokens before packing (the top k chunks as retrieved),
+            after packing, and saved
+        """
+        tokens_before = sum(self.count_tokens(doc.page_content) for doc in docs[:k])
+        candidates = remove_overlap(docs)
+        candidates = mmr_select(candidates, k, self.mmr_lambda) if self.mmr else candidates[:k]
+
+        packed = []
+        tokens_after = 0
+        for doc in candidates:
+            tokens = self.count_tokens(doc.page_content)
+            if self.token_budget and tokens_after + tokens > self.token_budget:
+                if packed:
+                    continue
+                # Keep the best chunk, cut to the budget by its average characters per token
+                text = doc.page_content[:len(doc.page_content) * self.token_budget // tokens]
+                doc = Document(page_content=text, metadata=doc.metadata)
+                tokens = self.count_tokens(text)
+            packed.append(doc)
+            tokens_after += tokens
+
+        stats = {
+            "retrieved": len(docs),
+            "packed": len(packed),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": max(tokens_before - tokens_after, 0),
+        }
+        return packed, stats
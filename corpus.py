@@ -0,0 +1,568 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+
+DEFAULT_CORPUS_DIR = os.getenv("CORPUS_DIR", "corpus")
+# Index type used by "auto" for a given number of chunks
+FLAT_MAX_CHUNKS = 50_000
+HNSW_MAX_CHUNKS = 1_000_000
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf")
+# How the index stores vectors: float32 as given, float16, 8-bit scalar
+# quantization or product quantization (4x, 4x and ~64x smaller than float32)
+COMPRESSIONS = ("none", "float16", "int8", "pq")
+DEFAULT_COMPRESSION = os.getenv("CORPUS_COMPRESSION", "none")
+# Candidates fetched per result and re-ranked with the exact stored vectors
+# when the index is compressed; 1 disables re-ranking
+DEFAULT_RERANK = int(os.getenv("CORPUS_RERANK", "4"))
+# Bytes per vector of product quantization; 0 picks about dimensions / 16
+PQ_BYTES = int(os.getenv("CORPUS_PQ_BYTES", "0"))
+# PQ codebooks have 256 centroids per sub-vector and FAISS wants 39 training
+# vectors per centroid; smaller corpora use int8 until they grow past it
+PQ_MIN_TRAIN = 256 * 39
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+# Rebuild once this fraction of an HNSW index is deleted entries
+MAX_TOMBSTONE_FRACTION = 0.2
+# Retrain IVF centroids and quantizers once the corpus has grown by this factor
+# since they were trained; 0 never retrains
+RETRAIN_GROWTH = float(os.getenv("CORPUS_RETRAIN_GROWTH", "2"))
+
+# Document and page filters whose allowed chunk ids are kept between queries
+FILTER_CACHE_SIZE = 64
+
+INDEX_FILE = "index.faiss"
+DB_FILE = "corpus.sqlite3"
+
+
+def choose_index_type(chunk_count):
+    """Pick an index type suited to the size of the corpus"""
+    if chunk_count < FLAT_MAX_CHUNKS:
+        return "flat"
+    if chunk_count < HNSW_MAX_CHUNKS:
+        return "hnsw"
+    return "ivf"
+
+
+def choose_compression(compression, chunk_count):
+    """Compression usable for a corpus of this size"""
+    if compression == "pq" and chunk_count < PQ_MIN_TRAIN:
+        return "int8"
+    return compression
+
+
+def pq_bytes(dim, target=PQ_BYTES):
+    """Largest number of PQ sub-quantizers dividing dim, at most target (about dim / 16 by default)"""
+    target = target or max(dim // 16, 1)
+    return max(m for m in range(1, min(target, dim) + 1) if dim % m == 0)
+
+
+SCALAR_QUANTIZERS = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def create_index(index_type, dim, train_vectors=None, compression="none"):
+    """
+    Create an empty FAISS index that accepts explicit chunk ids.
+
+    Args:
+        index_type: "flat", "hnsw" or "ivf"
+        dim: Vector dimensions
+        train_vectors: Vectors used to train IVF centroids and quantizers
+        compression: One of COMPRESSIONS
+
+    Returns:
+        FAISS index supporting add_with_ids
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}; expected one of {COMPRESSIONS}")
+    if compression != "none" and (train_vectors is None or len(train_vectors) == 0):
+        raise ValueError("A compressed index needs training vectors")
+    qtype = SCALAR_QUANTIZERS.get(compression)
+
+    if index_type == "flat":
+        if compression == "none":
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        if compression == "pq":
+            # A single inverted list scans every code like IndexPQ, but supports
+            # search filters and id removal
+            flat_pq = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, 1, pq_bytes(dim), 8)
+            flat_pq.train(train_vectors)
+            flat_pq.nprobe = 1
+            return flat_pq
+        sq = faiss.IndexScalarQuantizer(dim, qtype)
+        sq.train(train_vectors)
+        return faiss.IndexIDMap2(sq)
+    if index_type == "hnsw":
+        if compression == "none":
+            hnsw = faiss.IndexHNSWFlat(dim, HNSW_M)
+        elif compression == "pq":
+            hnsw = faiss.IndexHNSWPQ(dim, pq_bytes(dim), HNSW_M)
+        else:
+            hnsw = faiss.IndexHNSWSQ(dim, qtype, HNSW_M)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+        if compression != "none":
+            hnsw.train(train_vectors)
+        return faiss.IndexIDMap2(hnsw)
+    if index_type == "ivf":
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError("An IVF index needs training vectors")
+        nlist = max(1, min(int(4 * np.sqrt(len(train_vectors))), len(train_vectors) // 39 or 1))
+        quantizer = faiss.IndexFlatL2(dim)
+        if compression == "none":
+            ivf = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        elif compression == "pq":
+            ivf = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_bytes(dim), 8)
+        else:
+            ivf = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype)
+        ivf.train(train_vectors)
+        ivf.nprobe = min(IVF_NPROBE, nlist)
+        return ivf
+    raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+
+
+def _inner_index(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def _index_type_of(index):
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        # Flat PQ is a single-list IVFPQ; IVF corpora are large enough for more lists
+        return "flat" if isinstance(inner, faiss.IndexIVFPQ) and inner.nlist == 1 else "ivf"
+    return "flat"
+
+
+def _compression_of(index):
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "float16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    return "none"
+
+
+def _is_trained(index):
+    """Whether the index learned centroids or quantizer ranges from its training vectors"""
+    return _index_type_of(index) == "ivf" or _compression_of(index) != "none"
+
+
+def _search_params(index, selector):
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=HNSW_EF_SEARCH)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+class CorpusIndex:
+    """
+    Vector index over many documents, with chunk metadata kept in SQLite.
+
+    Documents can be added and removed individually. Queries can be filtered
+    by document and page. The FAISS index type is either fixed or chosen from
+    the corpus size ("auto"), in which case the index is rebuilt from the
+    stored vectors when the corpus crosses a size tier.
+
+    The index may hold compressed vectors (float16, int8 or PQ) while the
+    full-precision vectors stay in SQLite on disk; search then fetches
+    `rerank` times more candidates and orders them by their exact distance.
+    Trained indexes (IVF and compressed ones) are retrained from all stored
+    vectors whenever the corpus grows by `retrain_growth` since the last
+    training, so they don't keep describing only the first documents added.
+    """
+
+    def __init__(
+        self, corpus_dir=DEFAULT_CORPUS_DIR, embeddings=None, index_type="auto", compression=DEFAULT_COMPRESSION,
+        rerank=DEFAULT_RERANK, retrain_growth=RETRAIN_GROWTH,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}; expected one of {COMPRESSIONS}")
+        self.corpus_dir = corpus_dir
+        self.embeddings = embeddings
+        self.index_type = index_type
+        self.compression = compression
+        self.rerank = rerank
+        self.retrain_growth = retrain_growth
+        self._lock = threading.RLock()
+        # (doc_ids, pages) -> (allowed chunk ids, FAISS selector); cleared when chunks change
+        self._filters = OrderedDict()
+        os.makedirs(corpus_dir, exist_ok=True)
+
+        self._db = sqlite3.connect(os.path.join(corpus_dir, DB_FILE), check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                name TEXT,
+                added REAL,
+                chunk_count INTEGER,
+                meta TEXT
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT,
+                vector BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_id);
+            CREATE TABLE IF NOT EXISTS chunk_pages (
+                chunk_id INTEGER NOT NULL,
+                page INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunk_pages_page ON chunk_pages (page, chunk_id);
+            CREATE INDEX IF NOT EXISTS chunk_pages_chunk ON chunk_pages (chunk_id);
+            CREATE TABLE IF NOT EXISTS tombstones (id INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._db.commit()
+        row = self._db.execute("SELECT value FROM state WHERE key = 'trained_on'").fetchone()
+        # Number of vectors the index was trained on; 0 if unknown or untrained
+        self.trained_on = int(row[0]) if row else 0
+
+        index_path = os.path.join(corpus_dir, INDEX_FILE)
+        self.index = faiss.read_index(index_path) if os.path.exists(index_path) else None
+        if self.index is not None and self._needs_rebuild():
+            # Opened with a different index type or compression than it was saved with
+            self.rebuild()
+
+    # Documents
+
+    def documents(self):
+        """List documents as dicts with doc_id, name, added and chunk_count"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT doc_id, name, added, chunk_count, meta FROM documents ORDER BY added"
+            ).fetchall()
+        return [
+            {"doc_id": doc_id, "name": name, "added": added, "chunk_count": count, **json.loads(meta or "{}")}
+            for doc_id, name, added, count, meta in rows
+        ]
+
+    def contains(self, doc_id):
+        """Check whether a document is in the corpus"""
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def chunk_count(self):
+        """Number of live chunks in the corpus"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add_document(self, doc_id, name, texts, metadatas=None, vectors=None, meta=None):
+        """
+        Add (or replace) a document.
+
+        Args:
+            doc_id: Stable document id, e.g. the SHA-256 of the PDF
+            name: Display name
+            texts: Chunk texts
+            metadatas: Optional chunk metadata dicts (page provenance from ingestion)
+            vectors: Optional precomputed chunk vectors; embedded when omitted
+            meta: Optional document-level metadata
+        """
+        metadatas = metadatas or [{} for _ in texts]
+        if vectors is None:
+            vectors = self.embeddings.embed_documents(texts)
+        vectors = np.asarray(vectors, dtype="float32")
+        if self.index is not None and len(vectors) and vectors.shape[1] != self.index.d:
+            raise ValueError(
+                f"Vectors have {vectors.shape[1]} dimensions but the corpus has {self.index.d}; "
+                "it was built with a different embedding backend"
+            )
+
+        with self._lock:
+            if self.contains(doc_id):
+                self.remove_document(doc_id, save=False)
+            self._filters.clear()
+
+            ids = []
+            cursor = self._db.cursor()
+            for text, metadata, vector in zip(texts, metadatas, vectors):
+                cursor.execute(
+                    "INSERT INTO chunks (doc_id, text, metadata, vector) VALUES (?, ?, ?, ?)",
+                    (doc_id, text, json.dumps(metadata), vector.tobytes()),
+                )
+                chunk_id = cursor.lastrowid
+                ids.append(chunk_id)
+                cursor.executemany(
+                    "INSERT INTO chunk_pages (chunk_id, page) VALUES (?, ?)",
+                    [(chunk_id, page) for page in metadata.get("pages", [])],
+                )
+            cursor.execute(
+                "INSERT INTO documents (doc_id, name, added, chunk_count, meta) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, name, time.time(), len(texts), json.dumps(meta or {})),
+            )
+            self._db.commit()
+
+            ids = np.asarray(ids, dtype="int64")
+            if self.index is None or self._needs_rebuild():
+                self.rebuild(save=False)
+            else:
+                self.index.add_with_ids(vectors, ids)
+            self.save()
+
+    def add_vector_store(self, doc_id, name, vector_store, meta=None):
+        """Add a document from a LangChain FAISS store without re-embedding it"""
+        ordered = sorted(vector_store.index_to_docstore_id.items())
+        docs = [vector_store.docstore.search(docstore_id) for _, docstore_id in ordered]
+        vectors = np.vstack([vector_store.index.reconstruct(int(i)) for i, _ in ordered])
+        self.add_document(
+            doc_id, name,
+            [doc.page_content for doc in docs],
+            [doc.metadata for doc in docs],
+            vectors=vectors,
+            meta=meta,
+        )
+
+    def remove_document(self, doc_id, save=True):
+        """Remove a document and its chunks without rebuilding the index"""
+        with self._lock:
+            ids = [row[0] for row in self._db.execute("SELECT id FROM chunks WHERE doc_id = ?", (doc_id,))]
+            self._db.execute(
+                "DELETE FROM chunk_pages WHERE chunk_id IN (SELECT id FROM chunks WHERE doc_id = ?)", (doc_id,)
+            )
+            self._db.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            self._db.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._filters.clear()
+
+            if ids and self.index is not None:
+                if _index_type_of(self.index) == "hnsw":
+                    # HNSW graphs don't support deletion; hide the ids until the next rebuild
+                    self._db.executemany("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", [(i,) for i in ids])
+                else:
+                    self.index.remove_ids(np.asarray(ids, dtype="int64"))
+            self._db.commit()
+
+            tombstones = self._db.execute("SELECT COUNT(*) FROM tombstones").fetchone()[0]
+            if self.index is not None and tombstones > MAX_TOMBSTONE_FRACTION * max(self.index.ntotal, 1):
+                self.rebuild(save=False)
+            if save:
+                self.save()
+
+    # Index maintenance
+
+    def _target_type(self, chunk_count):
+        return choose_index_type(chunk_count) if self.index_type == "auto" else self.index_type
+
+    def _needs_rebuild(self):
+        """
+        Whether the index type or compression no longer matches the settings and
+        corpus size, or a trained index has outgrown its training vectors
+        """
+        chunk_count = self.chunk_count()
+        return (
+            _index_type_of(self.index) != self._target_type(chunk_count)
+            or _compression_of(self.index) != choose_compression(self.compression, chunk_count)
+            or (
+                self.retrain_growth > 0 and _is_trained(self.index)
+                and chunk_count >= self.retrain_growth * max(self.trained_on, 1)
+            )
+        )
+
+    def rebuild(self, save=True):
+        """Rebuild the FAISS index from the stored full-precision vectors"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, vector FROM chunks ORDER BY id").fetchall()
+            self._db.execute("DELETE FROM tombstones")
+            self._db.commit()
+            if not rows:
+                self.index = None
+            else:
+                ids = np.asarray([row[0] for row in rows], dtype="int64")
+                vectors = np.vstack([np.frombuffer(row[1], dtype="float32") for row in rows])
+                self.index = create_index(
+                    self._target_type(len(rows)), vectors.shape[1], vectors, choose_compression(self.compression, len(rows))
+                )
+                self.index.add_with_ids(vectors, ids)
+            self.trained_on = len(rows) if self.index is not None and _is_trained(self.index) else 0
+            self._db.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('trained_on', ?)", (str(self.trained_on),)
+            )
+            self._db.commit()
+            if save:
+                self.save()
+
+    def index_bytes(self):
+        """Size of the saved FAISS index, about what the corpus keeps in memory"""
+        index_path = os.path.join(self.corpus_dir, INDEX_FILE)
+        return os.path.getsize(index_path) if os.path.exists(index_path) else 0
+
+    def save(self):
+        """Persist the FAISS index next to the metadata database"""
+        with self._lock:
+            index_path = os.path.join(self.corpus_dir, INDEX_FILE)
+            if self.index is None:
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+                return
+            tmp_path = index_path + ".tmp"
+            faiss.write_index(self.index, tmp_path)
+            os.replace(tmp_path, index_path)
+
+    # Queries
+
+    def _allowed_ids(self, doc_ids, pages):
+        query = "SELECT id FROM chunks WHERE 1 = 1"
+        params = []
+        if doc_ids is not None:
+            doc_ids = list(doc_ids)
+            query += f" AND doc_id IN ({','.join('?' * len(doc_ids))})"
+            params.extend(doc_ids)
+        if pages is not None:
+            pages = list(pages)
+            query += f" AND id IN (SELECT chunk_id FROM chunk_pages WHERE page IN ({','.join('?' * len(pages))}))"
+            params.extend(pages)
+        return np.asarray([row[0] for row in self._db.execute(query, params)], dtype="int64")
+
+    def _filter(self, doc_ids, pages):
+        """Allowed chunk ids and their FAISS selector, looked up in SQLite once per filter; caller holds the lock"""
+        key = (
+            tuple(sorted(doc_ids)) if doc_ids is not None else None,
+            tuple(sorted(pages)) if pages is not None else None,
+        )
+        cached = self._filters.get(key)
+        if cached is not None:
+            self._filters.move_to_end(key)
+            return cached
+        allowed = self._allowed_ids(doc_ids, pages)
+        cached = (allowed, faiss.IDSelectorBatch(allowed) if len(allowed) else None)
+        self._filters[key] = cached
+        while len(self._filters) > FILTER_CACHE_SIZE:
+            self._filters.popitem(last=False)
+        return cached
+
+    def _exact_search(self, query, allowed, fetch):
+        """Nearest allowed chunks by their stored full-precision vectors, shaped like a FAISS search result"""
+        ids, vectors = [], []
+        allowed = allowed.tolist()
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(allowed), 500):
+            batch = allowed[start:start + 500]
+            for chunk_id, blob in self._db.execute(
+                f"SELECT id, vector FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+            ):
+                ids.append(chunk_id)
+                vectors.append(np.frombuffer(blob, dtype="float32"))
+        if not ids:
+            return np.zeros((1, 0), dtype="float32"), np.zeros((1, 0), dtype="int64")
+        distances = ((np.vstack(vectors) - query) ** 2).sum(axis=1)
+        order = np.argsort(distances)[:fetch]
+        return distances[order][None, :], np.asarray(ids, dtype="int64")[order][None, :]
+
+    def search_by_vector(self, vector, k=4, doc_ids=None, pages=None):
+        """
+        Nearest chunks to a query vector.
+
+        Args:
+            vector: Query embedding
+            k: Number of results
+            doc_ids: Optional collection of document ids to search within
+            pages: Optional collection of 0-based page numbers to search within
+
+        Returns:
+            List of (Document, distance) pairs, nearest first
+        """
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return []
+            query = np.asarray([vector], dtype="float32")
+            tombstones = self._db.execute("SELECT COUNT(*) FROM tombstones").fetchone()[0]
+            rerank = self.rerank > 1 and _compression_of(self.index) != "none"
+            fetch = min(k * (self.rerank if rerank else 1) + tombstones, self.index.ntotal)
+
+            if doc_ids is not None or pages is not None:
+                allowed, selector = self._filter(doc_ids, pages)
+                if len(allowed) == 0:
+                    return []
+                distances, ids = self.index.search(query, fetch, params=_search_params(self.index, selector))
+                if (ids[0] >= 0).sum() < min(fetch, len(allowed)):
+                    # HNSW and IVF only visit part of the index and can miss chunks far
+                    # from the query; search the allowed chunks exactly instead
+                    distances, ids = self._exact_search(query, allowed, fetch)
+            else:
+                distances, ids = self.index.search(query, fetch)
+
+            hits = [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i >= 0]
+            if not hits:
+                return []
+            rows = self._db.execute(
+                "SELECT c.id, c.doc_id, d.name, c.text, c.metadata, c.vector FROM chunks c"
+                " JOIN documents d ON d.doc_id = c.doc_id"
+                f" WHERE c.id IN ({','.join('?' * len(hits))})",
+                [i for i, _ in hits],
+            ).fetchall()
+
+        by_id = {row[0]: row for row in rows}
+        if rerank:
+            # Replace approximate distances with exact ones from the stored float32 vectors
+            hit_ids = [chunk_id for chunk_id, _ in hits if chunk_id in by_id]
+            if hit_ids:
+                exact = np.vstack([np.frombuffer(by_id[chunk_id][5], dtype="float32") for chunk_id in hit_ids])
+                distances = ((exact - query) ** 2).sum(axis=1)
+                hits = sorted(zip(hit_ids, distances.tolist()), key=lambda hit: hit[1])
+        results = []
+        # Chunks missing from the table were deleted (HNSW tombstones)
+        for chunk_id, distance in hits:
+            if chunk_id not in by_id:
+                continue
+            _, doc_id, name, text, metadata, _ = by_id[chunk_id]
+            metadata = {**json.loads(metadata or "{}"), "doc_id": doc_id, "doc_name": name, "chunk_id": chunk_id}
+            results.append((Document(page_content=text, metadata=metadata), distance))
+            if len(results) == k:
+                break
+        return results
+
+    def similarity_search_with_score(self, query, k=4, doc_ids=None, pages=None):
+        """Nearest chunks to a text query, with distances"""
+        return self.search_by_vector(self.embeddings.embed_query(query), k, doc_ids, pages)
+
+    def similarity_search(self, query, k=4, doc_ids=None, pages=None):
+        """Nearest chunks to a text query; same interface as a LangChain vector store"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, doc_ids, pages)]
+
+    def similarity_search_by_vector(self, embedding, k=4, doc_ids=None, pages=None):
+        """Nearest chunks to a query vector; same interface as a LangChain vector store"""
+        return [doc for doc, _ in self.search_by_vector(embedding, k, doc_ids, pages)]
+
+
+class CorpusView:
+    """A filtered view of a corpus that can stand in for a single-document vector store"""
+
+    def __init__(self, corpus, doc_ids=None, pages=None):
+        self.corpus = corpus
+        self.doc_ids = doc_ids
+        self.pages = pages
+
+    def doc_key(self):
+        """Key identifying the documents and filters searched, for caching answers"""
+        return json.dumps({
+            "corpus": sorted(doc["doc_id"] for doc in self.corpus.documents()),
+            "doc_ids": sorted(self.doc_ids) if self.doc_ids is not None else None,
+            "pages": sorted(self.pages) if self.pages is not None else None,
+        })
+
+    def similarity_search(self, query, k=4):
+        """Nearest chunks to a text query within the view's filters"""
+        return self.corpus.similarity_search(query, k, self.doc_ids, self.pages)
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        """Nearest chunks to a query vector within the view's filters"""
+        return self.corpus.similarity_search_by_vector(embedding, k, self.doc_ids, self.pages)
@@ -0,0 +1,373 @@
+import os
+import sys
+import threading
+import time
+
+from index_cache import DEFAULT_CACHE_DIR, IndexCache, cache_key, content_hash
+from ingest import add_page_texts, chunk_texts, embedding_model_of, index_settings
+from metrics import count, span
+from ocr import get_ocr_pool
+
+# Process memory the shared documents may hold before idle ones are evicted
+DOCUMENT_MEMORY_BUDGET = int(float(os.getenv("DOCUMENT_MEMORY_MB", "512")) * 1024 * 1024)
+# One copy of every opened PDF, named by its index cache key and deleted with its entry
+DOCUMENT_DIR = os.getenv("DOCUMENT_DIR", os.path.join(DEFAULT_CACHE_DIR, "documents"))
+# Seconds OCR results are collected before being merged into a document's index
+OCR_MERGE_INTERVAL = float(os.getenv("OCR_MERGE_INTERVAL", "5"))
+# Seconds a PDF without an index cache entry is kept after it was last written or opened, since
+# another process sharing the directory may still be indexing it
+DOCUMENT_GRACE_SECONDS = float(os.getenv("DOCUMENT_GRACE_SECONDS", "3600"))
+
+
+def ocr_doc_key(doc_id, meta):
+    """Document key for the answer cache that also reflects merged OCR pages"""
+    ocr_pages = meta.get("ocr_pages")
+    return f"{doc_id}:ocr{len(ocr_pages)}" if ocr_pages else doc_id
+
+
+def estimate_memory(vector_store, lexical_index, mapped):
+    """Approximate process memory of a loaded document in bytes"""
+    total = sum(len(text) for text in chunk_texts(vector_store)) * 2
+    if not mapped:
+        total += vector_store.index.ntotal * vector_store.index.d * 4
+    if lexical_index is not None:
+        total += lexical_index.nbytes
+    return total
+
+
+class SharedDocument:
+    """An indexed PDF shared read-only by every session that opened it"""
+
+    def __init__(self, doc_id, key, name, pdf_path, vector_store, lexical_index, meta, mapped, build_stats=None):
+        self.doc_id = doc_id
+        self.key = key
+        self.name = name
+        self.pdf_path = pdf_path
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.meta = meta
+        self.mapped = mapped
+        # Ingestion stats (embedding cache, timings) when this process built the index
+        self.build_stats = build_stats
+        self.memory_bytes = estimate_memory(vector_store, lexical_index, mapped)
+        self.last_used = time.time()
+
+    @property
+    def chunk_count(self):
+        return len(self.vector_store.index_to_docstore_id)
+
+    @property
+    def doc_key(self):
+        """Answer cache key of the indexed content, which changes as OCR text is merged"""
+        return ocr_doc_key(self.doc_id, self.meta)
+
+
+class DocumentRegistry:
+    """
+    Process-wide store of indexed PDFs, deduplicated by content hash.
+
+    Sessions opening the same PDF share one read-only vector store, BM25 index
+    and PDF file. Vector stores are loaded from the index cache with their
+    vectors memory-mapped, so idle documents cost page cache instead of
+    process memory. When the estimated memory of loaded documents exceeds the
+    budget, the least recently used ones are dropped; sessions keep only the
+    doc_id and get() reloads an evicted document from the index cache.
+
+    Each PDF file is kept as long as its index cache entry: once the entry is
+    evicted and the document is no longer loaded, the file is deleted.
+
+    Pages without a text layer are queued for background OCR when a document
+    is opened. Text-layer pages are searchable right away; recognized pages
+    are merged into the stored index in batches and the shared copy is
+    replaced after each merge.
+    """
+
+    def __init__(
+        self, embeddings, index_cache=None, memory_budget=DOCUMENT_MEMORY_BUDGET, document_dir=DOCUMENT_DIR,
+        ocr_pool=None, ocr_merge_interval=OCR_MERGE_INTERVAL, grace_seconds=DOCUMENT_GRACE_SECONDS,
+    ):
+        """
+        Args:
+            embeddings: Embeddings object used for querying loaded stores and embedding OCR text
+            index_cache: IndexCache holding the persisted indexes
+            memory_budget: Bytes of loaded documents kept before evicting
+            document_dir: Directory holding the shared PDF files
+            ocr_pool: OCRPool for pages without a text layer; the process-wide one by default
+            ocr_merge_interval: Seconds OCR results are collected before each merge
+            grace_seconds: Seconds a PDF without an index cache entry is kept after it was last written or opened
+        """
+        self.embeddings = embeddings
+        self.index_settings = index_settings(embedding_model_of(embeddings))
+        self.index_cache = index_cache or IndexCache()
+        self.memory_budget = memory_budget
+        self.document_dir = document_dir
+        self.grace_seconds = grace_seconds
+        os.makedirs(document_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._loaded = {}
+        # doc_id -> (key, name, pdf_path) of every document ever opened, to reload evicted ones
+        self._known = {}
+        # doc_id -> lock held while a document is loaded, built or changed, so it happens once
+        self._doc_locks = {}
+        self.ocr_pool = ocr_pool or get_ocr_pool()
+        self.ocr_merge_interval = ocr_merge_interval
+        # doc_id -> OCRJob of documents with pages being recognized
+        self._ocr_jobs = {}
+        self._remove_stale_pdfs()
+
+    def _doc_lock(self, doc_id):
+        with self._lock:
+            return self._doc_locks.setdefault(doc_id, threading.Lock())
+
+    def _touch(self, doc_id):
+        with self._lock:
+            document = self._loaded.get(doc_id)
+            if document is not None:
+                document.last_used = time.time()
+            return document
+
+    def open(self, pdf_bytes, name, build):
+        """
+        Open a PDF, loading or building its indexes only if no session has.
+
+        Args:
+            pdf_bytes: Raw bytes of the PDF
+            name: File name shown to users
+            build: Function (pdf_path) -> (vector_store, lexical_index, stats)
+                called when the index cache has no entry for the PDF; stats
+                holds page_count, char_count and page_hashes
+
+        Returns:
+            SharedDocument
+        """
+        doc_id = content_hash(pdf_bytes)
+        document = self._touch(doc_id)
+        if document is not None:
+            count("document_registry_hits")
+            return document
+
+        with self._doc_lock(doc_id):
+            document = self._touch(doc_id)
+            if document is not None:
+                count("document_registry_hits")
+                return document
+
+            key = cache_key(pdf_bytes, self.index_settings)
+            pdf_path = os.path.join(self.document_dir, f"{key}.pdf")
+            try:
+                # Mark the file as in use for other processes sharing the directory
+                os.utime(pdf_path)
+            except FileNotFoundError:
+                tmp_path = f"{pdf_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(pdf_bytes)
+                os.replace(tmp_path, pdf_path)
+            with self._lock:
+                self._known[doc_id] = (key, name, pdf_path)
+
+            document = self._load(doc_id)
+            if document is None:
+                document = self._build(doc_id, key, name, pdf_path, build)
+            self._add(document)
+            self._start_ocr(document)
+            return document
+
+    def get(self, doc_id):
+        """A previously opened document, reloaded from the index cache if it was evicted; None if unknown"""
+        document = self._touch(doc_id)
+        if document is not None:
+            return document
+        with self._doc_lock(doc_id):
+            document = self._touch(doc_id)
+            if document is None:
+                document = self._load(doc_id)
+                if document is not None:
+                    self._add(document)
+                    self._start_ocr(document)
+            return document
+
+    def _load(self, doc_id):
+        key, name, pdf_path = self._known.get(doc_id, (None, None, None))
+        if key is None:
+            return None
+        with span("registry.load"):
+            cached = self.index_cache.load(key, self.embeddings, mmap=True)
+            if cached is None:
+                return None
+            vector_store, texts, meta = cached
+            lexical_index = self.index_cache.load_lexical(key, texts)
+        count("document_registry_loads")
+        return SharedDocument(doc_id, key, name, pdf_path, vector_store, lexical_index, meta, mapped=True)
+
+    def _build(self, doc_id, key, name, pdf_path, build):
+        with span("registry.build"):
+            vector_store, lexical_index, stats = build(pdf_path)
+        count("document_registry_builds")
+        meta = {
+            "pdf_name": name,
+            "page_count": stats["page_count"],
+            "char_count": stats["char_count"],
+            "page_hashes": stats["page_hashes"],
+            "textless_pages": stats["textless_pages"],
+        }
+        with span("registry.save"):
+            self.index_cache.save(key, vector_store, chunk_texts(vector_store), meta, lexical_index)
+        self.remove_evicted()
+        # Swap the freshly built in-memory vectors for the mapped copy on disk
+        document = self._load(doc_id)
+        if document is None:
+            document = SharedDocument(doc_id, key, name, pdf_path, vector_store, lexical_index, meta, mapped=False)
+        document.build_stats = stats
+        return document
+
+    def _add(self, document):
+        with self._lock:
+            self._loaded[document.doc_id] = document
+            self._evict(keep=document.doc_id)
+
+    def _evict(self, keep):
+        """Drop least recently used documents until the budget is met; caller holds the lock"""
+        total = sum(document.memory_bytes for document in self._loaded.values())
+        for document in sorted(self._loaded.values(), key=lambda document: document.last_used):
+            if total <= self.memory_budget:
+                break
+            if document.doc_id == keep:
+                continue
+            del self._loaded[document.doc_id]
+            total -= document.memory_bytes
+            count("document_registry_evictions")
+            if not self.index_cache.contains(document.key):
+                # Neither in memory nor in the index cache: the document can't be reloaded
+                self._forget(document.doc_id)
+
+    def _remove_unindexed(self, path, key):
+        """Delete a PDF whose index cache entry is gone, unless it was written or opened within the grace period"""
+        try:
+            if time.time() - os.path.getmtime(path) < self.grace_seconds or self.index_cache.contains(key):
+                return
+            os.remove(path)
+        except OSError:
+            return
+        count("document_registry_pdfs_removed")
+
+    def _forget(self, doc_id):
+        """Drop a document that can no longer be reloaded and delete its PDF; caller holds the lock"""
+        key, _, pdf_path = self._known.pop(doc_id)
+        self._remove_unindexed(pdf_path, key)
+
+    def remove_evicted(self):
+        """
+        Delete the PDFs of documents whose index cache entry was evicted.
+
+        Loaded documents keep their PDF until they are evicted from memory,
+        and documents being loaded, built or merged are skipped. PDFs within
+        their grace period are left for a later call.
+        """
+        with self._lock:
+            candidates = [(doc_id, key) for doc_id, (key, _, _) in self._known.items() if doc_id not in self._loaded]
+        for doc_id, key in candidates:
+            if self.index_cache.contains(key):
+                continue
+            doc_lock = self._doc_lock(doc_id)
+            if not doc_lock.acquire(blocking=False):
+                continue
+            try:
+                with self._lock:
+                    if doc_id in self._known and doc_id not in self._loaded:
+                        self._forget(doc_id)
+            finally:
+                doc_lock.release()
+        self._remove_stale_pdfs()
+
+    def _remove_stale_pdfs(self):
+        """Delete PDFs this process does not use whose index cache entry is gone"""
+        with self._lock:
+            known = {pdf_path for _, _, pdf_path in self._known.values()}
+        for file_name in os.listdir(self.document_dir):
+            path = os.path.join(self.document_dir, file_name)
+            if path not in known:
+                self._remove_unindexed(path, file_name.split(".")[0])
+
+    def _start_ocr(self, document):
+        """Queue the document's textless pages that have no merged OCR text yet"""
+        pending = sorted(set(document.meta.get("textless_pages", [])) - set(document.meta.get("ocr_pages", [])))
+        with self._lock:
+            if not pending or document.doc_id in self._ocr_jobs:
+                return
+            job = self.ocr_pool.submit(document.pdf_path, pending)
+            if job is None:
+                return
+            self._ocr_jobs[document.doc_id] = job
+        threading.Thread(target=self._merge_ocr, args=(document.doc_id, job), daemon=True).start()
+
+    def _merge_ocr(self, doc_id, job):
+        """Merge recognized pages as they arrive, batching them over ocr_merge_interval"""
+        while True:
+            finished = job.wait()
+            if not finished:
+                time.sleep(self.ocr_merge_interval)
+            page_texts = job.take_ready()
+            if page_texts:
+                try:
+                    self.merge_page_texts(doc_id, page_texts)
+                except Exception as e:
+                    print(f"Merging OCR text into {doc_id} failed: {e}", file=sys.stderr)
+            if finished:
+                break
+        if job.errors:
+            print(f"OCR failed for {len(job.errors)} pages of {doc_id}: {next(iter(job.errors.values()))}", file=sys.stderr)
+
+    def merge_page_texts(self, doc_id, page_texts):
+        """
+        Add the text of pages without a text layer to a document's stored index.
+
+        The stored index is updated and saved, and the shared copy is reloaded
+        from it. Pages already merged are skipped.
+
+        Returns:
+            Number of chunks added
+        """
+        with self._doc_lock(doc_id):
+            if doc_id not in self._known:
+                return 0
+            key = self._known[doc_id][0]
+            cached = self.index_cache.load(key, self.embeddings)
+            if cached is None:
+                return 0
+            vector_store, texts, meta = cached
+            lexical_index = self.index_cache.load_lexical(key, texts)
+            merged = set(meta.get("ocr_pages", []))
+            page_texts = {page_num: text for page_num, text in page_texts.items() if page_num not in merged}
+            if not page_texts:
+                return 0
+            with span("registry.ocr_merge"):
+                added = add_page_texts(vector_store, page_texts, self.embeddings, lexical_index)
+                meta["ocr_pages"] = sorted(merged | set(page_texts))
+                self.index_cache.save(key, vector_store, chunk_texts(vector_store), meta, lexical_index)
+            count("ocr_pages_merged", len(page_texts))
+            self.remove_evicted()
+            document = self._load(doc_id)
+            if document is not None:
+                self._add(document)
+            return added
+
+    def known_documents(self):
+        """(doc_id, name) of every document that can still be opened or reloaded"""
+        with self._lock:
+            return [(doc_id, name) for doc_id, (_, name, _) in self._known.items()]
+
+    def ocr_status(self, doc_id):
+        """OCR progress of a document (pages, done, cached, errors), or None if none was queued"""
+        with self._lock:
+            job = self._ocr_jobs.get(doc_id)
+        return job.status() if job else None
+
+    def stats(self):
+        """Loaded document count, their estimated memory and the budget, in bytes"""
+        with self._lock:
+            return {
+                "documents": len(self._loaded),
+                "mapped": sum(document.mapped for document in self._loaded.values()),
+                "memory_bytes": sum(document.memory_bytes for document in self._loaded.values()),
+                "memory_budget": self.memory_budget,
+            }
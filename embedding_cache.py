@@ -0,0 +1,134 @@
+import copy
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DB_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("index_cache", "embeddings.sqlite3"))
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially reformatted chunks share a cache entry"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def text_hash(text):
+    """Hash of the normalized chunk text"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that stores document vectors in a local SQLite database.
+
+    Only chunks that have never been embedded with the same model are sent to
+    the wrapped backend. Query embeddings are passed straight through.
+    """
+
+    def __init__(self, embeddings, model, db_path=DEFAULT_DB_PATH):
+        self.embeddings = embeddings
+        self.model = model
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def with_own_stats(self):
+        """A copy sharing this cache's backend and SQLite connection, with its own hit/miss counters"""
+        view = copy.copy(self)
+        view.reset_stats()
+        return view
+
+    def reset_stats(self):
+        """Reset hit/miss counters"""
+        self.hits = 0
+        self.misses = 0
+        self.embed_seconds = 0.0
+
+    def _lookup(self, hashes):
+        found = {}
+        unique = list(set(hashes))
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model, *batch],
+            ).fetchall()
+            for h, blob in rows:
+                found[h] = array("f", blob).tolist()
+        return found
+
+    def _store(self, items):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+            [(self.model, h, array("f", vector).tobytes()) for h, vector in items],
+        )
+        self._conn.commit()
+
+    def embed_documents(self, texts):
+        """Embed texts, reusing cached vectors where possible"""
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            found = self._lookup(hashes)
+
+        # Embed each distinct unseen chunk once
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = text
+
+        if missing:
+            start = time.perf_counter()
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            elapsed = time.perf_counter() - start
+            # Round through float32 so cached and fresh vectors are identical
+            new_items = [(h, array("f", vector).tolist()) for h, vector in zip(missing.keys(), vectors)]
+            with self._lock:
+                self._store(new_items)
+                self.embed_seconds += elapsed
+            found.update(new_items)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        """Embed a query with the wrapped backend"""
+        return self.embeddings.embed_query(text)
+
+    def stats(self):
+        """
+        Summarize cache effectiveness since the last reset.
+
+        Returns:
+            Dict with hits, misses, and the estimated backend seconds saved
+        """
+        per_text = self.embed_seconds / self.misses if self.misses else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "embed_seconds": self.embed_seconds,
+            "seconds_saved": per_text * self.hits,
+        }
+
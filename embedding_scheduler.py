@@ -0,0 +1,172 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+import metrics
+from settings import EMBED_MAX_IN_FLIGHT, EMBED_REQUEST_SIZE
+# Token budget per minute across all requests; 0 disables throttling
+EMBED_TOKENS_PER_MINUTE = int(os.getenv("EMBED_TOKENS_PER_MINUTE", "1000000"))
+# Retries for rate-limited or failed requests
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+
+def approximate_token_count(text):
+    """Token count estimate for English text, roughly four characters per token"""
+    return len(text) // 4 + 1
+
+
+def get_token_counter(model):
+    """Return a function counting the tokens of a text for the given model"""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return approximate_token_count
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """Check whether an embedding error is a rate limit or transient server error"""
+    if type(error).__name__ in ("RateLimitError", "APIConnectionError", "APITimeoutError"):
+        return True
+    status = _status_code(error)
+    return status == 429 or (status is not None and status >= 500)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at tokens_per_minute"""
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Block until `tokens` are available and take them; returns seconds waited"""
+        if self.capacity <= 0:
+            return 0.0
+        # A single request larger than the whole budget waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_shared_buckets = {}
+_shared_buckets_lock = threading.Lock()
+
+
+def get_shared_bucket(tokens_per_minute):
+    """Return the process-wide token bucket for a per-minute budget"""
+    with _shared_buckets_lock:
+        if tokens_per_minute not in _shared_buckets:
+            _shared_buckets[tokens_per_minute] = TokenBucket(tokens_per_minute)
+        return _shared_buckets[tokens_per_minute]
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that batches, parallelizes and throttles backend calls.
+
+    Texts are split into requests of `batch_size`, at most `max_in_flight`
+    requests run concurrently, every request first takes its token count from a
+    per-minute budget shared by the whole process, and rate-limited requests are retried with
+    exponential backoff and jitter (honoring Retry-After when present).
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        model,
+        batch_size=EMBED_REQUEST_SIZE,
+        max_in_flight=EMBED_MAX_IN_FLIGHT,
+        tokens_per_minute=EMBED_TOKENS_PER_MINUTE,
+        max_retries=EMBED_MAX_RETRIES,
+        base_delay=1.0,
+        max_delay=60.0,
+        count_tokens=None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.count_tokens = count_tokens or get_token_counter(model)
+        self.bucket = get_shared_bucket(tokens_per_minute)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embed")
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "tokens": 0, "throttled_seconds": 0.0}
+
+    def _record(self, **deltas):
+        with self._stats_lock:
+            for name, value in deltas.items():
+                self.stats[name] += value
+        for name, value in deltas.items():
+            if value:
+                metrics.count(f"embedding_{name}", value)
+
+    def _call_with_retries(self, tokens, call):
+        for attempt in range(self.max_retries + 1):
+            waited = self.bucket.acquire(tokens)
+            self._record(requests=1, tokens=tokens, throttled_seconds=waited)
+            try:
+                return call()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                    delay = delay / 2 + random.uniform(0, delay / 2)
+                self._record(retries=1, throttled_seconds=delay)
+                time.sleep(delay)
+
+    def _embed_batch(self, texts):
+        tokens = sum(self.count_tokens(text) for text in texts)
+        return self._call_with_retries(tokens, lambda: self.embeddings.embed_documents(texts))
+
+    def embed_documents(self, texts):
+        """Embed texts in concurrent, throttled batches, preserving order"""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        vectors = []
+        for result in self._executor.map(self._embed_batch, batches):
+            vectors.extend(result)
+        return vectors
+
+    def embed_query(self, text):
+        """Embed a single query with the same throttling and retries"""
+        return self._call_with_retries(self.count_tokens(text), lambda: self.embeddings.embed_query(text))
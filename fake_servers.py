@@ -0,0 +1,230 @@
+"""
+Local OpenAI-compatible fake server (embeddings and completions) for testing and benchmarking without network access.
+
+Point the app or CLI at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python fake_servers.py --port 8100 --latency 0.05 --error-rate 0.1 --token-delay 0.02
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(item, dims):
+    """Deterministic unit vector for a text or token list"""
+    seed = hashlib.sha256(json.dumps(item).encode("utf-8")).digest()
+    values = []
+    counter = 0
+    while len(values) < dims:
+        block = hashlib.sha256(seed + struct.pack("<I", counter)).digest()
+        values.extend(b / 127.5 - 1.0 for b in block)
+        counter += 1
+    values = values[:dims]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server implementing the parts of the OpenAI API used by this app.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        latency: Seconds added to every request (for streamed completions, before the first token)
+        error_rate: Fraction of requests answered with 429 Too Many Requests
+        dims: Embedding dimensions
+        seed: Seed for the error injection
+        token_delay: Seconds between streamed completion tokens
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, dims=1536, seed=0, token_delay=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.dims = dims
+        self.token_delay = token_delay
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serve in a background thread; returns the base URL"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        """Serve in the calling thread until interrupted"""
+        self._httpd.serve_forever()
+
+    def stop(self):
+        """Shut the server down"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _should_fail(self):
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_fail():
+                    self._send_json(429, {"error": {
+                        "message": "Rate limit reached (injected by fake server)",
+                        "type": "requests",
+                        "code": "rate_limit_exceeded",
+                    }}, headers={"Retry-After": "0.05"})
+                    return
+
+                route = self.path.rstrip("/")
+                if route.endswith("/embeddings"):
+                    self._send_json(200, server._embeddings_response(request))
+                elif route.endswith("/completions") and request.get("stream"):
+                    self._stream_completion(request)
+                elif route.endswith("/completions"):
+                    self._send_json(200, server._completion_response(request))
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown route {self.path}"}})
+
+            def _stream_completion(self, request):
+                # Server-sent events, one token per event, like the OpenAI API
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                for i, token in enumerate(server._completion_tokens(request)):
+                    if i and server.token_delay:
+                        time.sleep(server.token_delay)
+                    chunk = server._completion_payload(request, token, finish_reason=None)
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                final = server._completion_payload(request, "", finish_reason="stop")
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+    def _completion_tokens(self, request):
+        """Deterministic answer that quotes the question, split into word tokens"""
+        prompt = request.get("prompt", "")
+        if isinstance(prompt, list):
+            prompt = prompt[0] if prompt else ""
+        question = ""
+        for line in prompt.splitlines():
+            if line.startswith("Question:"):
+                question = line[len("Question:"):].strip()
+        words = f"This is a fake answer to the question: {question or 'unknown'}".split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _completion_payload(self, request, text, finish_reason="stop"):
+        return {
+            "id": "cmpl-fake",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-llm"),
+            "choices": [{"text": text, "index": 0, "logprobs": None, "finish_reason": finish_reason}],
+        }
+
+    def _completion_response(self, request):
+        tokens = self._completion_tokens(request)
+        if self.token_delay:
+            time.sleep(self.token_delay * max(len(tokens) - 1, 0))
+        response = self._completion_payload(request, "".join(tokens))
+        response["usage"] = {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+        return response
+
+    def _embeddings_response(self, request):
+        inputs = request.get("input", [])
+        # A single string or a single token list is one input
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        vectors = [fake_embedding(item, self.dims) for item in inputs]
+        # The OpenAI client asks for packed float32 vectors when numpy is available
+        if request.get("encoding_format") == "base64":
+            vectors = [base64.b64encode(struct.pack(f"<{len(v)}f", *v)).decode("ascii") for v in vectors]
+        data = [
+            {"object": "embedding", "index": i, "embedding": vector}
+            for i, vector in enumerate(vectors)
+        ]
+        tokens = sum(len(item) if isinstance(item, list) else len(item.split()) for item in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--dims", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed completion tokens")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.host, args.port, args.latency, args.error_rate, args.dims, token_delay=args.token_delay
+    )
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import difflib
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+from fitz import open as fitz_open  # PyMuPDF
+
+# Words per shingle
+SHINGLE_SIZE = 3
+# Paragraphs passed on to exact alignment per query
+MAX_CANDIDATES = 8
+# Shingles found in more than this fraction of paragraphs carry no signal and are skipped
+MAX_POSTING_FRACTION = 0.05
+# Number of documents whose paragraph index is kept in memory
+INDEX_CACHE_SIZE = 8
+
+
+def normalize_text(text):
+    """Collapse whitespace and lowercase for matching"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Set of overlapping word n-grams of normalized text"""
+    words = text.split()
+    if not words:
+        return set()
+    n = min(size, len(words))
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+class ParagraphIndex:
+    """
+    Inverted index from word shingles to the paragraphs of a document.
+
+    Candidate lookup only touches the posting lists of the query's shingles, so
+    its cost depends on the query rather than on the size of the document.
+    """
+
+    def __init__(self):
+        # (page_num, paragraph text as it appears on the page)
+        self.paragraphs = []
+        self.normalized = []
+        self.shingle_counts = []
+        self.postings = defaultdict(list)
+
+    @classmethod
+    def from_pdf(cls, pdf_path):
+        """Index every text block of a PDF as a paragraph"""
+        index = cls()
+        pdf_document = fitz_open(pdf_path)
+        try:
+            for page_num, page in enumerate(pdf_document):
+                for block in page.get_text("blocks"):
+                    # Block type 0 is text, 1 is an image
+                    if block[6] == 0:
+                        index.add(page_num, block[4])
+        finally:
+            pdf_document.close()
+        return index
+
+    def add(self, page_num, text):
+        """Add a paragraph found on page_num"""
+        paragraph = re.sub(r'\s+', ' ', text).strip()
+        if not paragraph:
+            return
+        normalized = paragraph.lower()
+        paragraph_shingles = shingles(normalized)
+        paragraph_id = len(self.paragraphs)
+        self.paragraphs.append((page_num, paragraph))
+        self.normalized.append(normalized)
+        self.shingle_counts.append(len(paragraph_shingles))
+        for shingle in paragraph_shingles:
+            self.postings[shingle].append(paragraph_id)
+
+    def candidates(self, search_text, pages=None, limit=MAX_CANDIDATES):
+        """
+        Paragraphs sharing the most shingles with search_text.
+
+        Args:
+            search_text: Text to look up
+            pages: Optional collection of 0-based page numbers to restrict to
+            limit: Maximum number of candidates
+
+        Returns:
+            Paragraph ids ranked by estimated Jaccard similarity
+        """
+        query_shingles = shingles(normalize_text(search_text))
+        max_postings = max(1, int(len(self.paragraphs) * MAX_POSTING_FRACTION))
+        pages = set(pages) if pages is not None else None
+
+        hits = Counter()
+        for shingle in query_shingles:
+            posting = self.postings.get(shingle)
+            if not posting or (len(posting) > max_postings and len(query_shingles) > 1):
+                continue
+            hits.update(posting)
+
+        scored = []
+        for paragraph_id, count in hits.items():
+            if pages is not None and self.paragraphs[paragraph_id][0] not in pages:
+                continue
+            union = len(query_shingles) + self.shingle_counts[paragraph_id] - count
+            scored.append((count / union, paragraph_id))
+        scored.sort(reverse=True)
+        return [paragraph_id for _, paragraph_id in scored[:limit]]
+
+    def best_matches(self, search_text, threshold=0.6, pages=None, limit=MAX_CANDIDATES):
+        """
+        Align search_text against the top candidates only.
+
+        A paragraph matches when more than threshold of the shorter of the two
+        texts is found in the other, so the several paragraphs a chunk spans
+        each match it, as does a sentence quoted from a long paragraph.
+
+        Returns:
+            Dict of page_num -> matching paragraphs on that page, in document order
+        """
+        query = normalize_text(search_text)
+        matches = {}
+        # Visit candidates in document order so paragraphs are listed as they appear
+        for paragraph_id in sorted(self.candidates(search_text, pages, limit)):
+            page_num, paragraph = self.paragraphs[paragraph_id]
+            normalized = self.normalized[paragraph_id]
+            shorter = min(len(query), len(normalized))
+            # autojunk would discard common characters such as spaces in long texts and
+            # hide most of the matching text
+            matcher = difflib.SequenceMatcher(None, query, normalized, autojunk=False)
+            # quick_ratio() bounds the matched characters, which skips most full alignments
+            if matcher.quick_ratio() * (len(query) + len(normalized)) / 2 <= threshold * shorter:
+                continue
+            matched = sum(block.size for block in matcher.get_matching_blocks())
+            if matched > threshold * shorter:
+                matches.setdefault(page_num, []).append(paragraph)
+        return matches
+
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_paragraph_index(pdf_path):
+    """Return the paragraph index of a PDF, building it once per file version"""
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+    index = ParagraphIndex.from_pdf(pdf_path)
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_HIGHLIGHT_DIR = os.getenv("HIGHLIGHT_CACHE_DIR", os.path.join("index_cache", "highlights"))
+DEFAULT_HIGHLIGHT_MAX_BYTES = int(float(os.getenv("HIGHLIGHT_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+
+def highlight_key(doc_id, page_num, spans, fmt, zoom=None):
+    """
+    Key of one rendered page.
+
+    Args:
+        doc_id: Content hash (or other stable fingerprint) of the PDF
+        page_num: 0-based page number
+        spans: Highlighted rectangles as (x0, y0, x1, y1) tuples
+        fmt: "pdf" or "png"
+        zoom: Rasterization scale for png
+    """
+    spans = [[round(value, 1) for value in span] for span in spans]
+    payload = json.dumps([doc_id, page_num, spans, fmt, zoom])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class HighlightCache:
+    """
+    On-disk store of highlighted single pages (PDF or PNG).
+
+    Files are named by highlight_key() and evicted least recently used first
+    once the directory exceeds max_bytes; eviction is the only cleanup, so
+    pages can be shared by sessions and linked from chat history.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_HIGHLIGHT_DIR, max_bytes=DEFAULT_HIGHLIGHT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key, fmt):
+        """Path of a cached page, whether or not it exists"""
+        return os.path.join(self.cache_dir, f"{key}.{fmt}")
+
+    def get(self, key, fmt, render):
+        """
+        Path of a cached page, rendering it first on a miss.
+
+        Args:
+            key: Key from highlight_key()
+            fmt: File extension, "pdf" or "png"
+            render: Function writing the page to the path it is given
+
+        Returns:
+            Path of the cached file
+        """
+        path = self.path(key, fmt)
+        try:
+            now = time.time()
+            # Record the access for LRU eviction
+            os.utime(path, (now, now))
+            return path
+        except FileNotFoundError:
+            pass
+
+        # Render into a scratch file so readers never see a partial page
+        tmp_path = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}.{fmt}")
+        try:
+            render(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=path)
+        return path
+
+    def entries(self):
+        """List (path, last_used, size_bytes) for every cached page, oldest first"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("."):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        entries.sort(key=lambda entry: entry[1])
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used pages until the cache fits in max_bytes"""
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_highlight_cache():
+    """Process-wide highlight cache in the default directory"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HighlightCache()
+        return _default_cache
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+import uuid
+
+import faiss
+from langchain.vectorstores import FAISS
+
+from lexical_index import BM25Index
+
+DEFAULT_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", "index_cache")
+DEFAULT_MAX_BYTES = int(float(os.getenv("INDEX_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+META_FILE = "meta.json"
+CHUNKS_FILE = "chunks.json"
+LEXICAL_FILE = "lexical.npz"
+
+
+def content_hash(pdf_bytes):
+    """Hex SHA-256 of a document's bytes, used as its stable document id"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def cache_key(pdf_bytes, settings):
+    """
+    Build a content-addressed key for a PDF and the settings used to index it.
+
+    Args:
+        pdf_bytes: Raw bytes of the PDF file
+        settings: Dict of chunking/embedding settings that affect the index
+
+    Returns:
+        Hex SHA-256 digest identifying the (document, settings) pair
+    """
+    digest = hashlib.sha256()
+    digest.update(bytes.fromhex(content_hash(pdf_bytes)))
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_vector_store(folder, embeddings, mmap=False):
+    """
+    Load a vector store written by FAISS.save_local.
+
+    With mmap, the stored vectors are memory-mapped read-only instead of read
+    into memory, so idle indexes cost page cache rather than process memory and
+    every process opening the same entry shares one copy. Falls back to a normal
+    read on FAISS builds without in-place mapping.
+    """
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if not mmap or mmap_flag is None:
+        return FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True)
+    index = faiss.read_index(os.path.join(folder, "index.faiss"), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class IndexCache:
+    """On-disk store of FAISS indexes keyed by PDF content and index settings"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def contains(self, key):
+        """Check whether a complete entry exists for key"""
+        return os.path.exists(os.path.join(self._entry_dir(key), META_FILE))
+
+    def load(self, key, embeddings, mmap=False):
+        """
+        Load a cached vector store.
+
+        Args:
+            key: Cache key from cache_key()
+            embeddings: Embeddings object used for querying the loaded store
+            mmap: Memory-map the vectors read-only (see load_vector_store)
+
+        Returns:
+            (vector_store, chunks, meta) or None if the key is not cached
+        """
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(os.path.join(entry_dir, CHUNKS_FILE), "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            vector_store = load_vector_store(entry_dir, embeddings, mmap=mmap)
+        except Exception as e:
+            print(f"Discarding unreadable index cache entry {key}: {e}", file=sys.stderr)
+            self.remove(key)
+            return None
+
+        # Record the access for LRU eviction
+        now = time.time()
+        os.utime(meta_path, (now, now))
+        return vector_store, chunks, meta
+
+    def load_lexical(self, key, chunks=None):
+        """
+        Load the BM25 index stored with a cache entry.
+
+        Entries saved without one get it built from chunks (when given) and stored.
+
+        Returns:
+            BM25Index or None
+        """
+        lexical_path = os.path.join(self._entry_dir(key), LEXICAL_FILE)
+        if os.path.exists(lexical_path):
+            try:
+                return BM25Index.load(lexical_path)
+            except Exception as e:
+                print(f"Rebuilding unreadable lexical index {key}: {e}", file=sys.stderr)
+        if chunks is None or not self.contains(key):
+            return None
+        lexical_index = BM25Index.from_texts(chunks)
+        tmp_path = os.path.join(self._entry_dir(key), f".tmp-{uuid.uuid4().hex}-{LEXICAL_FILE}")
+        lexical_index.save(tmp_path)
+        os.replace(tmp_path, lexical_path)
+        return lexical_index
+
+    def save(self, key, vector_store, chunks, meta=None, lexical_index=None):
+        """
+        Save a vector store with its chunk texts and metadata, then evict old entries.
+
+        Args:
+            key: Cache key from cache_key()
+            vector_store: FAISS vector store to persist
+            chunks: List of chunk texts the store was built from
+            meta: Optional dict of document metadata (name, page count, ...)
+            lexical_index: Optional BM25Index over the same chunks
+        """
+        entry_dir = self._entry_dir(key)
+        # Write into a scratch directory first so readers never see half an entry
+        tmp_dir = os.path.join(self.cache_dir, f".tmp-{key}-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            vector_store.save_local(tmp_dir)
+            with open(os.path.join(tmp_dir, CHUNKS_FILE), "w", encoding="utf-8") as f:
+                json.dump(chunks, f)
+            if lexical_index is not None:
+                lexical_index.save(os.path.join(tmp_dir, LEXICAL_FILE))
+            meta = dict(meta or {})
+            meta.setdefault("created", time.time())
+            meta["chunk_count"] = len(chunks)
+            # Meta is written last and marks the entry as complete
+            with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    def remove(self, key):
+        """Delete a cache entry"""
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def entries(self):
+        """List (key, last_used, size_bytes) for every complete entry, oldest first"""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self._entry_dir(key), META_FILE)
+            if key.startswith(".") or not os.path.exists(meta_path):
+                continue
+            entries.append((key, os.path.getmtime(meta_path), _dir_size(self._entry_dir(key))))
+        entries.sort(key=lambda entry: entry[1])
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, _, size in entries)
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= size
@@ -0,0 +1,515 @@
+import hashlib
+import os
+import time
+from contextlib import nullcontext
+from difflib import SequenceMatcher
+from itertools import islice
+
+from metrics import observe
+from settings import EMBED_MAX_IN_FLIGHT, EMBED_REQUEST_SIZE, EMBEDDING_BACKEND, EMBEDDING_BACKENDS
+
+# LangChain (including the embedding backends built on it), the OpenAI client
+# and the PDF libraries are imported by the functions that use them, so
+# reading the settings below stays cheap
+
+# Settings that determine the contents of a vector index
+CHUNK_SIZE = 900
+CHUNK_OVERLAP = 200
+SEPARATOR = "\n"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+INDEX_SETTINGS = {
+    # Bumped whenever the stored index layout changes
+    "index_version": 3,
+    "separator": SEPARATOR,
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "embedding_model": EMBEDDING_MODEL,
+}
+
+# Settings that determine the answer to a question over an index
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo-instruct")
+RETRIEVAL_K = 4
+ANSWER_SETTINGS = {
+    "index": INDEX_SETTINGS,
+    "k": RETRIEVAL_K,
+    "chain_type": "stuff",
+}
+
+# Number of chunks embedded and added to the index at a time; the default
+# gives the embedding scheduler one full request for every in-flight slot
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", str(EMBED_REQUEST_SIZE * EMBED_MAX_IN_FLIGHT)))
+# Characters of page text buffered before the splitter runs
+STREAM_WINDOW = CHUNK_SIZE * 8
+
+
+def index_settings(embedding_model=EMBEDDING_MODEL):
+    """INDEX_SETTINGS for indexes embedded with the given model"""
+    return dict(INDEX_SETTINGS, embedding_model=embedding_model)
+
+
+def embedding_model_of(backend):
+    """Name of the model behind an embeddings backend, which keys cached vectors and indexes"""
+    return getattr(backend, "model", EMBEDDING_MODEL)
+
+
+def get_embedding_backend(http_client=None, backend=EMBEDDING_BACKEND):
+    """
+    Create the embeddings backend.
+
+    The OpenAI client is wrapped in the request scheduler for batching,
+    throttling and retries, so its own retries are disabled. Local backends run
+    in-process and are used directly.
+
+    Args:
+        http_client: Optional shared httpx.Client for connection reuse
+        backend: One of EMBEDDING_BACKENDS
+    """
+    if backend == "hashing":
+        from local_embeddings import HashingEmbeddings
+
+        return HashingEmbeddings()
+    if backend == "onnx":
+        from local_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings()
+    if backend != "openai":
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}")
+    from langchain_openai import OpenAIEmbeddings
+
+    from embedding_scheduler import ScheduledEmbeddings
+
+    client = OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        max_retries=0,
+        http_client=http_client,
+    )
+    return ScheduledEmbeddings(client, model=EMBEDDING_MODEL)
+
+
+def get_embeddings(backend=None, db_path=None):
+    """
+    Create the embeddings client used for indexing and querying.
+
+    Document vectors are cached locally by chunk text, in db_path or the
+    default embedding cache. Pass a backend from get_embedding_backend() to
+    share its connections and worker threads.
+    """
+    from embedding_cache import DEFAULT_DB_PATH, CachedEmbeddings
+
+    backend = backend or get_embedding_backend()
+    return CachedEmbeddings(backend, model=embedding_model_of(backend), db_path=db_path or DEFAULT_DB_PATH)
+
+
+def get_text_splitter():
+    """
+    Create the text splitter used for indexing.
+
+    Separators are kept with the text that follows them, so every chunk is an
+    exact substring of the split text (otherwise runs of blank lines collapse
+    and chunks no longer map back to document offsets).
+    """
+    from langchain.text_splitter import CharacterTextSplitter
+
+    return CharacterTextSplitter(
+        separator=SEPARATOR,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        keep_separator=True,
+    )
+
+
+def chunk_positions(text, chunks):
+    """
+    Yield (chunk, offset) for the chunks split from text, in order.
+
+    Overlapping chunks are searched for after the previous chunk's start. A
+    chunk that cannot be found gets None rather than a guessed offset.
+    """
+    search_from = 0
+    for chunk in chunks:
+        position = text.find(chunk, search_from)
+        if position < 0:
+            yield chunk, None
+            continue
+        search_from = position + 1
+        yield chunk, position
+
+
+def _chunk_metadata(start, end, page_spans):
+    """Page provenance for the document character range [start, end)"""
+    spans = []
+    for page_num, page_start, page_end in page_spans:
+        if page_start < end and start < page_end:
+            spans.append([page_num, max(start, page_start) - page_start, min(end, page_end) - page_start])
+    return {
+        "start_index": start,
+        "end_index": end,
+        "pages": [span[0] for span in spans],
+        "page_spans": spans,
+    }
+
+
+def iter_chunks(pages, text_splitter, window=STREAM_WINDOW):
+    """
+    Split a stream of page texts into chunks without joining the whole document.
+
+    Page text is buffered until at least `window` characters are available.
+    Every chunk except the last is emitted, and the buffer restarts at the last
+    chunk so it can still grow and overlap with the text that follows.
+
+    Args:
+        pages: Iterable of page texts, in order
+        text_splitter: LangChain text splitter
+        window: Minimum number of buffered characters before splitting
+
+    Yields:
+        (chunk_text, metadata) in document order. Metadata holds the chunk's
+        document character offsets, the 0-based pages it came from and, per
+        page, the character span it covers within that page's text; it is
+        empty for a chunk that cannot be located in the text.
+    """
+    buffer = ''
+    buffer_offset = 0
+    # (page_num, start, end) document offsets of the pages overlapping the buffer
+    page_spans = []
+    doc_length = 0
+
+    def emit(chunks):
+        for chunk, position in chunk_positions(buffer, chunks):
+            if position is None:
+                yield chunk, {}
+                continue
+            start = buffer_offset + position
+            yield chunk, _chunk_metadata(start, start + len(chunk), page_spans)
+
+    for page_num, page in enumerate(pages):
+        page_spans.append((page_num, doc_length, doc_length + len(page)))
+        doc_length += len(page)
+        buffer += page
+        if len(buffer) < window:
+            continue
+        chunks = text_splitter.split_text(buffer)
+        if len(chunks) < 2:
+            continue
+        yield from emit(chunks[:-1])
+        start = buffer.rfind(chunks[-1])
+        if start < 0:
+            start = len(buffer) - len(chunks[-1])
+        buffer = buffer[start:]
+        buffer_offset += start
+        page_spans = [span for span in page_spans if span[2] > buffer_offset]
+    if buffer:
+        yield from emit(text_splitter.split_text(buffer))
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items from an iterable"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def page_hash(text):
+    """Short content hash of a page's extracted text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def diff_pages(old_hashes, new_hashes):
+    """
+    Match the unchanged pages of two revisions of a document.
+
+    Pages are aligned in order, so inserted and removed pages shift the
+    numbering of the pages after them without marking those as changed.
+
+    Returns:
+        Dict mapping old 0-based page numbers to new ones for unchanged pages
+    """
+    matcher = SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    page_map = {}
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            page_map[old_start + offset] = new_start + offset
+    return page_map
+
+
+def source_pages(docs):
+    """Sorted 0-based pages that retrieved documents came from"""
+    return sorted({page for doc in docs for page in doc.metadata.get("pages", [])})
+
+
+def chunk_texts(vector_store):
+    """Return the chunk texts held by a FAISS vector store, in index order"""
+    return [
+        vector_store.docstore.search(doc_id).page_content
+        for _, doc_id in sorted(vector_store.index_to_docstore_id.items())
+    ]
+
+
+def build_vector_store(
+    pdf_file, embeddings, batch_size=EMBED_BATCH_SIZE, on_progress=None, workers=None, lexical_index=None, lock=None,
+    on_batch=None,
+):
+    """
+    Stream a PDF into a FAISS vector store.
+
+    Pages are extracted lazily, split as they arrive, and every batch of chunks
+    is embedded and added to the index before the next batch is read, so peak
+    memory does not depend on the size of the document. Each chunk is stored
+    with its page provenance (see iter_chunks) as document metadata.
+
+    Args:
+        pdf_file: Path to the PDF file
+        embeddings: Embeddings object used to embed the chunks
+        batch_size: Number of chunks embedded per batch
+        on_progress: Optional callback(pages_done, page_count, chunk_count) called after each batch
+        workers: Number of page extraction processes
+        lexical_index: Optional BM25Index that receives every chunk alongside the vector store
+        lock: Optional lock held while each batch is added, so other threads can
+            search the indexes built so far while holding it
+        on_batch: Optional callback(vector_store) called after each batch is added
+
+    Returns:
+        (vector_store, stats) where stats holds page_count, char_count,
+        chunk_count, page_hashes, textless_pages (pages without a text layer,
+        for OCR) and the seconds spent per stage in timings
+    """
+    from langchain.vectorstores import FAISS
+    from ocr import is_textless
+    from pdfutils import count_pages, iter_pages
+
+    started = time.perf_counter()
+    stats = {"page_count": count_pages(pdf_file), "char_count": 0, "chunk_count": 0}
+    # Seconds spent per stage; extraction runs lazily inside the splitter's reads
+    timings = {"extract": 0.0, "split": 0.0, "embed": 0.0, "index": 0.0, "lexical": 0.0}
+    pages_done = 0
+    page_hashes = []
+    textless_pages = []
+
+    def counted_pages():
+        nonlocal pages_done
+        pages = iter_pages(pdf_file, workers=workers)
+        while True:
+            start = time.perf_counter()
+            page = next(pages, None)
+            timings["extract"] += time.perf_counter() - start
+            if page is None:
+                return
+            pages_done += 1
+            stats["char_count"] += len(page)
+            page_hashes.append(page_hash(page))
+            if is_textless(page):
+                textless_pages.append(pages_done - 1)
+            yield page
+
+    vector_store = None
+    chunk_batches = batched(iter_chunks(counted_pages(), get_text_splitter()), batch_size)
+    while True:
+        start = time.perf_counter()
+        extract_before = timings["extract"]
+        batch = next(chunk_batches, None)
+        timings["split"] += time.perf_counter() - start - (timings["extract"] - extract_before)
+        if batch is None:
+            break
+
+        texts = [text for text, _ in batch]
+        metadatas = [metadata for _, metadata in batch]
+        start = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        timings["embed"] += time.perf_counter() - start
+
+        with lock or nullcontext():
+            start = time.perf_counter()
+            if vector_store is None:
+                vector_store = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas)
+            else:
+                vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+            timings["index"] += time.perf_counter() - start
+
+            if lexical_index is not None:
+                start = time.perf_counter()
+                lexical_index.add(texts)
+                timings["lexical"] += time.perf_counter() - start
+        stats["chunk_count"] += len(batch)
+        if on_batch:
+            on_batch(vector_store)
+        if on_progress:
+            on_progress(pages_done, stats["page_count"], stats["chunk_count"])
+
+    if vector_store is None:
+        raise ValueError("No text could be extracted from the PDF")
+    timings["total"] = time.perf_counter() - started
+    for stage, seconds in timings.items():
+        observe(f"ingest.{stage}", seconds)
+    stats["timings"] = timings
+    stats["page_hashes"] = page_hashes
+    stats["textless_pages"] = textless_pages
+    return vector_store, stats
+
+
+def _remap_chunk(metadata, page_map, new_page_starts):
+    """
+    New metadata of a chunk whose pages are all unchanged and still consecutive, else None.
+
+    Offsets move with the chunk's first page; pages are renumbered.
+    """
+    spans = metadata.get("page_spans")
+    if not spans or "start_index" not in metadata:
+        return None
+    new_pages = [page_map.get(page_num) for page_num, _, _ in spans]
+    if None in new_pages or any(b != a + 1 for a, b in zip(new_pages, new_pages[1:])):
+        return None
+    first_page, first_start, _ = spans[0]
+    shift = new_page_starts[new_pages[0]] + first_start - metadata["start_index"]
+    return dict(
+        metadata,
+        start_index=metadata["start_index"] + shift,
+        end_index=metadata["end_index"] + shift,
+        pages=new_pages,
+        page_spans=[[new_page, start, end] for new_page, (_, start, end) in zip(new_pages, spans)],
+    )
+
+
+def update_vector_store(pdf_file, vector_store, old_page_hashes, embeddings, batch_size=EMBED_BATCH_SIZE, workers=None):
+    """
+    Update the vector store of a previous revision of a PDF to a new revision in place.
+
+    Pages are matched by content hash (see diff_pages). Chunks that touch a
+    changed or removed page are deleted; the others are kept with their
+    vectors and get renumbered pages and offsets. Only the text no kept chunk
+    covers, widened by the chunk overlap, is split and embedded again. Chunk
+    positions change, so a lexical index must be rebuilt from chunk_texts().
+    OCR chunks have no document offsets and are dropped too: the new
+    revision's meta has no "ocr_pages", so its textless pages are queued for
+    OCR again, and the OCR cache returns unchanged pages without rendering them.
+
+    Args:
+        pdf_file: Path to the new revision
+        vector_store: Writable FAISS store of the previous revision, built with
+            chunk offsets (index_version 2 or later)
+        old_page_hashes: Page hashes of the previous revision (stats["page_hashes"])
+        embeddings: Embeddings object used to embed new chunks
+        batch_size: Number of chunks embedded per batch
+        workers: Number of page extraction processes
+
+    Returns:
+        (vector_store, stats) with the keys of build_vector_store plus
+        changed_pages (new 0-based page numbers), removed_chunks and added_chunks
+    """
+    from ocr import is_textless
+    from pdfutils import extract_pages
+
+    started = time.perf_counter()
+    timings = {}
+    start = time.perf_counter()
+    pages = extract_pages(pdf_file, workers=workers)
+    page_hashes = [page_hash(page) for page in pages]
+    timings["extract"] = time.perf_counter() - start
+
+    page_map = diff_pages(old_page_hashes, page_hashes)
+    page_spans = []
+    doc_length = 0
+    for page_num, page in enumerate(pages):
+        page_spans.append((page_num, doc_length, doc_length + len(page)))
+        doc_length += len(page)
+    new_page_starts = [span[1] for span in page_spans]
+
+    start = time.perf_counter()
+    removed = []
+    covered = []
+    for docstore_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(docstore_id)
+        metadata = _remap_chunk(doc.metadata, page_map, new_page_starts)
+        if metadata is None:
+            removed.append(docstore_id)
+            continue
+        doc.metadata = metadata
+        covered.append((metadata["start_index"], metadata["end_index"]))
+    if removed:
+        vector_store.delete(removed)
+
+    # Split the stretches of text no kept chunk covers, overlapping their neighbours
+    text = "".join(pages)
+    splitter = get_text_splitter()
+    new_chunks = []
+    position = 0
+    for gap_start, gap_end in sorted(covered) + [(doc_length, doc_length)]:
+        if gap_start > position:
+            segment_start = max(position - CHUNK_OVERLAP, 0)
+            segment = text[segment_start:min(gap_start + CHUNK_OVERLAP, doc_length)]
+            for chunk, offset in chunk_positions(segment, splitter.split_text(segment)):
+                if offset is None:
+                    new_chunks.append((chunk, {}))
+                    continue
+                chunk_start = segment_start + offset
+                new_chunks.append((chunk, _chunk_metadata(chunk_start, chunk_start + len(chunk), page_spans)))
+        position = max(position, gap_end)
+    timings["split"] = time.perf_counter() - start
+
+    timings["embed"] = timings["index"] = 0.0
+    for batch in batched(new_chunks, batch_size):
+        texts = [chunk for chunk, _ in batch]
+        start = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        timings["embed"] += time.perf_counter() - start
+        start = time.perf_counter()
+        vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=[metadata for _, metadata in batch])
+        timings["index"] += time.perf_counter() - start
+
+    timings["total"] = time.perf_counter() - started
+    for stage, seconds in timings.items():
+        observe(f"ingest.update_{stage}", seconds)
+    changed_pages = sorted(set(range(len(pages))) - set(page_map.values()))
+    stats = {
+        "page_count": len(pages),
+        "char_count": doc_length,
+        "chunk_count": len(vector_store.index_to_docstore_id),
+        "page_hashes": page_hashes,
+        "textless_pages": [page_num for page_num, page in enumerate(pages) if is_textless(page)],
+        "changed_pages": changed_pages,
+        "removed_chunks": len(removed),
+        "added_chunks": len(new_chunks),
+        "timings": timings,
+    }
+    return vector_store, stats
+
+
+def add_page_texts(vector_store, page_texts, embeddings, lexical_index=None):
+    """
+    Index text obtained outside the text layer, such as OCR, for whole pages.
+
+    Each page is split on its own and its chunks are appended to the vector
+    store (and the lexical index, keeping positions aligned). The chunks carry
+    page provenance and an "ocr" flag but no document offsets, since the
+    text is not part of the extracted document text.
+
+    Args:
+        vector_store: Writable FAISS store
+        page_texts: Dict of 0-based page number -> text
+        embeddings: Embeddings object used to embed the chunks
+        lexical_index: Optional BM25Index over the same chunks
+
+    Returns:
+        Number of chunks added
+    """
+    splitter = get_text_splitter()
+    texts = []
+    metadatas = []
+    for page_num, text in sorted(page_texts.items()):
+        for chunk, offset in chunk_positions(text, splitter.split_text(text)):
+            metadata = {"pages": [page_num], "ocr": True}
+            if offset is not None:
+                metadata["page_spans"] = [[page_num, offset, offset + len(chunk)]]
+            texts.append(chunk)
+            metadatas.append(metadata)
+    if not texts:
+        return 0
+    vectors = embeddings.embed_documents(texts)
+    vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+    if lexical_index is not None:
+        lexical_index.add(texts)
+    return len(texts)
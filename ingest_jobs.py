@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from index_cache import content_hash
+from ingest import build_vector_store
+from lexical_index import BM25Index
+from metrics import count
+from retrieval import HybridRetriever
+
+# PDFs indexed at the same time; each one also uses the page extraction
+# processes and the shared embedding scheduler
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Seconds a finished or failed job is kept for sessions to pick up
+INGEST_JOB_TTL = float(os.getenv("INGEST_JOB_TTL", "3600"))
+
+
+class IngestJob:
+    """
+    Indexing of one PDF, running in the background.
+
+    While the PDF is being built, the chunks indexed so far can be searched
+    through partial_retriever(). Once done, the document is opened from the
+    registry by doc_id.
+    """
+
+    def __init__(self, doc_id, name):
+        self.doc_id = doc_id
+        self.name = name
+        self.status = "queued"
+        self.pages_done = 0
+        self.page_count = 0
+        self.chunk_count = 0
+        self.error = None
+        # Ingestion stats when this job built the index rather than loading it
+        self.build_stats = None
+        self.submitted = time.time()
+        self.finished = None
+        # The registry's copy of the PDF, set once the build starts
+        self.pdf_path = None
+        # Held by the builder while adding a batch and by searches of the partial indexes
+        self.lock = threading.Lock()
+        self._vector_store = None
+        self._lexical_index = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def progress(self):
+        """Status and counts for display"""
+        return {
+            "status": self.status,
+            "pages_done": self.pages_done,
+            "page_count": self.page_count,
+            "chunk_count": self.chunk_count,
+            "error": self.error,
+        }
+
+    def partial_retriever(self, mode, lexical_weight):
+        """HybridRetriever over the chunks indexed so far, or None before the first batch or after the build"""
+        vector_store, lexical_index = self._vector_store, self._lexical_index
+        if vector_store is None:
+            return None
+        return HybridRetriever(vector_store, lexical_index, mode, lexical_weight, lock=self.lock)
+
+    def build(self, pdf_path, embeddings):
+        """Build function for DocumentRegistry.open that publishes every batch"""
+        self.pdf_path = pdf_path
+        lexical_index = BM25Index()
+        self._lexical_index = lexical_index
+
+        def on_batch(vector_store):
+            self._vector_store = vector_store
+
+        def on_progress(pages_done, page_count, chunk_count):
+            self.pages_done, self.page_count, self.chunk_count = pages_done, page_count, chunk_count
+
+        vector_store, stats = build_vector_store(
+            pdf_path, embeddings, on_progress=on_progress, lexical_index=lexical_index, lock=self.lock, on_batch=on_batch
+        )
+        stats["embedding_stats"] = embeddings.stats()
+        self.build_stats = stats
+        return vector_store, lexical_index, stats
+
+
+class IngestJobs:
+    """
+    Process-wide pool indexing uploaded PDFs in the background.
+
+    Jobs are keyed by the PDF's content hash, so submitting a PDF that is
+    already being indexed returns the running job, and any session that knows
+    the doc_id can follow it across reruns and page reloads.
+    """
+
+    def __init__(self, registry, document_embeddings, workers=INGEST_WORKERS, job_ttl=INGEST_JOB_TTL):
+        """
+        Args:
+            registry: DocumentRegistry the indexed PDFs are opened in
+            document_embeddings: Function returning the embeddings used to index one document
+            workers: PDFs indexed at the same time
+            job_ttl: Seconds finished jobs are kept
+        """
+        self.registry = registry
+        self.document_embeddings = document_embeddings
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, pdf_bytes, name):
+        """Queue a PDF for indexing unless it is already queued or indexed; returns its IngestJob"""
+        doc_id = content_hash(pdf_bytes)
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(doc_id)
+        # A finished job is reused only while the registry can still open its index
+        stale = job is not None and job.status == "done" and self.registry.get(doc_id) is None
+        with self._lock:
+            current = self._jobs.get(doc_id)
+            if current is not None and current.status != "failed" and not (stale and current is job):
+                return current
+            job = IngestJob(doc_id, name)
+            self._jobs[doc_id] = job
+        count("ingest_jobs_submitted")
+        self._executor.submit(self._run, job, pdf_bytes)
+        return job
+
+    def get(self, doc_id):
+        """The job of a document, or None if it is unknown or expired"""
+        with self._lock:
+            return self._jobs.get(doc_id)
+
+    def _run(self, job, pdf_bytes):
+        job.status = "running"
+        try:
+            embeddings = self.document_embeddings()
+            self.registry.open(pdf_bytes, job.name, lambda pdf_path: job.build(pdf_path, embeddings))
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            count("ingest_jobs_failed")
+        finally:
+            job.finished = time.time()
+            # Searches use the registry's copy from now on
+            job._vector_store = job._lexical_index = None
+
+    def _expire(self):
+        """Drop finished jobs older than job_ttl; caller holds the lock"""
+        now = time.time()
+        for doc_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.job_ttl:
+                del self._jobs[doc_id]
+
+    def stats(self):
+        """Number of jobs per status"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
@@ -0,0 +1,169 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+# BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words, numbers and compounds such as part numbers (XJ-200/B) or sections (12.3.4)
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+SEPARATOR_PATTERN = re.compile(r"[-./]")
+
+
+def tokenize(text):
+    """
+    Lowercased terms of a text.
+
+    Compound tokens are kept whole so exact identifiers match, and their parts
+    are added so a query for "XJ 200" still finds "XJ-200".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        if SEPARATOR_PATTERN.search(token):
+            terms.extend(part for part in SEPARATOR_PATTERN.split(token) if part)
+    return terms
+
+
+class BM25Index:
+    """
+    BM25 inverted index over the chunks of a document.
+
+    Chunks are numbered in the order they are added, which matches their
+    position in the FAISS index built from the same chunks. Postings are kept
+    as flat arrays with a precomputed BM25 weight per (term, chunk), so a query
+    only sums the weights of its terms' posting lists.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = []
+        self._vocab = {}
+        # Postings grouped by term id: term t owns entries offsets[t]:offsets[t + 1]
+        self._offsets = np.zeros(1, dtype="int64")
+        self._doc_ids = np.zeros(0, dtype="int32")
+        self._term_freqs = np.zeros(0, dtype="int32")
+        # Flat (term id, chunk, term frequency) postings added since the last compile
+        self._pending_terms = []
+        self._pending_docs = []
+        self._pending_freqs = []
+        self._weights = None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the postings, weights and vocabulary"""
+        arrays = (self._offsets, self._doc_ids, self._term_freqs, self._weights)
+        postings = sum(array.nbytes for array in arrays if array is not None)
+        # Python lists and dict entries cost roughly 8 and 100 bytes per item
+        pending = 8 * (len(self._pending_terms) * 3 + len(self.doc_lengths))
+        return postings + pending + 100 * len(self._vocab)
+
+    @classmethod
+    def from_texts(cls, texts):
+        """Index a list of chunk texts"""
+        index = cls()
+        index.add(texts)
+        return index
+
+    def add(self, texts):
+        """Append chunks to the index"""
+        vocab = self._vocab
+        for text in texts:
+            chunk_id = len(self.doc_lengths)
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self._pending_terms.append(vocab.setdefault(term, len(vocab)))
+                self._pending_docs.append(chunk_id)
+                self._pending_freqs.append(count)
+        if texts:
+            self._weights = None
+
+    def _compile(self):
+        """Merge pending postings into the grouped arrays and recompute BM25 weights"""
+        if self._pending_terms:
+            term_ids = np.concatenate([
+                np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets)),
+                np.asarray(self._pending_terms, dtype="int64"),
+            ])
+            doc_ids = np.concatenate([self._doc_ids, np.asarray(self._pending_docs, dtype="int32")])
+            term_freqs = np.concatenate([self._term_freqs, np.asarray(self._pending_freqs, dtype="int32")])
+            # Stable sort keeps each posting list in chunk order
+            order = np.argsort(term_ids, kind="stable")
+            self._doc_ids = doc_ids[order]
+            self._term_freqs = term_freqs[order]
+            self._offsets = np.zeros(len(self._vocab) + 1, dtype="int64")
+            np.cumsum(np.bincount(term_ids, minlength=len(self._vocab)), out=self._offsets[1:])
+            self._pending_terms, self._pending_docs, self._pending_freqs = [], [], []
+
+        chunk_count = len(self.doc_lengths)
+        doc_lengths = np.asarray(self.doc_lengths, dtype="float32")
+        average_length = float(doc_lengths.mean()) if chunk_count else 1.0
+        document_freqs = np.diff(self._offsets).astype("float32")
+        idf = np.log1p((chunk_count - document_freqs + 0.5) / (document_freqs + 0.5))
+        term_idf = np.repeat(idf, np.diff(self._offsets))
+        tf = self._term_freqs.astype("float32")
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths[self._doc_ids] / (average_length or 1.0))
+        self._weights = (term_idf * tf * (self.k1 + 1) / (tf + norm)).astype("float32")
+
+    def search(self, query, k=4):
+        """
+        Top chunks for a query by BM25 score.
+
+        Returns:
+            List of (chunk position, score) pairs, best first, only for chunks
+            sharing at least one term with the query
+        """
+        if self._weights is None:
+            self._compile()
+        if not self.doc_lengths:
+            return []
+        scores = np.zeros(len(self.doc_lengths), dtype="float32")
+        for term in set(tokenize(query)):
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            # A term's posting list holds each chunk once, so fancy-index addition is safe
+            scores[self._doc_ids[start:end]] += self._weights[start:end]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(chunk_id), float(scores[chunk_id])) for chunk_id in ranked]
+
+    def save(self, path):
+        """Write the index to an .npz file"""
+        if self._weights is None:
+            self._compile()
+        vocab = sorted(self._vocab, key=self._vocab.get)
+        np.savez(
+            path,
+            params=np.asarray([self.k1, self.b], dtype="float64"),
+            vocab=np.asarray(vocab, dtype="U") if vocab else np.zeros(0, dtype="U1"),
+            offsets=self._offsets,
+            doc_ids=self._doc_ids,
+            term_freqs=self._term_freqs,
+            doc_lengths=np.asarray(self.doc_lengths, dtype="int32"),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            index._vocab = {term: term_id for term_id, term in enumerate(data["vocab"].tolist())}
+            index._offsets = data["offsets"]
+            index._doc_ids = data["doc_ids"]
+            index._term_freqs = data["term_freqs"]
+            index.doc_lengths = data["doc_lengths"].tolist()
+        index._compile()
+        return index
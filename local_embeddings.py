@@ -0,0 +1,176 @@
+"""
+Embedding backends that run on the local CPU instead of calling an API.
+
+"hashing" maps unigrams and bigrams into a fixed-size vector with the hashing
+trick; it needs no model files, is deterministic across processes and suits
+tests and offline use. "onnx" runs a sentence-transformers model exported to
+ONNX (a directory with model.onnx and tokenizer.json, e.g. all-MiniLM-L6-v2)
+with onnxruntime, optionally quantized to int8.
+"""
+import hashlib
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from lexical_index import tokenize
+
+# Threads used for local inference
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or os.cpu_count() or 1
+# Texts run through a local model at a time
+LOCAL_EMBED_BATCH_SIZE = int(os.getenv("LOCAL_EMBED_BATCH_SIZE", "32"))
+# Vector size of the hashing backend
+HASHING_DIMS = int(os.getenv("HASHING_EMBEDDING_DIMS", "1024"))
+# Directory of the exported ONNX model and its tokenizer
+EMBEDDING_ONNX_MODEL = os.getenv("EMBEDDING_ONNX_MODEL", "")
+# Set to 1 to run the ONNX model with int8 weights (quantized once, next to the model)
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "0") == "1"
+
+
+def normalize_rows(matrix):
+    """Scale every row to unit length, leaving all-zero rows as they are"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of unigrams and bigrams.
+
+    Every term is hashed with CRC32 to a dimension and a sign, counts are
+    dampened with log1p and vectors are L2 normalized, so cosine similarity
+    measures shared vocabulary. A batch is turned into one bincount.
+    """
+
+    def __init__(self, dims=HASHING_DIMS, threads=EMBEDDING_THREADS, batch_size=LOCAL_EMBED_BATCH_SIZE * 8):
+        self.dims = dims
+        self.batch_size = batch_size
+        self.model = f"hashing-{dims}"
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embed") if threads > 1 else None
+
+    def _term_hashes(self, text):
+        terms = tokenize(text)
+        terms.extend(f"{a} {b}" for a, b in zip(terms, terms[1:]))
+        return [zlib.crc32(term.encode("utf-8")) for term in terms]
+
+    def _embed_batch(self, texts):
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            text_hashes = self._term_hashes(text)
+            hashes.extend(text_hashes)
+            rows.extend([row] * len(text_hashes))
+        hashes = np.array(hashes, dtype=np.uint32)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        slots = np.array(rows, dtype=np.int64) * self.dims + (hashes & 0x7FFFFFFF) % self.dims
+        counts = np.bincount(slots, weights=signs, minlength=len(texts) * self.dims).reshape(len(texts), self.dims)
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        return normalize_rows(vectors).astype(np.float32)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        mapper = self._executor.map if self._executor and len(batches) > 1 else map
+        return np.concatenate(list(mapper(self._embed_batch, batches))).tolist()
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0].tolist()
+
+
+def quantized_model(model_path):
+    """Path of an int8 copy of an ONNX model, creating it with dynamic quantization on first use"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = os.path.splitext(model_path)[0] + ".int8.onnx"
+    if not os.path.exists(quantized_path):
+        tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+        quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, quantized_path)
+    return quantized_path
+
+
+def onnx_model_key(model_dir, quantize, max_length):
+    """
+    Model name for cache keys: the directory name plus a hash of the model and
+    tokenizer files and the settings that change the vectors, so replacing
+    the model in place does not reuse vectors of the old one.
+    """
+    digest = hashlib.sha256(f"{bool(quantize)}:{max_length}".encode("utf-8"))
+    for file_name in ("model.onnx", "tokenizer.json"):
+        with open(os.path.join(model_dir, file_name), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    name = os.path.basename(os.path.normpath(model_dir))
+    return f"onnx-{name}-{digest.hexdigest()[:16]}" + ("-int8" if quantize else "")
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Mean-pooled sentence embeddings from a transformer exported to ONNX.
+
+    Texts are sorted by length so each batch pads little, and onnxruntime
+    spreads every batch over the configured threads.
+    """
+
+    def __init__(
+        self, model_dir=EMBEDDING_ONNX_MODEL, quantize=EMBEDDING_QUANTIZE, threads=EMBEDDING_THREADS,
+        batch_size=LOCAL_EMBED_BATCH_SIZE, max_length=256,
+    ):
+        """
+        Args:
+            model_dir: Directory with model.onnx and tokenizer.json
+            quantize: Run the model with int8 weights
+            threads: onnxruntime intra-op threads
+            batch_size: Texts per inference call
+            max_length: Tokens kept per text
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        if not model_dir or not os.path.isdir(model_dir):
+            raise ValueError("EMBEDDING_ONNX_MODEL must name a directory holding model.onnx and tokenizer.json")
+        model_path = os.path.join(model_dir, "model.onnx")
+        if quantize:
+            model_path = quantized_model(model_path)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+        self.model = onnx_model_key(model_dir, quantize, max_length)
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+        }
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        token_vectors = self.session.run(None, feeds)[0]
+        weights = attention_mask[..., None].astype(np.float32)
+        pooled = (token_vectors * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return normalize_rows(pooled).astype(np.float32)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0].tolist()
@@ -1,4 +1,5 @@
 import base64
+from functools import lru_cache
 from io import BytesIO
 
 def get_logo_base64():
@@ -25,6 +26,7 @@ def get_logo_base64():
     '''
     return base64.b64encode(svg_content.encode()).decode()
 
+@lru_cache(maxsize=1)
 def get_logo_html():
-    """Returns the HTML img tag with the base64 encoded logo"""
+    """Returns the HTML img tag with the base64 encoded logo, built once per process"""
     return f'<img src="data:image/svg+xml;base64,{get_logo_base64()}" width="100">' 
\ No newline at end of file
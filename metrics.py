@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Set PERF_METRICS=0 to turn every span and counter into a no-op
+METRICS_ENABLED = os.getenv("PERF_METRICS", "1") != "0"
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Process-wide stage timings (as histograms) and counters.
+
+    Stage names are dotted, e.g. "ingest.embed" or "answer.generation".
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, buckets=BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # stage -> [count, total seconds, max seconds, per-bucket counts]
+        self._stages = {}
+        # (name, sorted label items) -> value
+        self._counters = {}
+
+    def span(self, stage):
+        """Context manager timing a block as one observation of stage"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds):
+        """Record one duration of stage"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = [0, 0.0, 0.0, [0] * len(self.buckets)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[3][i] += 1
+                    break
+
+    def count(self, name, value=1, **labels):
+        """Add value to a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self):
+        """
+        Current values.
+
+        Returns:
+            Dict with "stages" (stage -> count, total_s, mean_ms, max_ms) and
+            "counters" (name{labels} -> value)
+        """
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": count,
+                    "total_s": total,
+                    "mean_ms": total / count * 1000,
+                    "max_ms": longest * 1000,
+                }
+                for stage, (count, total, longest, _) in sorted(self._stages.items())
+            }
+            counters = {_series(name, labels): value for (name, labels), value in sorted(self._counters.items())}
+        return {"stages": stages, "counters": counters}
+
+    def prometheus_text(self, prefix="pdfqa"):
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each pipeline stage",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted((stage, list(entry[:3]), list(entry[3])) for stage, entry in self._stages.items())
+            counters = sorted(self._counters.items())
+        for stage, (count, total, _), bucket_counts in stages:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{_series(metric, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop every recorded value"""
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def span(stage):
+    """Time a block as one observation of stage in the process-wide registry"""
+    return REGISTRY.span(stage)
+
+
+def observe(stage, seconds):
+    """Record a duration in the process-wide registry"""
+    REGISTRY.observe(stage, seconds)
+
+
+def count(name, value=1, **labels):
+    """Add to a counter in the process-wide registry"""
+    REGISTRY.count(name, value, **labels)
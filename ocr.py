@@ -0,0 +1,247 @@
+"""
+Background OCR of PDF pages without a text layer.
+
+Pages are rasterized with PyMuPDF and recognized by a pluggable local OCR
+engine in a process pool. OCR_ENGINE names a built-in engine ("tesseract",
+which needs the pytesseract package and the tesseract binary) or any
+"module:function" taking PNG bytes and returning text; "none" disables OCR.
+"""
+import hashlib
+import importlib
+import io
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fitz import open as fitz_open  # PyMuPDF
+
+OCR_ENGINE = os.getenv("OCR_ENGINE", "tesseract")
+# Processes recognizing pages; OCR is CPU bound, so leave cores for answering
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+# Rasterization resolution; 200-300 dpi suits most OCR engines
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join("index_cache", "ocr.sqlite3"))
+
+
+def tesseract_engine(png_bytes):
+    """Recognize a page image with Tesseract"""
+    import pytesseract
+    from PIL import Image
+
+    return pytesseract.image_to_string(Image.open(io.BytesIO(png_bytes)))
+
+
+ENGINES = {"tesseract": tesseract_engine}
+
+
+def resolve_engine(spec):
+    """Return the OCR function for a built-in engine name or a "module:function" spec"""
+    if spec in ENGINES:
+        return ENGINES[spec]
+    module_name, _, function_name = spec.partition(":")
+    if not function_name:
+        raise ValueError(f"Unknown OCR engine {spec!r}, expected one of {', '.join(ENGINES)} or module:function")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def engine_available(spec):
+    """Whether an OCR engine can run here"""
+    if not spec or spec == "none":
+        return False
+    try:
+        resolve_engine(spec)
+        if spec == "tesseract":
+            import pytesseract  # noqa: F401
+            return shutil.which("tesseract") is not None
+    except Exception:
+        return False
+    return True
+
+
+def is_textless(text):
+    """Whether an extracted page has no usable text layer"""
+    return not text.strip()
+
+
+class OCRCache:
+    """SQLite store of recognized page text keyed by a hash of the page content and OCR settings"""
+
+    def __init__(self, db_path=OCR_CACHE_PATH):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # Several worker processes share the file
+        self._db = sqlite3.connect(db_path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL)")
+        self._db.commit()
+
+    def get(self, key):
+        row = self._db.execute("SELECT text FROM pages WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, text):
+        self._db.execute("INSERT OR REPLACE INTO pages (key, text, created) VALUES (?, ?, ?)", (key, text, time.time()))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def page_content_hash(pdf_document, page):
+    """
+    Hash of what a page draws: its size, rotation, content streams and the raw
+    streams of the images and forms it uses. Unlike a hash of the rendered
+    image, it is computed without rasterizing the page.
+    """
+    digest = hashlib.sha256(f"{tuple(page.rect)}:{page.rotation}:".encode("utf-8"))
+    digest.update(page.read_contents())
+    # By resource name rather than xref, which a revision of the file may renumber
+    resources = {image[7]: image[0] for image in page.get_images(full=True)}
+    resources.update((xobject[1], xobject[0]) for xobject in page.get_xobjects())
+    for name, xref in sorted(resources.items()):
+        digest.update(f":{name}:".encode("utf-8"))
+        digest.update(pdf_document.xref_stream_raw(xref) or b"")
+    return digest.hexdigest()
+
+
+def _ocr_page(pdf_path, page_num, engine, dpi, cache_path):
+    """Recognize one page in a worker process, rasterizing it only on a cache miss; returns (page_num, text, cached)"""
+    cache = OCRCache(cache_path)
+    try:
+        pdf_document = fitz_open(pdf_path)
+        try:
+            page = pdf_document[page_num]
+            key = hashlib.sha256(f"{engine}:{dpi}:{page_content_hash(pdf_document, page)}".encode("utf-8")).hexdigest()
+            text = cache.get(key)
+            if text is not None:
+                return page_num, text, True
+            png_bytes = page.get_pixmap(dpi=dpi).tobytes("png")
+        finally:
+            pdf_document.close()
+
+        text = resolve_engine(engine)(png_bytes) or ""
+        cache.put(key, text)
+        return page_num, text, False
+    finally:
+        cache.close()
+
+
+class OCRJob:
+    """
+    Pages of one document queued for OCR.
+
+    Recognized pages are collected as they finish; take_ready() hands each
+    page's text out once so callers can merge results incrementally.
+    """
+
+    def __init__(self, pdf_path, pages):
+        self.pdf_path = pdf_path
+        self.pages = list(pages)
+        self.started = time.time()
+        self.cached = 0
+        self.errors = {}
+        self._ready = {}
+        self._taken = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+
+    def _page_done(self, future, page_num):
+        with self._condition:
+            try:
+                _, text, cached = future.result()
+                self._ready[page_num] = text
+                self.cached += cached
+            except Exception as e:
+                self.errors[page_num] = str(e)
+            self._condition.notify_all()
+
+    @property
+    def done(self):
+        """Pages finished, successfully or not"""
+        with self._lock:
+            return self._taken + len(self._ready) + len(self.errors)
+
+    @property
+    def finished(self):
+        return self.done >= len(self.pages)
+
+    def take_ready(self):
+        """Dict of page number -> text for pages recognized since the last call"""
+        with self._lock:
+            ready, self._ready = self._ready, {}
+            self._taken += len(ready)
+            return ready
+
+    def wait(self, timeout=None):
+        """Block until a page is ready to take or every page is finished; returns whether the job finished"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._ready and self._taken + len(self.errors) < len(self.pages):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._taken + len(self._ready) + len(self.errors) >= len(self.pages)
+
+    def join(self, timeout=None):
+        """Block until every page is finished; returns whether the job finished"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._taken + len(self._ready) + len(self.errors) >= len(self.pages), timeout)
+
+    def status(self):
+        """Progress counts for display"""
+        return {"pages": len(self.pages), "done": self.done, "cached": self.cached, "errors": len(self.errors)}
+
+
+class OCRPool:
+    """Process pool recognizing queued pages in the background"""
+
+    def __init__(self, engine=OCR_ENGINE, workers=OCR_WORKERS, dpi=OCR_DPI, cache_path=OCR_CACHE_PATH):
+        self.engine = engine
+        self.workers = workers
+        self.dpi = dpi
+        self.cache_path = cache_path
+        self.available = engine_available(engine)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, pdf_path, pages):
+        """
+        Queue pages of a PDF for OCR.
+
+        Returns:
+            OCRJob, or None if no OCR engine is available
+        """
+        if not self.available or not pages:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            job = OCRJob(pdf_path, pages)
+            for page_num in job.pages:
+                future = self._executor.submit(_ocr_page, pdf_path, page_num, self.engine, self.dpi, self.cache_path)
+                future.add_done_callback(lambda future, page_num=page_num: job._page_done(future, page_num))
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    """Process-wide OCR pool configured from the environment"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRPool()
+        return _pool
@@ -1,12 +1,24 @@
+import argparse
+import atexit
+import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-from langchain_openai import OpenAIEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain.chains.question_answering import load_qa_chain
-from langchain_openai import OpenAI
+from index_cache import IndexCache, cache_key, content_hash
+from corpus import COMPRESSIONS, DEFAULT_COMPRESSION, INDEX_TYPES, CorpusIndex, CorpusView
+from streaming import TokenStreamHandler
+from answer_cache import AnswerCache
+from qa_engine import QAEngine
+from lexical_index import BM25Index
+from retrieval import LEXICAL_WEIGHT, RETRIEVAL_MODE, RETRIEVAL_MODES, HybridRetriever
+from ingest import EMBEDDING_BACKEND, EMBEDDING_BACKENDS, add_page_texts, build_vector_store, chunk_texts, page_hash, update_vector_store
+from document_registry import ocr_doc_key
+from ocr import OCR_ENGINE, get_ocr_pool
+from pdfutils import extract_pages
+from metrics import REGISTRY, observe, span
+from settings import format_stats
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,59 +26,320 @@ load_dotenv()
 # Get API key from environment
 api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
-    print("Error: OPENAI_API_KEY not found in .env file")
+    print("Error: OPENAI_API_KEY not found in .env file", file=sys.stderr)
     sys.exit(1)
-print("API key is loaded successfully")
-
-def read_pdf(pdf_path):
-    """Extract text from a PDF file"""
-    pdf_reader = PdfReader(pdf_path)
-    raw_text = ''
-    for page in pdf_reader.pages:
-        content = page.extract_text()
-        if content:
-            raw_text += content
-    return raw_text
-
-def split_text(raw_text):
-    """Split text into manageable chunks"""
-    text_splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=900,
-        chunk_overlap=200,
-        length_function=len,
+print("API key is loaded successfully", file=sys.stderr)
+
+def create_vector_store(pdf_path, engine):
+    """Stream a PDF into a FAISS vector store and a BM25 index over the same chunks"""
+    def on_progress(pages_done, page_count, chunk_count):
+        print(f"\rIndexed {chunk_count} chunks from {pages_done}/{page_count} pages", end="", flush=True, file=sys.stderr)
+    
+    embeddings = engine.document_embeddings()
+    lexical_index = BM25Index()
+    vector_store, stats = build_vector_store(pdf_path, embeddings, on_progress=on_progress, lexical_index=lexical_index)
+    print(file=sys.stderr)
+    print(format_stats(embeddings.stats()), file=sys.stderr)
+    return vector_store, lexical_index, stats
+
+def update_from_previous(pdf_path, previous_path, engine):
+    """
+    Update the cached index of a previous revision to pdf_path, re-embedding only changed pages.
+    
+    Returns:
+        (vector_store, lexical_index, stats), or None if the previous revision has no cached index
+    """
+    with open(previous_path, "rb") as f:
+        previous_key = cache_key(f.read(), engine.index_settings)
+    cached = IndexCache().load(previous_key, engine.embeddings)
+    if cached is None:
+        print(f"No cached index for {previous_path}; building {pdf_path} from scratch", file=sys.stderr)
+        return None
+    vector_store, _, meta = cached
+    old_page_hashes = meta.get("page_hashes") or [page_hash(page) for page in extract_pages(previous_path)]
+    embeddings = engine.document_embeddings()
+    vector_store, stats = update_vector_store(pdf_path, vector_store, old_page_hashes, embeddings)
+    print(
+        f"Updated index from {previous_path}: {len(stats['changed_pages'])} changed pages, "
+        f"{stats['removed_chunks']} chunks removed, {stats['added_chunks']} added",
+        file=sys.stderr,
     )
-    return text_splitter.split_text(raw_text)
+    print(format_stats(embeddings.stats()), file=sys.stderr)
+    # Chunk positions changed, so the lexical index is rebuilt from the updated store
+    return vector_store, BM25Index.from_texts(chunk_texts(vector_store)), stats
 
-def create_vector_store(texts):
-    """Create a FAISS vector store from text chunks"""
-    embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-    return FAISS.from_texts(texts, embeddings)
+def start_ocr(pdf_path, meta):
+    """Queue the PDF's pages without a text layer for background OCR; returns an OCRJob or None"""
+    pending = sorted(set(meta.get("textless_pages", [])) - set(meta.get("ocr_pages", [])))
+    if not pending:
+        return None
+    job = get_ocr_pool().submit(pdf_path, pending)
+    if job is None:
+        print(f"{len(pending)} pages have no text layer and OCR engine {OCR_ENGINE!r} is not available; they are not indexed", file=sys.stderr)
+    else:
+        print(f"Recognizing {len(pending)} pages without a text layer in the background", file=sys.stderr)
+    return job
 
-def answer_question(vector_store, question):
-    """Answer a question using the PDF content"""
-    chain = load_qa_chain(OpenAI(openai_api_key=os.getenv("OPENAI_API_KEY")), chain_type="stuff")
-    docs = vector_store.similarity_search(question)
-    return chain.run(input_documents=docs, question=question)
+class OCRMerger:
+    """
+    Indexes the pages an OCR job recognizes as they arrive.
 
-def main():
-    # Check if PDF path is provided
-    if len(sys.argv) < 2:
-        print("Usage: python pdf_qa.py <path_to_pdf>")
-        sys.exit(1)
+    Merged pages are saved to the index cache once the job is finished, or by
+    finish() when the session ends first, so later runs only recognize the rest.
+    """
+
+    def __init__(self, job, pdf_path, vector_store, lexical_index, meta, engine):
+        self.job = job
+        self.pdf_path = pdf_path
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.meta = meta
+        self.engine = engine
+        # Pages merged since the index was last saved
+        self.unsaved = 0
+
+    def merge(self, wait=False):
+        """
+        Index the pages recognized so far, saving the index if the job is finished.
+
+        Returns:
+            Number of pages merged
+        """
+        if wait:
+            self.job.join()
+        page_texts = self.job.take_ready()
+        if page_texts:
+            add_page_texts(self.vector_store, page_texts, self.engine.embeddings, self.lexical_index)
+            self.meta["ocr_pages"] = sorted(set(self.meta.get("ocr_pages", [])) | set(page_texts))
+            self.unsaved += len(page_texts)
+            print(f"(indexed OCR text of {len(page_texts)} more pages, {self.job.done}/{len(self.job.pages)} done)", file=sys.stderr)
+        if self.job.finished:
+            self.save()
+        return len(page_texts)
+
+    def finish(self):
+        """Index the pages recognized so far and save any merged pages, finished or not"""
+        self.merge()
+        self.save()
+
+    def save(self):
+        """Save the index if pages were merged since the last save"""
+        if not self.unsaved:
+            return
+        with open(self.pdf_path, "rb") as f:
+            key = cache_key(f.read(), self.engine.index_settings)
+        IndexCache().save(key, self.vector_store, chunk_texts(self.vector_store), self.meta, self.lexical_index)
+        self.unsaved = 0
+
+def parse_pages(spec):
+    """Parse a 1-based page list like "1-10,15" into a set of 0-based pages"""
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        pages.update(range(int(first) - 1, int(last or first)))
+    return pages
+
+def weight(value):
+    """argparse type for a weight between 0 and 1"""
+    try:
+        value = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a number")
+    if not 0 <= value <= 1:
+        raise argparse.ArgumentTypeError(f"{value} is not between 0 and 1")
+    return value
+
+def load_or_build_index(pdf_path, engine, previous_path=None):
+    """
+    Load a PDF's vector and lexical indexes from the index cache, or build and cache them.
+    
+    With previous_path, a missing index is derived from that revision's cached
+    index by re-indexing only the pages that changed.
+    """
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+    key = cache_key(pdf_bytes, engine.index_settings)
+    index_cache = IndexCache()
+    with span("cli.index_cache_load"):
+        cached = index_cache.load(key, engine.embeddings)
+        lexical_index = index_cache.load_lexical(key, cached[1]) if cached is not None else None
     
-    pdf_path = sys.argv[1]
+    if cached is not None:
+        vector_store, texts, meta = cached
+        print(f"Loaded cached index for {pdf_path} ({len(texts)} text chunks)", file=sys.stderr)
+        return vector_store, lexical_index, content_hash(pdf_bytes), meta
     
     # Process the PDF
-    print(f"Reading PDF: {pdf_path}")
-    raw_text = read_pdf(pdf_path)
-    print(f"Extracted {len(raw_text)} characters from PDF")
+    updated = update_from_previous(pdf_path, previous_path, engine) if previous_path else None
+    if updated is not None:
+        vector_store, lexical_index, stats = updated
+    else:
+        print(f"Reading PDF: {pdf_path}", file=sys.stderr)
+        vector_store, lexical_index, stats = create_vector_store(pdf_path, engine)
+        print(f"Extracted {stats['char_count']} characters into {stats['chunk_count']} text chunks", file=sys.stderr)
+        print("Vector store created successfully", file=sys.stderr)
+    print("Stage times: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stats["timings"].items()), file=sys.stderr)
+    
+    meta = {
+        "pdf_name": os.path.basename(pdf_path),
+        "page_count": stats["page_count"],
+        "char_count": stats["char_count"],
+        "page_hashes": stats["page_hashes"],
+        "textless_pages": stats["textless_pages"],
+    }
+    with span("cli.index_cache_save"):
+        index_cache.save(key, vector_store, chunk_texts(vector_store), meta, lexical_index)
+    return vector_store, lexical_index, content_hash(pdf_bytes), meta
+
+def read_questions(lines):
+    """
+    Parse batch questions: one per line, or JSONL objects with a "question" and optional "id".
+
+    Malformed JSONL lines are reported on stderr with their line number and skipped.
+    
+    Returns:
+        List of (id, question); plain lines are numbered from 1
+    """
+    questions = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+                question = item["question"]
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping question line {number}: {e.__class__.__name__}: {e}", file=sys.stderr)
+                continue
+            questions.append((item.get("id", number), question))
+        else:
+            questions.append((number, line))
+    return questions
+
+def run_batch(engine, retriever, doc_key, questions, output, workers=4):
+    """
+    Answer questions concurrently, writing one JSON line per question in input order.
+    
+    Every worker shares the engine's clients, chains and the retriever's indexes.
+    
+    Returns:
+        Number of questions that failed
+    """
+    def answer(item):
+        question_id, question = item
+        try:
+            result = engine.answer(retriever, question, doc_key=doc_key)
+        except Exception as e:
+            return {"id": question_id, "question": question, "error": str(e)}
+        return {
+            "id": question_id,
+            "question": question,
+            "answer": result["answer"],
+            "pages": [page + 1 for page in result["pages"]],
+            "relevant_chunks": result["relevant_chunks"],
+            "cache_match": result["cache_match"],
+            "context": result.get("context"),
+            "timings_ms": {stage: round(seconds * 1000, 2) for stage, seconds in result["timings"].items()},
+        }
+    
+    failed = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for record in executor.map(answer, questions):
+            failed += "error" in record
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    elapsed = time.perf_counter() - started
+    print(
+        f"Answered {len(questions) - failed}/{len(questions)} questions in {elapsed:.1f}s "
+        f"({len(questions) / max(elapsed, 1e-9):.1f} questions/s, {workers} workers)",
+        file=sys.stderr,
+    )
+    return failed
+
+def write_metrics(path):
+    """Write the process metrics in Prometheus text format"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.prometheus_text())
+
+def main():
+    parser = argparse.ArgumentParser(description="Ask questions about the contents of PDF documents")
+    parser.add_argument("pdf_paths", nargs="+", metavar="path_to_pdf")
+    parser.add_argument("--corpus", metavar="DIR", help="Add the PDFs to the multi-document corpus in DIR and search across it")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="auto", help="Corpus index type (default: chosen by corpus size)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DEFAULT_COMPRESSION, help="How the corpus index stores vectors; compressed results are re-ranked with exact vectors (default: %(default)s)")
+    parser.add_argument("--doc", action="append", metavar="NAME", help="Only search corpus documents with this file name (repeatable)")
+    parser.add_argument("--pages", help="Only search these 1-based corpus pages, e.g. 1-10,15")
+    parser.add_argument("--retrieval", choices=RETRIEVAL_MODES, default=RETRIEVAL_MODE, help="Vector, BM25 (lexical, no embedding calls) or fused hybrid retrieval (default: %(default)s)")
+    parser.add_argument("--lexical-weight", type=weight, default=LEXICAL_WEIGHT, help="Share of the BM25 ranking in hybrid retrieval (default: %(default)s)")
+    parser.add_argument("--questions", metavar="FILE", help="Answer the questions in FILE ('-' for stdin; one per line or JSONL) instead of prompting")
+    parser.add_argument("--output", metavar="FILE", help="Write batch answers as JSONL to FILE (default: stdout)")
+    parser.add_argument("--workers", type=int, default=4, help="Questions answered concurrently in batch mode; beyond HTTP_MAX_CONNECTIONS workers wait for a connection (default: %(default)s)")
+    parser.add_argument("--no-answer-cache", action="store_true", help="Always ask the model instead of reusing cached answers")
+    parser.add_argument("--update-from", metavar="OLD_PDF", help="Derive the index of a new revision from OLD_PDF's cached index, re-indexing only changed pages")
+    parser.add_argument("--embeddings", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND, help="OpenAI API or local CPU embeddings; indexes are cached per backend (default: %(default)s)")
+    parser.add_argument("--metrics", metavar="FILE", help="Write stage timings and token counters in Prometheus text format to FILE on exit")
+    args = parser.parse_args()
+    
+    if not args.corpus and (len(args.pdf_paths) > 1 or args.doc or args.pages):
+        parser.error("searching several PDFs, --doc and --pages require --corpus")
+    if args.corpus and args.update_from:
+        parser.error("--update-from works on a single PDF without --corpus")
+    pages = parse_pages(args.pages) if args.pages else None
+    if args.metrics:
+        atexit.register(write_metrics, args.metrics)
+    engine = QAEngine(answer_cache=None if args.no_answer_cache else AnswerCache(), embedding_backend_name=args.embeddings)
     
-    texts = split_text(raw_text)
-    print(f"Split into {len(texts)} text chunks")
+    ocr_merger = None
+    if args.corpus:
+        corpus = CorpusIndex(args.corpus, engine.embeddings, index_type=args.index_type, compression=args.compression)
+        for pdf_path in args.pdf_paths:
+            vector_store, _, doc_id, meta = load_or_build_index(pdf_path, engine)
+            if not corpus.contains(doc_id):
+                with span("cli.corpus_add"):
+                    corpus.add_vector_store(doc_id, os.path.basename(pdf_path), vector_store, meta)
+        doc_ids = None
+        if args.doc:
+            doc_ids = [doc["doc_id"] for doc in corpus.documents() if doc["name"] in args.doc]
+        # Corpus searches are vector only
+        vector_store = CorpusView(corpus, doc_ids, pages)
+        retriever = HybridRetriever(vector_store)
+        doc_key = vector_store.doc_key()
+        print(
+            f"Corpus {args.corpus}: {len(corpus.documents())} documents, {corpus.chunk_count()} chunks, "
+            f"{corpus.index_bytes() / 1024 / 1024:.1f} MB index ({corpus.compression})",
+            file=sys.stderr,
+        )
+    else:
+        vector_store, lexical_index, doc_id, meta = load_or_build_index(args.pdf_paths[0], engine, args.update_from)
+        retriever = HybridRetriever(vector_store, lexical_index, args.retrieval, args.lexical_weight)
+        ocr_job = start_ocr(args.pdf_paths[0], meta)
+        if ocr_job:
+            ocr_merger = OCRMerger(ocr_job, args.pdf_paths[0], vector_store, lexical_index, meta, engine)
+            # Keep the OCR text merged so far for the next run, however the session ends
+            atexit.register(ocr_merger.finish)
+        if ocr_merger and args.questions:
+            # Batch answers should not depend on how far OCR got
+            ocr_merger.merge(wait=True)
+        doc_key = ocr_doc_key(doc_id, meta)
     
-    vector_store = create_vector_store(texts)
-    print("Vector store created successfully")
+    if args.questions:
+        if args.questions == "-":
+            questions = read_questions(sys.stdin)
+        else:
+            with open(args.questions, "r", encoding="utf-8") as f:
+                questions = read_questions(f)
+        # Progress messages go to stderr, so stdout only carries the JSONL answers
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as output:
+                failed = run_batch(engine, retriever, doc_key, questions, output, args.workers)
+        else:
+            failed = run_batch(engine, retriever, doc_key, questions, sys.stdout, args.workers)
+        sys.exit(1 if failed else 0)
     
     # Interactive Q&A loop
     print("\nYou can now ask questions about the PDF content. Type 'exit' to quit.")
@@ -76,10 +349,27 @@ def main():
             break
         
         try:
-            answer = answer_question(vector_store, question)
-            print(f"\nAnswer: {answer}")
+            if ocr_merger and ocr_merger.merge():
+                doc_key = ocr_doc_key(doc_id, meta)
+            # Print tokens as they arrive
+            print("\nAnswer: ", end="", flush=True)
+            stream_handler = TokenStreamHandler(lambda token: print(token, end="", flush=True))
+            result = engine.answer(retriever, question, stream_handler, doc_key)
+            if stream_handler.token_count == 0:
+                print(result["answer"], end="")
+            print()
+            if result["cache_match"]:
+                print(f"(cached answer, {result['cache_match']} match)")
+            if result.get("context"):
+                context = result["context"]
+                print(f"(context: {context['tokens_after']} tokens in {context['packed']} chunks, {context['tokens_saved']} saved)")
+            if stream_handler.time_to_first_token is not None:
+                observe("answer.time_to_first_token", stream_handler.time_to_first_token)
+                print(f"(first token after {stream_handler.time_to_first_token:.2f}s)")
+            if result["pages"]:
+                print(f"Source pages: {', '.join(str(page + 1) for page in result['pages'])}")
         except Exception as e:
             print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
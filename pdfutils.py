@@ -1,83 +1,188 @@
-import base64
-import tempfile
 import os
 from PyPDF2 import PdfReader, PdfWriter
-from fitz import open as fitz_open  # PyMuPDF
-import difflib
-import re
+from fitz import Matrix, open as fitz_open  # PyMuPDF
+from fuzzy_index import get_paragraph_index
+from highlight_cache import get_highlight_cache, highlight_key
+from metrics import span
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def find_page_and_highlight(pdf_path, search_text, threshold=0.6):
+# Page extraction settings; 0 workers means one per CPU core
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+MAX_PAGES_PER_TASK = 16
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extract the text of pages [start, stop) in a worker process"""
+    pdf_reader = PdfReader(pdf_path)
+    return [pdf_reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+def count_pages(pdf_file):
+    """Return the number of pages in a PDF"""
+    with span("pdf.count_pages"):
+        return len(PdfReader(pdf_file).pages)
+
+def iter_pages(pdf_file, workers=None, min_pages=PARALLEL_MIN_PAGES):
+    """
+    Yield the text of every page of a PDF, in page order.
+    
+    Only a bounded number of page ranges are extracted ahead of the consumer,
+    so memory use does not grow with the size of the document.
+    
+    Args:
+        pdf_file: Path to the PDF file, or a file-like object
+        workers: Number of worker processes (defaults to EXTRACT_WORKERS)
+        min_pages: Documents with fewer pages are extracted serially
+    
+    Yields:
+        One text string per page ('' for pages without a text layer)
+    """
+    workers = workers or EXTRACT_WORKERS
+    pdf_reader = PdfReader(pdf_file)
+    page_count = len(pdf_reader.pages)
+    
+    # Worker processes need a path they can reopen; small files aren't worth the startup cost
+    if workers <= 1 or page_count < min_pages or not isinstance(pdf_file, (str, os.PathLike)):
+        for page in pdf_reader.pages:
+            yield page.extract_text() or ''
+        return
+    
+    # Several small ranges per worker keeps the pool busy when some pages are slower than others
+    range_size = max(1, min(MAX_PAGES_PER_TASK, -(-page_count // (workers * 4))))
+    ranges = iter([(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)])
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, stop in ranges:
+            pending.append(executor.submit(_extract_page_range, pdf_file, start, stop))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            texts = pending.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(executor.submit(_extract_page_range, pdf_file, *next_range))
+            yield from texts
+
+def extract_pages(pdf_file, workers=None, min_pages=PARALLEL_MIN_PAGES):
+    """
+    Extract the text of every page of a PDF, in page order.
+    
+    Args:
+        pdf_file: Path to the PDF file, or a file-like object
+        workers: Number of worker processes (defaults to EXTRACT_WORKERS)
+        min_pages: Documents with fewer pages are extracted serially
+    
+    Returns:
+        List with one text string per page ('' for pages without a text layer)
+    """
+    with span("pdf.extract"):
+        return list(iter_pages(pdf_file, workers=workers, min_pages=min_pages))
+
+# Scale of PNG page previews (1.0 = 72 dpi)
+HIGHLIGHT_ZOOM = float(os.getenv("HIGHLIGHT_ZOOM", "1.5"))
+
+def _render_page(pdf_document, page_num, spans, fmt, zoom, output_path):
+    """Write one page with highlighted spans as a single-page PDF or a PNG"""
+    page_doc = fitz_open()
+    page_doc.insert_pdf(pdf_document, from_page=page_num, to_page=page_num)
+    page = page_doc[0]
+    for rect in spans:
+        highlight = page.add_highlight_annot(rect)
+        highlight.set_colors(stroke=(1, 1, 0))  # Yellow highlight
+        highlight.set_opacity(0.3)  # Semi-transparent
+        highlight.update()
+    if fmt == "png":
+        page.get_pixmap(matrix=Matrix(zoom, zoom), annots=True).save(output_path)
+    else:
+        page_doc.save(output_path, garbage=3, deflate=True)
+    page_doc.close()
+
+def find_highlights(pdf_path, search_text, threshold=0.6, pages=None):
     """
-    Find the best matches for search_text in the PDF and return a highlighted PDF.
+    Find the best matches for search_text in the PDF without rendering anything.
+    
+    Candidate paragraphs come from the document's cached shingle index, and
+    fuzzy matching only runs on those candidates.
     
     Args:
         pdf_path: Path to the PDF file
         search_text: Text to search for
         threshold: Similarity threshold for fuzzy matching
+        pages: Optional 0-based page numbers to search (e.g. from chunk metadata);
+            all pages are searched when omitted
     
     Returns:
-        Path to a highlighted PDF file and a list of page numbers where matches were found
+        List of (page number, highlighted rectangles as (x0, y0, x1, y1) tuples), by page
     """
-    # Open the PDF
-    pdf_document = fitz_open(pdf_path)
-    matching_pages = []
-    
-    # Clean and normalize the search text
-    search_text = re.sub(r'\s+', ' ', search_text).strip()
-    
-    # Search each page for text
-    for page_num, page in enumerate(pdf_document):
-        text = page.get_text()
-        
-        # Split text into paragraphs (more natural chunks)
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-        
-        # Find best matching paragraphs using fuzzy matching
-        for paragraph in paragraphs:
-            # Clean and normalize paragraph text
-            paragraph = re.sub(r'\s+', ' ', paragraph).strip()
-            
-            # Calculate similarity
-            similarity = difflib.SequenceMatcher(None, search_text.lower(), paragraph.lower()).ratio()
-            
-            if similarity > threshold:
-                # Found a match, highlight it
-                matching_pages.append(page_num)
-                
-                # Search for the paragraph in the page
-                text_instances = page.search_for(paragraph)
-                
-                # Add highlight with better visibility
-                for inst in text_instances:
-                    highlight = page.add_highlight_annot(inst)
-                    highlight.set_colors(stroke=(1, 1, 0))  # Yellow highlight
-                    highlight.set_opacity(0.3)  # Semi-transparent
-                    highlight.update()
-                break
+    with span("highlight.match"):
+        matches = get_paragraph_index(pdf_path).best_matches(search_text, threshold, pages)
+        if not matches:
+            return []
+        pdf_document = fitz_open(pdf_path)
+        try:
+            hits = []
+            for page_num in sorted(matches):
+                page = pdf_document[page_num]
+                hits.append((page_num, [tuple(rect) for paragraph in matches[page_num] for rect in page.search_for(paragraph)]))
+        finally:
+            pdf_document.close()
+    return hits
+
+def render_highlights(pdf_path, hits, doc_id=None, fmt="png", zoom=HIGHLIGHT_ZOOM, cache=None):
+    """
+    Render pages with highlighted rectangles, each as its own single-page PDF or PNG preview.
     
-    # If we found matches, save the highlighted PDF
-    if matching_pages:
-        output_path = tempfile.mktemp(suffix='.pdf')
-        pdf_document.save(output_path)
-        pdf_document.close()
-        return output_path, matching_pages
+    Renders are cached on disk by (document, page, highlighted spans), so
+    rendering the same hits again only looks them up.
     
-    pdf_document.close()
-    return None, []
-
-def get_pdf_download_link(pdf_path, filename="highlighted.pdf"):
-    """Generate a download link for a PDF file"""
-    with open(pdf_path, "rb") as f:
-        pdf_bytes = f.read()
-    
-    b64 = base64.b64encode(pdf_bytes).decode()
-    href = f'<a href="data:application/pdf;base64,{b64}" download="{filename}" target="_blank" class="highlighted-pdf-link">View Highlighted PDF</a>'
-    return href
+    Args:
+        pdf_path: Path to the PDF file
+        hits: List of (page number, rectangles) from find_highlights()
+        doc_id: Content hash of the PDF; the file's path, size and modification
+            time identify it when omitted
+        fmt: "png" for a preview image or "pdf" for a single-page PDF
+        zoom: PNG scale (1.0 = 72 dpi)
+        cache: HighlightCache; the process-wide one by default
+    
+    Returns:
+        List of (page number, path of the rendered page)
+    """
+    if not hits:
+        return []
+    if doc_id is None:
+        stat = os.stat(pdf_path)
+        doc_id = f"{os.path.abspath(pdf_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    cache = cache or get_highlight_cache()
+    rendered = []
+    # The PDF is only opened once a page is not cached yet
+    opened = []
+    
+    def render(page_num, spans, output_path):
+        if not opened:
+            opened.append(fitz_open(pdf_path))
+        _render_page(opened[0], page_num, spans, fmt, zoom, output_path)
+    
+    with span("highlight.render"):
+        try:
+            for page_num, spans in hits:
+                key = highlight_key(doc_id, page_num, spans, fmt, zoom if fmt == "png" else None)
+                path = cache.get(key, fmt, lambda output_path: render(page_num, spans, output_path))
+                rendered.append((page_num, path))
+        finally:
+            for pdf_document in opened:
+                pdf_document.close()
+    return rendered
 
-def cleanup_temp_pdf(pdf_path):
-    """Clean up temporary PDF file"""
-    try:
-        if pdf_path and os.path.exists(pdf_path):
-            os.unlink(pdf_path)
-    except Exception as e:
-        print(f"Error cleaning up temp PDF: {e}") 
\ No newline at end of file
+def find_page_and_highlight(pdf_path, search_text, threshold=0.6, pages=None, doc_id=None, fmt="png", zoom=HIGHLIGHT_ZOOM, cache=None):
+    """
+    Find the best matches for search_text in the PDF and render the matching pages highlighted.
+    
+    Combines find_highlights() and render_highlights(); see those for the arguments.
+    
+    Returns:
+        List of (page number, path of the rendered page) and the list of matching page numbers
+    """
+    hits = find_highlights(pdf_path, search_text, threshold, pages)
+    rendered = render_highlights(pdf_path, hits, doc_id, fmt, zoom, cache)
+    return rendered, [page_num for page_num, _ in hits]
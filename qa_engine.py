@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+
+import httpx
+from langchain.chains.question_answering import load_qa_chain
+from langchain_openai import OpenAI
+
+import metrics
+from answer_cache import answer_scope
+from context_packing import ContextPacker
+from embedding_scheduler import get_token_counter
+from ingest import (
+    ANSWER_SETTINGS, EMBEDDING_BACKEND, LLM_MODEL, RETRIEVAL_K, get_embedding_backend, get_embeddings, index_settings,
+    source_pages,
+)
+
+# Send a tiny embedding and completion request at startup to open connections early
+QA_WARM_UP = os.getenv("QA_WARM_UP", "0") == "1"
+# Keep-alive connections shared by all sessions and threads of the process
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+
+def retrieval_settings(retriever, packer=None, index=None):
+    """Settings that determine an answer, including how chunks were embedded, retrieved and packed"""
+    settings = dict(ANSWER_SETTINGS, retrieval_mode=retriever.mode)
+    if index is not None:
+        settings["index"] = index
+    if retriever.mode == "hybrid":
+        settings["lexical_weight"] = retriever.lexical_weight
+    if packer is not None:
+        settings["context"] = packer.settings
+    return settings
+
+
+class QAEngine:
+    """
+    Long-lived question answering engine shared by every session of a process.
+
+    Holds one pooled keep-alive HTTP client, the embeddings scheduler built on
+    it, the LLM clients and their preloaded QA chains, so answering a question
+    only runs retrieval and the chain.
+    """
+
+    def __init__(
+        self, model=LLM_MODEL, answer_cache=None, warm_up=QA_WARM_UP, llm=None, embedding_backend=None, packer=None,
+        embedding_backend_name=EMBEDDING_BACKEND, embedding_cache_path=None, count_tokens=None,
+    ):
+        """
+        Args:
+            model: Completion model name
+            answer_cache: Optional AnswerCache
+            warm_up: Send warm-up requests at startup
+            llm: Optional LangChain LLM replacing the OpenAI clients (e.g. a fake for benchmarks)
+            embedding_backend: Optional embeddings replacing the configured backend
+            packer: Optional ContextPacker; by default one configured from the environment
+            embedding_backend_name: Backend created when embedding_backend is not given, one of EMBEDDING_BACKENDS
+            embedding_cache_path: SQLite file caching document vectors; the default embedding cache if None
+            count_tokens: Optional function counting a text's tokens, replacing the model's tokenizer
+        """
+        self.model = model
+        self.answer_cache = answer_cache
+        self.metrics = metrics.REGISTRY
+        self.count_tokens = count_tokens or get_token_counter(model)
+        self.packer = packer or ContextPacker(model, count_tokens=count_tokens)
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            ),
+            timeout=HTTP_TIMEOUT_SECONDS,
+        )
+        self.embedding_backend = embedding_backend or get_embedding_backend(self.http_client, embedding_backend_name)
+        self.embeddings = get_embeddings(self.embedding_backend, embedding_cache_path)
+        # Index cache keys of documents embedded by this engine's backend
+        self.index_settings = index_settings(self.embeddings.model)
+
+        if llm is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            self.llm = OpenAI(model_name=model, openai_api_key=api_key, http_client=self.http_client)
+            self.streaming_llm = OpenAI(
+                model_name=model, openai_api_key=api_key, http_client=self.http_client, streaming=True
+            )
+        else:
+            self.llm = self.streaming_llm = llm
+        self.chain = load_qa_chain(self.llm, chain_type=ANSWER_SETTINGS["chain_type"])
+        self.streaming_chain = load_qa_chain(self.streaming_llm, chain_type=ANSWER_SETTINGS["chain_type"])
+
+        if warm_up:
+            self.warm_up()
+
+    def document_embeddings(self):
+        """Embeddings for indexing one document: own cache statistics, shared connections"""
+        return self.embeddings.with_own_stats()
+
+    def warm_up(self):
+        """Open connections with minimal requests; failures are reported, not raised"""
+        started = time.perf_counter()
+        try:
+            self.embedding_backend.embed_query("warm up")
+            self.llm.invoke("Hi", max_tokens=1)
+        except Exception as e:
+            print(f"QA engine warm-up failed: {e}", file=sys.stderr)
+            return
+        self.metrics.observe("answer.warm_up", time.perf_counter() - started)
+
+    def count_prompt_tokens(self, docs, question):
+        """Tokens of the prompt the stuff chain sends for these chunks and question"""
+        context = self.chain.document_separator.join(doc.page_content for doc in docs)
+        prompt = self.chain.llm_chain.prompt.format(context=context, question=question)
+        return self.count_tokens(prompt)
+
+    def answer(self, retriever, question, stream_handler=None, doc_key=None):
+        """
+        Answer a question, streaming tokens to stream_handler if given.
+
+        With an answer cache and doc_key, repeated and near-duplicate questions
+        are answered from the cache.
+
+        Args:
+            retriever: HybridRetriever over the document or library
+            question: Question text
+            stream_handler: Optional callback handler receiving LLM tokens
+            doc_key: Key of the searched documents for the answer cache
+
+        Returns:
+            Dict with answer, pages, relevant_chunks, best_match (text and pages
+            of the top chunk), cache_match ("exact", "semantic" or None),
+            context packing stats when the LLM was called, per-stage timings in seconds and, when metrics are enabled and the
+            LLM was called, prompt/completion token counts
+        """
+        started = time.perf_counter()
+        timings = {}
+        cached = query_vector = scope = None
+        if self.answer_cache is not None and doc_key:
+            scope = answer_scope(doc_key, retrieval_settings(retriever, self.packer, self.index_settings), self.model)
+            embed_query = self.embeddings.embed_query if retriever.needs_embedding else None
+            cached, query_vector = self.answer_cache.lookup(scope, question, embed_query)
+            timings["cache_lookup"] = time.perf_counter() - started
+
+        if cached is not None:
+            result = dict(cached["payload"], answer=cached["answer"], cache_match=cached["match"])
+        else:
+            stage_start = time.perf_counter()
+            docs = retriever.search(question, k=self.packer.fetch_k(RETRIEVAL_K), query_vector=query_vector)
+            timings["retrieval"] = time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
+            docs, context = self.packer.pack(docs, RETRIEVAL_K)
+            timings["packing"] = time.perf_counter() - stage_start
+            self.metrics.count("context_tokens", context["tokens_after"])
+            self.metrics.count("context_tokens_saved", context["tokens_saved"])
+
+            stage_start = time.perf_counter()
+            if stream_handler is not None:
+                answer = self.streaming_chain.run(input_documents=docs, question=question, callbacks=[stream_handler])
+            else:
+                answer = self.chain.run(input_documents=docs, question=question)
+            timings["generation"] = time.perf_counter() - stage_start
+            if self.metrics.enabled:
+                tokens = {"prompt": self.count_prompt_tokens(docs, question), "completion": self.count_tokens(answer)}
+                self.metrics.count("llm_prompt_tokens", tokens["prompt"])
+                self.metrics.count("llm_completion_tokens", tokens["completion"])
+
+            payload = {
+                "pages": source_pages(docs),
+                "relevant_chunks": [doc.page_content for doc in docs],
+                "best_match": {"text": docs[0].page_content, "pages": docs[0].metadata.get("pages", [])} if docs else None,
+            }
+            if scope:
+                self.answer_cache.put(scope, question, query_vector, answer, payload)
+            result = dict(payload, answer=answer, cache_match=None, context=context)
+            if self.metrics.enabled:
+                result["tokens"] = tokens
+
+        timings["total"] = time.perf_counter() - started
+        for stage, seconds in timings.items():
+            self.metrics.observe(f"answer.{stage}", seconds)
+        self.metrics.count("answers", cache_match=result["cache_match"] or "miss")
+        result["timings"] = timings
+        return result
+
+    def close(self):
+        """Close pooled connections"""
+        self.http_client.close()
@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+# hybrid fuses vector and BM25 rankings, vector and lexical use one of them
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Share of the fused score given to the BM25 ranking (0 = vector only, 1 = lexical only)
+LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.5"))
+# Reciprocal rank fusion constant; larger values flatten the gap between ranks
+RRF_K = 60
+# Candidates taken from each ranking per result
+FETCH_MULTIPLIER = 4
+
+
+def reciprocal_rank_fusion(rankings, weights, rrf_k=RRF_K):
+    """
+    Fuse ranked lists of ids.
+
+    Args:
+        rankings: Lists of ids, best first
+        weights: Weight of each ranking
+        rrf_k: Rank offset of the fusion
+
+    Returns:
+        Ids ordered by fused score, best first
+    """
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + weight / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever:
+    """
+    Retrieve chunks from a vector store, a BM25 index over the same chunks, or both.
+
+    The lexical index numbers chunks by their position in the FAISS index, so
+    both rankings can be fused by position. Without a lexical index (e.g. for
+    library searches) every mode falls back to vector search. Indexes that are
+    still being built are searched while holding the lock their builder adds
+    chunks under.
+    """
+
+    def __init__(self, vector_store, lexical_index=None, mode=RETRIEVAL_MODE, lexical_weight=LEXICAL_WEIGHT, lock=None):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {', '.join(RETRIEVAL_MODES)}")
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.mode = mode if lexical_index is not None else "vector"
+        self.lexical_weight = lexical_weight
+        self.lock = lock
+
+    @property
+    def needs_embedding(self):
+        """Whether searching embeds the query"""
+        return self.mode != "lexical"
+
+    def _document(self, position):
+        docstore_id = self.vector_store.index_to_docstore_id[position]
+        return self.vector_store.docstore.search(docstore_id)
+
+    def _vector_positions(self, query_vector, fetch_k):
+        _, positions = self.vector_store.index.search(np.asarray([query_vector], dtype="float32"), fetch_k)
+        return [int(position) for position in positions[0] if position >= 0]
+
+    def search(self, query, k=4, query_vector=None):
+        """
+        Chunks most relevant to a query.
+
+        Args:
+            query: Question text
+            k: Number of chunks
+            query_vector: Optional precomputed query embedding
+
+        Returns:
+            List of LangChain Documents, best first
+        """
+        if self.lock is None:
+            return self._search(query, k, query_vector)
+        # Embed the query first so indexing is not held up by the embedding call
+        if query_vector is None and self.needs_embedding:
+            query_vector = self.vector_store.embeddings.embed_query(query)
+        with self.lock:
+            return self._search(query, k, query_vector)
+
+    def _search(self, query, k, query_vector):
+        if self.mode == "vector":
+            if query_vector is not None:
+                return self.vector_store.similarity_search_by_vector(query_vector, k=k)
+            return self.vector_store.similarity_search(query, k=k)
+
+        fetch_k = k * FETCH_MULTIPLIER
+        lexical = [position for position, _ in self.lexical_index.search(query, fetch_k)]
+        if self.mode == "lexical":
+            return [self._document(position) for position in lexical[:k]]
+
+        if query_vector is None:
+            query_vector = self.vector_store.embeddings.embed_query(query)
+        vector = self._vector_positions(query_vector, fetch_k)
+        fused = reciprocal_rank_fusion([vector, lexical], [1 - self.lexical_weight, self.lexical_weight])
+        return [self._document(position) for position in fused[:k]]
@@ -0,0 +1,25 @@
+"""
+Settings and formatting helpers shared by the web app and the indexing pipeline.
+
+The app imports this module before it renders its first page, so it must
+stay cheap to import: no LangChain, FAISS, OpenAI client or PDF libraries.
+"""
+import os
+
+# "openai" (EMBEDDING_MODEL over the API), or a local CPU backend: "hashing" or "onnx"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_BACKENDS = ("openai", "hashing", "onnx")
+# Texts sent to the embedding backend per request
+EMBED_REQUEST_SIZE = int(os.getenv("EMBED_REQUEST_SIZE", "64"))
+# Maximum number of embedding requests running at once
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+
+
+def format_stats(stats):
+    """Human readable one-line summary of embedding cache stats"""
+    total = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / total * 100 if total else 0.0
+    return (
+        f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"({hit_rate:.0f}% hit rate, ~{stats['seconds_saved']:.1f}s of embedding calls saved)"
+    )
@@ -0,0 +1,38 @@
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """
+    Callback that forwards LLM tokens as they arrive and times the first one.
+
+    Args:
+        on_token: Function called with each new token
+    """
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.token_count = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.started_at = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.token_count += 1
+        self.on_token(token)
+
+    def on_llm_end(self, response, **kwargs):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from the LLM request to the first token, or None"""
+        if self.started_at is None or self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import fitz
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def pdf_bytes():
+    """A small PDF with a text layer on every page"""
+    document = fitz.open()
+    for page_num in range(3):
+        page = document.new_page()
+        for line in range(20):
+            page.insert_text(
+                (72, 72 + line * 14), f"Page {page_num + 1} line {line}: the maintenance interval is {page_num * 20 + line} days."
+            )
+    data = document.tobytes()
+    document.close()
+    return data
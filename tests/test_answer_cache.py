@@ -0,0 +1,85 @@
+import math
+
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, answer_scope
+
+DIMS = 8
+SCOPE = answer_scope("manual", {"k": 4}, "test-model")
+
+
+def vector(similarity):
+    """Unit vector with the given cosine similarity to the first axis"""
+    values = [0.0] * DIMS
+    values[0] = similarity
+    values[1] = math.sqrt(1 - similarity ** 2)
+    return values
+
+
+def axis_vector(axis):
+    """Unit vector along one axis, orthogonal to every other axis"""
+    values = [0.0] * DIMS
+    values[axis] = 1.0
+    return values
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(str(tmp_path / "answers.sqlite3"))
+
+
+def test_exact_lookup_ignores_case_spacing_and_trailing_punctuation(cache):
+    cache.put(SCOPE, "How often is the pump serviced?", None, "Every 30 days.", {"pages": [1]})
+
+    entry, embedded = cache.lookup(SCOPE, "  how often is the  pump serviced ", lambda question: pytest.fail("embedded"))
+    assert entry["answer"] == "Every 30 days." and entry["match"] == "exact" and entry["payload"] == {"pages": [1]}
+    assert embedded is None
+    assert cache.get_exact(answer_scope("other manual", {"k": 4}, "test-model"), "How often is the pump serviced?") is None
+
+
+def test_a_paraphrase_hits_and_a_different_question_about_the_document_misses(cache):
+    cache.put(SCOPE, "How often is the pump serviced?", vector(1.0), "Every 30 days.")
+
+    # Typical ada-002 similarities: a rephrasing, and another question about the same manual
+    entry, _ = cache.lookup(SCOPE, "What is the service interval of the pump?", lambda question: vector(0.98))
+    assert entry["match"] == "semantic" and entry["answer"] == "Every 30 days."
+    assert entry["similarity"] == pytest.approx(0.98)
+
+    entry, embedded = cache.lookup(SCOPE, "How often are the valves inspected?", lambda question: vector(0.96))
+    assert entry is None and embedded == vector(0.96)
+    assert cache.stats() == {"exact_hits": 0, "semantic_hits": 1, "misses": 1, "lookups": 2, "hit_rate": 0.5}
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl_seconds=60)
+    cache.put(SCOPE, "How often is the pump serviced?", vector(1.0), "Every 30 days.")
+
+    now[0] += 59
+    assert cache.get_exact(SCOPE, "How often is the pump serviced?") is not None
+    assert cache.get_similar(SCOPE, vector(0.99)) is not None
+
+    now[0] += 2
+    assert cache.get_exact(SCOPE, "How often is the pump serviced?") is None
+    assert cache.get_similar(SCOPE, vector(0.99)) is None
+
+
+def test_least_recently_used_entries_are_evicted_beyond_max_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), max_entries=2)
+    for number, question in enumerate(["Pump interval?", "Valve inspection?"], 2):
+        cache.put(SCOPE, question, axis_vector(number), f"Answer {number}")
+        now[0] += 1
+    assert cache.get_exact(SCOPE, "Pump interval?") is not None
+    now[0] += 1
+
+    cache.put(SCOPE, "Filter replacement?", axis_vector(4), "Answer 4")
+
+    assert cache.get_exact(SCOPE, "Valve inspection?") is None
+    assert cache.get_exact(SCOPE, "Pump interval?") is not None
+    # The evicted question's vector is gone from the near-duplicate layer too
+    assert cache.get_similar(SCOPE, axis_vector(3)) is None
+    assert cache.get_similar(SCOPE, axis_vector(2))["answer"] == "Answer 2"
@@ -0,0 +1,140 @@
+import asyncio
+
+import fitz
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from langchain_openai import OpenAIEmbeddings
+
+from answer_cache import AnswerCache
+from api_server import QAService, create_app
+from document_registry import DocumentRegistry
+from embedding_scheduler import ScheduledEmbeddings
+from fake_servers import FakeOpenAIServer
+from ingest import EMBEDDING_MODEL
+from qa_engine import QAEngine
+
+
+@pytest.fixture
+def fake_openai(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with FakeOpenAIServer() as server:
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        yield server
+
+
+def run_with_client(tmp_path, server, scenario, **service_options):
+    """Run scenario(client) against the API served on a local port, backed by the fake OpenAI server"""
+    # Chunk lengths are not checked with tiktoken, which would download its encodings
+    client = OpenAIEmbeddings(
+        model=EMBEDDING_MODEL, openai_api_key="test", base_url=server.base_url, max_retries=0, check_embedding_ctx_length=False,
+    )
+    engine = QAEngine(answer_cache=AnswerCache(), embedding_backend=ScheduledEmbeddings(client, model=EMBEDDING_MODEL))
+
+    async def main():
+        registry = service_options.pop("registry", lambda engine: None)(engine)
+        service = QAService(engine=engine, data_dir=str(tmp_path / "api_data"), registry=registry, **service_options)
+        async with TestClient(TestServer(create_app(service))) as client:
+            return await scenario(client)
+
+    return asyncio.run(main())
+
+
+async def upload_ready(client, pdf_bytes, name="manual.pdf"):
+    response = await client.post(f"/documents?name={name}", data=pdf_bytes, headers={"Content-Type": "application/pdf"})
+    assert response.status == 202
+    doc_id = (await response.json())["doc_id"]
+    for _ in range(200):
+        status = await (await client.get(f"/documents/{doc_id}")).json()
+        if status["status"] in ("ready", "failed"):
+            break
+        await asyncio.sleep(0.05)
+    assert status["status"] == "ready", status
+    assert status["chunk_count"] > 0
+    return doc_id
+
+
+def test_upload_and_query(tmp_path, fake_openai, pdf_bytes):
+    async def scenario(client):
+        doc_id = await upload_ready(client, pdf_bytes)
+        response = await client.post(f"/documents/{doc_id}/query", json={"question": "What is the maintenance interval?"})
+        assert response.status == 200
+        result = await response.json()
+        assert result["answer"] and result["doc_id"] == doc_id and result["pages"]
+
+        response = await client.post(f"/documents/{doc_id}/query", json={"question": "Interval?", "stream": True})
+        assert response.status == 200
+        events = await response.text()
+        assert "event: token" in events and "event: done" in events
+
+    run_with_client(tmp_path, fake_openai, scenario)
+    assert fake_openai.requests > 0
+
+
+def test_bad_query_bodies_are_rejected(tmp_path, fake_openai, pdf_bytes):
+    async def scenario(client):
+        doc_id = await upload_ready(client, pdf_bytes)
+        url = f"/documents/{doc_id}/query"
+        for body in ("not json", "[1, 2]", '"question"', "null"):
+            response = await client.post(url, data=body, headers={"Content-Type": "application/json"})
+            assert response.status == 400, body
+        for weight in ("heavy", None, [1], "NaN"):
+            response = await client.post(url, json={"question": "Interval?", "lexical_weight": weight})
+            assert response.status == 400, weight
+        response = await client.post(url, json={"question": "Interval?", "lexical_weight": 7})
+        assert response.status == 200
+        assert (await client.post(url, json={"question": ""})).status == 400
+        assert (await client.post("/documents/unknown/query", json={"question": "Interval?"})).status == 404
+        assert (await client.post("/documents", data=b"not a pdf")).status == 400
+
+    run_with_client(tmp_path, fake_openai, scenario)
+
+
+class RecordingOCRPool:
+    """OCR pool that records the pages queued for recognition"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, pdf_path, pages):
+        self.submitted.append(pages)
+        return None
+
+
+def with_blank_page(pdf_bytes):
+    document = fitz.open(stream=pdf_bytes, filetype="pdf")
+    document.new_page()
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def test_documents_are_served_from_the_registry(tmp_path, fake_openai, pdf_bytes):
+    ocr_pool = RecordingOCRPool()
+
+    def registry(engine):
+        return DocumentRegistry(
+            engine.embeddings, memory_budget=0, document_dir=str(tmp_path / "documents"), ocr_pool=ocr_pool
+        )
+
+    async def scenario(client):
+        service = client.app["service"]
+        first = await upload_ready(client, with_blank_page(pdf_bytes), "scanned.pdf")
+        second = await upload_ready(client, pdf_bytes, "manual.pdf")
+        # The page without a text layer was queued for OCR
+        assert ocr_pool.submitted == [[3]]
+
+        # Finished jobs expire; their documents stay listed and queryable
+        await asyncio.sleep(0.01)
+        listed = await (await client.get("/documents")).json()
+        assert service.jobs == {}
+        assert {document["doc_id"] for document in listed} == {first, second}
+        # Only the most recently used document stays loaded within the memory budget
+        assert service.registry.stats()["documents"] == 1
+        for doc_id in (first, second):
+            assert (await (await client.get(f"/documents/{doc_id}")).json())["status"] == "ready"
+            response = await client.post(f"/documents/{doc_id}/query", json={"question": "What is the maintenance interval?"})
+            assert response.status == 200
+        assert service.registry.stats()["documents"] == 1
+
+    run_with_client(tmp_path, fake_openai, scenario, registry=registry, job_ttl=0)
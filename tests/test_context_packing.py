@@ -0,0 +1,44 @@
+from langchain.docstore.document import Document
+
+from context_packing import remove_overlap
+
+TEXT = "".join(f"Sentence {i} talks about topic {i % 7} with enough words to matter.\n" for i in range(60))
+
+
+def chunk(start, end, doc_id="a", **metadata):
+    return Document(page_content=TEXT[start:end], metadata=dict(metadata, doc_id=doc_id, start_index=start, end_index=end))
+
+
+def test_overlapping_chunks_keep_only_new_text():
+    docs = [chunk(0, 900), chunk(700, 1600), chunk(1600, 2500)]
+    packed = remove_overlap(docs)
+    assert [doc.page_content for doc in packed] == [TEXT[0:900].strip(), TEXT[900:1600].strip(), TEXT[1600:2500].strip()]
+
+
+def test_chunk_inside_an_earlier_one_is_dropped():
+    assert len(remove_overlap([chunk(0, 900), chunk(100, 800)])) == 1
+
+
+def test_other_documents_are_not_trimmed():
+    docs = [chunk(0, 900), chunk(0, 900, doc_id="b")]
+    assert [doc.page_content for doc in remove_overlap(docs)] == [TEXT[0:900].strip(), TEXT[0:900].strip()]
+
+
+def test_offsets_that_do_not_span_the_text_are_not_trusted():
+    # Offsets one character past the previous chunk, as guessed for chunks the splitter rewrote
+    docs = [chunk(0, 900)]
+    for i, start in enumerate((700, 1500), 1):
+        docs.append(Document(page_content=TEXT[start:start + 900], metadata={"doc_id": "a", "start_index": i, "end_index": i + 900}))
+    packed = remove_overlap(docs)
+    assert [doc.page_content for doc in packed[1:]] == [doc.page_content for doc in docs[1:]]
+
+
+def test_offsets_whose_overlap_disagrees_are_not_trusted():
+    moved = Document(page_content=TEXT[1200:2100], metadata={"doc_id": "a", "start_index": 500, "end_index": 1400})
+    packed = remove_overlap([chunk(0, 900), moved])
+    assert [doc.page_content for doc in packed] == [TEXT[0:900].strip(), TEXT[1200:2100]]
+
+
+def test_untrusted_exact_duplicates_are_dropped():
+    duplicate = Document(page_content=TEXT[0:900], metadata={"doc_id": "a"})
+    assert len(remove_overlap([chunk(0, 900), duplicate])) == 1
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+import corpus
+from corpus import COMPRESSIONS, CorpusIndex, _compression_of, _index_type_of
+
+DIMS = 32
+CHUNKS_PER_DOC = 150
+
+
+def document_vectors(seed):
+    """Chunks of one document clustered around their own center"""
+    rng = np.random.default_rng(seed)
+    center = rng.normal(size=DIMS) * 4
+    return (center + rng.normal(size=(CHUNKS_PER_DOC, DIMS))).astype("float32")
+
+
+def add_documents(index, doc_ids):
+    vectors = {}
+    for seed, doc_id in enumerate(doc_ids):
+        vectors[doc_id] = document_vectors(seed)
+        index.add_document(
+            doc_id, f"{doc_id}.pdf",
+            [f"{doc_id} chunk {i}" for i in range(CHUNKS_PER_DOC)],
+            [{"pages": [i % 5]} for i in range(CHUNKS_PER_DOC)],
+            vectors=vectors[doc_id],
+        )
+    return vectors
+
+
+@pytest.fixture(autouse=True)
+def small_pq_training(monkeypatch):
+    # PQ codebooks need 256 training vectors; the default minimum assumes large corpora
+    monkeypatch.setattr(corpus, "PQ_MIN_TRAIN", 256)
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf"])
+def test_search_filter_remove_and_reopen(tmp_path, index_type, compression):
+    index = CorpusIndex(str(tmp_path), index_type=index_type, compression=compression)
+    vectors = add_documents(index, ["a", "b", "c"])
+    assert (_index_type_of(index.index), _compression_of(index.index)) == (index_type, compression)
+
+    # Compressed indexes rank approximately; re-ranking puts the exact match first
+    assert index.search_by_vector(vectors["b"][7], k=5)[0][0].page_content == "b chunk 7"
+
+    results = index.search_by_vector(vectors["a"][0], k=5, doc_ids=["c"])
+    assert len(results) == 5 and {doc.metadata["doc_id"] for doc, _ in results} == {"c"}
+    results = index.search_by_vector(vectors["a"][0], k=5, doc_ids=["a", "b"], pages=[3])
+    assert len(results) == 5
+    assert all(doc.metadata["doc_id"] in ("a", "b") and doc.metadata["pages"] == [3] for doc, _ in results)
+
+    index.remove_document("b")
+    assert not index.contains("b")
+    results = index.search_by_vector(vectors["b"][7], k=10)
+    assert len(results) == 10 and all(doc.metadata["doc_id"] != "b" for doc, _ in results)
+    assert index.search_by_vector(vectors["b"][7], k=3, doc_ids=["b"]) == []
+
+    reopened = CorpusIndex(str(tmp_path), index_type=index_type, compression=compression)
+    assert (_index_type_of(reopened.index), _compression_of(reopened.index)) == (index_type, compression)
+    assert [doc["doc_id"] for doc in reopened.documents()] == ["a", "c"]
+    assert reopened.search_by_vector(vectors["c"][42], k=5, pages=[2])[0][0].page_content == "c chunk 42"
+
+
+@pytest.mark.parametrize("index_type, compression", [("ivf", "none"), ("flat", "int8"), ("hnsw", "float16")])
+def test_trained_indexes_are_retrained_as_the_corpus_grows(tmp_path, index_type, compression):
+    index = CorpusIndex(str(tmp_path), index_type=index_type, compression=compression, retrain_growth=2)
+    add_documents(index, ["a"])
+    assert index.trained_on == CHUNKS_PER_DOC
+
+    add_documents(index, ["b"])
+    assert index.trained_on == 2 * CHUNKS_PER_DOC
+    # 3x is below twice the 2x it was last trained on
+    add_documents(index, ["c"])
+    assert index.trained_on == 2 * CHUNKS_PER_DOC
+    assert CorpusIndex(str(tmp_path), index_type=index_type, compression=compression).trained_on == 2 * CHUNKS_PER_DOC
+
+
+def test_untrained_indexes_are_not_rebuilt(tmp_path):
+    index = CorpusIndex(str(tmp_path), index_type="flat", compression="none")
+    add_documents(index, ["a"])
+    first = index.index
+    add_documents(index, ["b", "c"])
+    assert index.index is first and index.trained_on == 0
+
+
+def test_filters_are_looked_up_once_until_chunks_change(tmp_path, monkeypatch):
+    index = CorpusIndex(str(tmp_path), index_type="flat")
+    vectors = add_documents(index, ["a", "b"])
+    lookups = []
+    allowed_ids = index._allowed_ids
+    monkeypatch.setattr(index, "_allowed_ids", lambda *args: lookups.append(args) or allowed_ids(*args))
+
+    for _ in range(3):
+        results = index.search_by_vector(vectors["a"][0], k=3, doc_ids=["b", "c"], pages=[1])
+        assert {doc.metadata["doc_id"] for doc, _ in results} == {"b"}
+    assert len(lookups) == 1
+
+    add_documents(index, ["a", "b", "c"])
+    results = index.search_by_vector(vectors["a"][0], k=300, doc_ids=["b", "c"], pages=[1])
+    assert {doc.metadata["doc_id"] for doc, _ in results} == {"b", "c"} and len(lookups) == 2
+
+    index.remove_document("b")
+    results = index.search_by_vector(vectors["a"][0], k=300, doc_ids=["c", "b"], pages=[1])
+    assert {doc.metadata["doc_id"] for doc, _ in results} == {"c"} and len(lookups) == 3
@@ -0,0 +1,121 @@
+import os
+
+import fitz
+
+from document_registry import DocumentRegistry
+from index_cache import IndexCache
+from ingest import build_vector_store, update_vector_store
+from local_embeddings import HashingEmbeddings
+from ocr import OCRPool
+
+
+def make_pdf(text):
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), text)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def make_registry(tmp_path, max_bytes, grace_seconds=0):
+    embeddings = HashingEmbeddings()
+    registry = DocumentRegistry(
+        embeddings, index_cache=IndexCache(str(tmp_path / "index_cache"), max_bytes=max_bytes), memory_budget=0,
+        document_dir=str(tmp_path / "index_cache" / "documents"), ocr_pool=OCRPool(engine="none"),
+        grace_seconds=grace_seconds,
+    )
+    return registry, embeddings
+
+
+def build_with(embeddings):
+    def build(pdf_path):
+        vector_store, stats = build_vector_store(pdf_path, embeddings)
+        return vector_store, None, stats
+    return build
+
+
+def test_pdf_is_deleted_with_its_index_entry(tmp_path, pdf_bytes):
+    registry, embeddings = make_registry(tmp_path, max_bytes=1)
+    first = registry.open(pdf_bytes, "first.pdf", build_with(embeddings))
+    assert os.path.exists(first.pdf_path)
+
+    second = registry.open(make_pdf("A different document about pump maintenance."), "second.pdf", build_with(embeddings))
+
+    # Saving the second index evicted the first entry, and the memory budget evicted the first document
+    assert not registry.index_cache.contains(first.key)
+    assert not os.path.exists(first.pdf_path)
+    assert registry.get(first.doc_id) is None
+    assert os.path.exists(second.pdf_path)
+    assert os.listdir(registry.document_dir) == [os.path.basename(second.pdf_path)]
+
+
+def test_pdf_is_kept_while_its_index_entry_exists(tmp_path, pdf_bytes):
+    registry, embeddings = make_registry(tmp_path, max_bytes=1024 ** 3)
+    first = registry.open(pdf_bytes, "first.pdf", build_with(embeddings))
+    registry.open(make_pdf("A different document about pump maintenance."), "second.pdf", build_with(embeddings))
+
+    assert os.path.exists(first.pdf_path)
+    assert registry.get(first.doc_id).pdf_path == first.pdf_path
+
+
+def test_stale_pdfs_of_other_processes_are_deleted_after_the_grace_period(tmp_path, pdf_bytes):
+    registry, embeddings = make_registry(tmp_path, max_bytes=1024 ** 3, grace_seconds=60)
+    kept = registry.open(pdf_bytes, "kept.pdf", build_with(embeddings))
+    stale = os.path.join(registry.document_dir, "0" * 64 + ".pdf")
+    # Written by another process that is still building its index
+    indexing = os.path.join(registry.document_dir, "1" * 64 + ".pdf")
+    for path in (stale, indexing):
+        with open(path, "wb") as f:
+            f.write(b"%PDF-")
+    for path in (stale, kept.pdf_path):
+        os.utime(path, (0, 0))
+
+    make_registry(tmp_path, max_bytes=1024 ** 3, grace_seconds=60)
+
+    assert not os.path.exists(stale)
+    assert os.path.exists(indexing)
+    assert os.path.exists(kept.pdf_path)
+
+    # Once the grace period is over, the next save in any process removes it
+    os.utime(indexing, (0, 0))
+    registry.open(make_pdf("A different document about pump maintenance."), "second.pdf", build_with(embeddings))
+    assert not os.path.exists(indexing)
+
+
+class RecordingOCRPool:
+    """OCR pool that records the pages queued for recognition"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, pdf_path, pages):
+        self.submitted.append(pages)
+        return None
+
+
+def test_ocr_is_queued_again_after_a_revision_update(tmp_path, pdf_bytes):
+    ocr_pool = RecordingOCRPool()
+    embeddings = HashingEmbeddings()
+    registry = DocumentRegistry(
+        embeddings, index_cache=IndexCache(str(tmp_path / "index_cache")), memory_budget=0,
+        document_dir=str(tmp_path / "documents"), ocr_pool=ocr_pool,
+    )
+    scanned = fitz.open(stream=pdf_bytes, filetype="pdf")
+    scanned.new_page()
+    first = registry.open(scanned.tobytes(), "manual.pdf", build_with(embeddings))
+    assert registry.merge_page_texts(first.doc_id, {3: "Scanned appendix: replace the filter every month."}) > 0
+    assert registry.get(first.doc_id).meta["ocr_pages"] == [3]
+
+    scanned[0].insert_text((72, 400), "Revised: the maintenance interval is now 45 days.")
+    revision = scanned.tobytes()
+    scanned.close()
+
+    def update(pdf_path):
+        vector_store, _, meta = registry.index_cache.load(first.key, embeddings)
+        vector_store, stats = update_vector_store(pdf_path, vector_store, meta["page_hashes"], embeddings)
+        return vector_store, None, stats
+
+    second = registry.open(revision, "manual.pdf", update)
+    assert not any(doc.metadata.get("ocr") for doc in second.vector_store.docstore._dict.values())
+    assert "ocr_pages" not in second.meta
+    assert ocr_pool.submitted == [[3], [3]]
@@ -0,0 +1,15 @@
+from embedding_cache import CachedEmbeddings
+from local_embeddings import HashingEmbeddings
+
+
+def test_views_share_the_connection_and_keep_their_own_stats(tmp_path):
+    cache = CachedEmbeddings(HashingEmbeddings(), model="hashing", db_path=str(tmp_path / "embeddings.sqlite3"))
+    first, second = cache.with_own_stats(), cache.with_own_stats()
+    assert first._conn is cache._conn and second._conn is cache._conn
+
+    vectors = first.embed_documents(["pump maintenance", "valve inspection"])
+    assert second.embed_documents(["pump maintenance", "valve inspection"]) == vectors
+
+    assert (first.stats()["hits"], first.stats()["misses"]) == (0, 2)
+    assert (second.stats()["hits"], second.stats()["misses"]) == (2, 0)
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (0, 0)
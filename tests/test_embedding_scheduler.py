@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+from langchain_openai import OpenAIEmbeddings
+
+import embedding_scheduler
+from embedding_scheduler import ScheduledEmbeddings, TokenBucket
+from fake_servers import FakeOpenAIServer, fake_embedding
+
+MODEL = "text-embedding-ada-002"
+DIMS = 8
+
+
+class TrackingEmbeddings:
+    """Wraps an embeddings client, recording batch sizes and the most concurrent calls"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.batches = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.batches.append(len(texts))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return self.embeddings.embed_documents(texts)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class FlakyEmbeddings:
+    """Fails the first `failures` calls with a 503 that carries no Retry-After"""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def embed_documents(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise ServerError("service unavailable")
+        return [[1.0] for _ in texts]
+
+
+def client(server):
+    return OpenAIEmbeddings(
+        model=MODEL, openai_api_key="test", base_url=server.base_url, max_retries=0, check_embedding_ctx_length=False
+    )
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Seconds the scheduler slept between retries, without actually sleeping"""
+    slept = []
+    monkeypatch.setattr(embedding_scheduler.time, "sleep", slept.append)
+    return slept
+
+
+def test_rate_limited_requests_are_retried_after_retry_after(sleeps):
+    texts = [f"chunk {i}" for i in range(40)]
+    with FakeOpenAIServer(error_rate=0.4, dims=DIMS, seed=3) as server:
+        embeddings = ScheduledEmbeddings(
+            client(server), MODEL, batch_size=4, max_in_flight=4, tokens_per_minute=0, max_retries=50
+        )
+        vectors = embeddings.embed_documents(texts)
+
+    assert server.errors > 0
+    assert [pytest.approx(vector) for vector in vectors] == [fake_embedding(text, DIMS) for text in texts]
+    # Every failed attempt of a batch stops at its first 429
+    assert embeddings.stats["retries"] == server.errors
+    assert embeddings.stats["requests"] == len(texts) // 4 + server.errors
+    # The fake server answers 429 with Retry-After: 0.05
+    assert sleeps == [0.05] * server.errors
+
+
+def test_backoff_without_retry_after_is_exponential_with_jitter(sleeps):
+    embeddings = ScheduledEmbeddings(FlakyEmbeddings(failures=4), MODEL, tokens_per_minute=0, base_delay=1.0, max_delay=5.0)
+
+    assert embeddings.embed_documents(["text"]) == [[1.0]]
+    # Delays of 1, 2, 4 and 5 (capped) seconds, each jittered into its upper half
+    for delay, cap in zip(sleeps, (1, 2, 4, 5)):
+        assert cap / 2 <= delay <= cap
+    assert embeddings.stats["retries"] == 4
+
+
+def test_retries_give_up_after_max_retries(sleeps):
+    embeddings = ScheduledEmbeddings(FlakyEmbeddings(failures=10), MODEL, tokens_per_minute=0, max_retries=2)
+
+    with pytest.raises(ServerError):
+        embeddings.embed_documents(["text"])
+    assert len(sleeps) == 2
+
+
+def test_batches_take_their_tokens_from_the_budget():
+    texts = ["x" * 400] * 6
+    with FakeOpenAIServer(dims=DIMS) as server:
+        backend = TrackingEmbeddings(client(server))
+        # 12000 tokens per minute refill 200 per second
+        embeddings = ScheduledEmbeddings(backend, MODEL, batch_size=2, max_in_flight=1, tokens_per_minute=12000)
+        embeddings.bucket = TokenBucket(12000)
+        tokens_per_batch = 2 * embeddings.count_tokens(texts[0])
+        embeddings.bucket.tokens = tokens_per_batch
+
+        started = time.perf_counter()
+        embeddings.embed_documents(texts)
+        elapsed = time.perf_counter() - started
+
+    assert backend.batches == [2, 2, 2]
+    assert embeddings.stats["tokens"] == 3 * tokens_per_batch
+    # Only the first batch fits the initial budget; the other two wait for refills
+    expected_wait = 2 * tokens_per_batch / 200
+    assert embeddings.stats["throttled_seconds"] == pytest.approx(expected_wait, rel=0.25)
+    assert elapsed >= expected_wait * 0.9
+
+
+def test_requests_in_flight_are_limited():
+    texts = [f"chunk {i}" for i in range(12)]
+    with FakeOpenAIServer(latency=0.1, dims=DIMS) as server:
+        backend = TrackingEmbeddings(client(server))
+        embeddings = ScheduledEmbeddings(backend, MODEL, batch_size=1, max_in_flight=3, tokens_per_minute=0)
+
+        started = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        elapsed = time.perf_counter() - started
+
+    assert len(vectors) == len(texts)
+    assert backend.peak == 3
+    # Twelve 0.1 s requests, three at a time
+    assert 0.4 <= elapsed < 1.2
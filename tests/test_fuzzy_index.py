@@ -0,0 +1,38 @@
+from benchmarks.synthetic import make_synthetic_pdf
+from fuzzy_index import ParagraphIndex
+from highlight_cache import HighlightCache
+from ingest import get_text_splitter, iter_chunks
+from pdfutils import extract_pages, find_page_and_highlight
+
+
+def test_chunks_of_dense_multi_paragraph_pages_match_their_paragraphs(tmp_path):
+    pdf_path = str(tmp_path / "dense.pdf")
+    content = make_synthetic_pdf(pdf_path, pages=20, paragraphs_per_page=8, words_per_paragraph=30)
+    index = ParagraphIndex.from_pdf(pdf_path)
+    chunks = list(iter_chunks(extract_pages(pdf_path), get_text_splitter()))
+
+    for text, metadata in chunks:
+        matches = index.best_matches(text, pages=metadata["pages"])
+        assert matches and set(matches) <= set(metadata["pages"])
+        for page_num, paragraphs in matches.items():
+            assert all(paragraph in content[page_num] for paragraph in paragraphs)
+
+
+def test_a_chunk_highlights_every_paragraph_it_covers(tmp_path):
+    pdf_path = str(tmp_path / "dense.pdf")
+    content = make_synthetic_pdf(pdf_path, pages=2, paragraphs_per_page=8, words_per_paragraph=30)
+    chunk = " ".join(content[1][2:5])
+
+    matches = ParagraphIndex.from_pdf(pdf_path).best_matches(chunk)
+
+    assert matches == {1: content[1][2:5]}
+    rendered, pages = find_page_and_highlight(pdf_path, chunk, cache=HighlightCache(str(tmp_path / "highlights")))
+    assert pages == [1] and len(rendered) == 1
+
+
+def test_a_quoted_sentence_matches_its_paragraph(tmp_path):
+    pdf_path = str(tmp_path / "dense.pdf")
+    content = make_synthetic_pdf(pdf_path, pages=3, paragraphs_per_page=4, words_per_paragraph=60)
+    sentence = " ".join(content[2][1].split()[10:25])
+
+    assert ParagraphIndex.from_pdf(pdf_path).best_matches(sentence) == {2: [content[2][1]]}
@@ -0,0 +1,80 @@
+from langchain.vectorstores import FAISS
+
+import pdfutils
+from ingest import add_page_texts, build_vector_store, get_text_splitter, iter_chunks, update_vector_store
+from local_embeddings import HashingEmbeddings
+
+
+def make_pages(count, seed=0):
+    """Page texts with runs of blank lines between paragraphs, as PDF extraction produces"""
+    pages = []
+    for page_num in range(count):
+        paragraphs = [
+            f"Section {page_num}.{i} covers item {seed}-{page_num}-{i} in some detail with plain words."
+            for i in range(8)
+        ]
+        pages.append("\n\n\n".join(paragraphs) + "\n\n")
+    return pages
+
+
+def assert_provenance(chunk, metadata, pages):
+    text = "".join(pages)
+    start, end = metadata["start_index"], metadata["end_index"]
+    assert text[start:end] == chunk
+    for page_num, span_start, span_end in metadata["page_spans"]:
+        assert pages[page_num][span_start:span_end] in chunk
+    page_starts = [sum(len(page) for page in pages[:page_num]) for page_num in range(len(pages))]
+    expected = [
+        page_num for page_num, page_start in enumerate(page_starts)
+        if page_start < end and start < page_start + len(pages[page_num])
+    ]
+    assert metadata["pages"] == expected
+
+
+def test_iter_chunks_offsets_with_blank_lines():
+    pages = make_pages(20)
+    chunks = list(iter_chunks(pages, get_text_splitter(), window=2000))
+    assert len(chunks) > 8
+    for chunk, metadata in chunks:
+        assert_provenance(chunk, metadata, pages)
+
+
+def test_iter_chunks_leaves_out_provenance_of_unlocatable_chunks():
+    class RewritingSplitter:
+        def split_text(self, text):
+            return [text.upper()]
+
+    [(chunk, metadata)] = list(iter_chunks(["some text"], RewritingSplitter()))
+    assert chunk == "SOME TEXT"
+    assert metadata == {}
+
+
+def test_add_page_texts_spans_with_blank_lines():
+    embeddings = HashingEmbeddings(dims=64, threads=1)
+    vector_store = FAISS.from_texts(["seed"], embeddings)
+    page_text = make_pages(3)[1] * 4
+    added = add_page_texts(vector_store, {5: page_text}, embeddings)
+    docs = [vector_store.docstore.search(docstore_id) for docstore_id in vector_store.index_to_docstore_id.values()][1:]
+    assert len(docs) == added > 1
+    for doc in docs:
+        [[page_num, start, end]] = doc.metadata["page_spans"]
+        assert page_num == 5 and doc.metadata["pages"] == [5]
+        assert page_text[start:end] == doc.page_content
+
+
+def test_update_vector_store_offsets_with_blank_lines(monkeypatch):
+    embeddings = HashingEmbeddings(dims=64, threads=1)
+    old_pages = make_pages(12)
+    new_pages = list(old_pages)
+    new_pages[4] = make_pages(1, seed=1)[0]
+    revisions = {"old.pdf": old_pages, "new.pdf": new_pages}
+    monkeypatch.setattr(pdfutils, "count_pages", lambda pdf_file: len(revisions[pdf_file]))
+    monkeypatch.setattr(pdfutils, "iter_pages", lambda pdf_file, workers=None: iter(revisions[pdf_file]))
+    monkeypatch.setattr(pdfutils, "extract_pages", lambda pdf_file, workers=None: revisions[pdf_file])
+
+    vector_store, stats = build_vector_store("old.pdf", embeddings)
+    vector_store, stats = update_vector_store("new.pdf", vector_store, stats["page_hashes"], embeddings)
+    assert stats["changed_pages"] == [4] and stats["added_chunks"] > 0
+    for docstore_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(docstore_id)
+        assert_provenance(doc.page_content, doc.metadata, new_pages)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from local_embeddings import HashingEmbeddings, onnx_model_key
+
+TEXTS = ["The pump is serviced every 30 days.", "Valves are inspected yearly.", "", "pump pump pump"]
+
+
+@pytest.mark.parametrize("dims", [16, 1024])
+def test_hashing_vectors_have_the_configured_dimension_and_unit_length(dims):
+    embeddings = HashingEmbeddings(dims=dims, threads=1)
+    vectors = np.array(embeddings.embed_documents(TEXTS))
+
+    assert vectors.shape == (len(TEXTS), dims)
+    assert np.allclose(np.linalg.norm(vectors[[0, 1, 3]], axis=1), 1.0, atol=1e-6)
+    # Text without terms embeds to the zero vector
+    assert not vectors[2].any()
+    assert embeddings.model == f"hashing-{dims}"
+
+
+def test_hashing_is_deterministic_across_instances_batches_and_threads():
+    single = HashingEmbeddings(dims=64, threads=1, batch_size=256)
+    batched = HashingEmbeddings(dims=64, threads=4, batch_size=1)
+    texts = TEXTS * 3
+
+    assert single.embed_documents(texts) == single.embed_documents(texts)
+    assert np.allclose(single.embed_documents(texts), batched.embed_documents(texts))
+    assert single.embed_query(TEXTS[0]) == pytest.approx(batched.embed_documents(TEXTS)[0])
+
+
+def test_onnx_model_key_changes_with_the_model_file_and_quantization(tmp_path):
+    model_dir = tmp_path / "all-MiniLM-L6-v2"
+    model_dir.mkdir()
+    (model_dir / "tokenizer.json").write_text("{}")
+    (model_dir / "model.onnx").write_bytes(b"weights v1")
+
+    key = onnx_model_key(str(model_dir), False, 256)
+    assert key.startswith("onnx-all-MiniLM-L6-v2-") and key == onnx_model_key(str(model_dir) + "/", False, 256)
+    quantized = onnx_model_key(str(model_dir), True, 256)
+    assert quantized.endswith("-int8") and quantized[:-len("-int8")] != key
+
+    (model_dir / "model.onnx").write_bytes(b"weights v2")
+    assert onnx_model_key(str(model_dir), False, 256) != key
@@ -0,0 +1,41 @@
+import fitz
+
+import ocr
+
+RECOGNIZED = []
+
+
+def recording_engine(png_bytes):
+    RECOGNIZED.append(len(png_bytes))
+    return f"recognized page {len(RECOGNIZED)}"
+
+
+def make_scanned_pdf(path, shades):
+    document = fitz.open()
+    for shade in shades:
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 40), False)
+        pixmap.clear_with(shade)
+        document.new_page().insert_image(fitz.Rect(72, 72, 272, 272), pixmap=pixmap)
+    document.save(str(path))
+    document.close()
+
+
+def test_cached_pages_are_not_rasterized(tmp_path, monkeypatch):
+    RECOGNIZED.clear()
+    rasterized = []
+    get_pixmap = fitz.Page.get_pixmap
+    monkeypatch.setattr(fitz.Page, "get_pixmap", lambda page, *args, **kwargs: rasterized.append(page.number) or get_pixmap(page, *args, **kwargs))
+    first, revision = tmp_path / "first.pdf", tmp_path / "revision.pdf"
+    make_scanned_pdf(first, [40, 120])
+    # The revision inserts a page before the unchanged ones
+    make_scanned_pdf(revision, [200, 40, 120])
+    engine, cache_path = "test_ocr:recording_engine", str(tmp_path / "ocr.sqlite3")
+
+    results = [ocr._ocr_page(str(first), page_num, engine, 72, cache_path) for page_num in range(2)]
+    assert [cached for _, _, cached in results] == [False, False] and rasterized == [0, 1]
+
+    rasterized.clear()
+    results = [ocr._ocr_page(str(revision), page_num, engine, 72, cache_path) for page_num in range(3)]
+    assert [text for _, text, _ in results] == ["recognized page 3", "recognized page 1", "recognized page 2"]
+    assert [cached for _, _, cached in results] == [False, True, True]
+    assert rasterized == [0] and len(RECOGNIZED) == 3
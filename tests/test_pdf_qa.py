@@ -0,0 +1,122 @@
+import importlib
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from langchain.vectorstores import FAISS
+
+from index_cache import IndexCache, cache_key
+from ingest import index_settings
+from lexical_index import BM25Index
+from local_embeddings import HashingEmbeddings
+
+TEXTS = ["The pump is serviced every 30 days.", "Valves are inspected yearly."]
+
+
+class FakeOCRJob:
+    """Hands out pre-recognized pages one batch per take_ready() call"""
+
+    def __init__(self, batches, pages):
+        self.batches = list(batches)
+        self.pages = pages
+        self.done = 0
+        self.finished = None
+
+    def take_ready(self):
+        page_texts = self.batches.pop(0) if self.batches else {}
+        self.done += len(page_texts)
+        return page_texts
+
+
+@pytest.fixture
+def pdf_qa(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    return importlib.import_module("pdf_qa")
+
+
+@pytest.fixture
+def merger_for(tmp_path, pdf_bytes):
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(pdf_bytes)
+    embeddings = HashingEmbeddings()
+    engine = SimpleNamespace(embeddings=embeddings, index_settings=index_settings("hashing"))
+    key = cache_key(pdf_bytes, engine.index_settings)
+
+    def make(pdf_qa, job):
+        vector_store = FAISS.from_texts(TEXTS, embeddings, metadatas=[{"page": 0}, {"page": 1}])
+        meta = {"textless_pages": [2, 3]}
+        return pdf_qa.OCRMerger(job, str(pdf_path), vector_store, BM25Index.from_texts(TEXTS), meta, engine), key
+    return make
+
+
+def saved_ocr_pages(key):
+    cached = IndexCache().load(key, HashingEmbeddings())
+    return cached[2].get("ocr_pages") if cached is not None else None
+
+
+def test_pages_merged_before_the_job_finished_are_saved_when_it_finishes(pdf_qa, merger_for):
+    job = FakeOCRJob([{2: "Page three was scanned: the filter is replaced monthly."}], pages=[2, 3])
+    merger, key = merger_for(pdf_qa, job)
+
+    assert merger.merge() == 1
+    assert saved_ocr_pages(key) is None
+
+    # The last call has nothing new but the job is now finished
+    job.finished = True
+    assert merger.merge() == 0
+    assert saved_ocr_pages(key) == [2]
+
+
+def test_merged_pages_are_saved_when_the_session_ends_first(pdf_qa, merger_for):
+    job = FakeOCRJob(
+        [{2: "Page three was scanned: the filter is replaced monthly."}, {3: "Page four: belts are checked weekly."}],
+        pages=[2, 3, 4],
+    )
+    merger, key = merger_for(pdf_qa, job)
+
+    merger.merge()
+    merger.finish()
+
+    assert saved_ocr_pages(key) == [2, 3]
+    assert merger.unsaved == 0
+
+
+def test_batch_answers_go_to_the_output_stream_and_progress_to_stderr(pdf_qa, capsys):
+    def answer(retriever, question, doc_key=None):
+        if not question:
+            raise ValueError("empty question")
+        return {"answer": question.upper(), "pages": [0], "relevant_chunks": [], "cache_match": None, "timings": {}}
+    output = io.StringIO()
+
+    failed = pdf_qa.run_batch(SimpleNamespace(answer=answer), None, "doc", [(1, "first"), (2, ""), (3, "third")], output)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["id"] for record in records] == [1, 2, 3]
+    assert records[0]["answer"] == "FIRST" and "error" in records[1]
+    assert failed == 1
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "Answered 2/3 questions" in captured.err
+
+
+def test_malformed_question_lines_are_skipped_with_their_line_number(pdf_qa, capsys):
+    lines = [
+        '{"id": "q1", "question": "How often is the pump serviced?"}',
+        '{"id": "q2", "question": ',
+        "",
+        '{"id": "q3", "query": "Missing the question key"}',
+        "When are valves inspected?",
+    ]
+
+    assert pdf_qa.read_questions(lines) == [("q1", "How often is the pump serviced?"), (5, "When are valves inspected?")]
+    errors = capsys.readouterr().err
+    assert "line 2" in errors and "line 4" in errors
+
+
+@pytest.mark.parametrize("value", ["-0.1", "1.5", "nan", "heavy"])
+def test_lexical_weight_outside_zero_to_one_is_rejected(pdf_qa, value):
+    with pytest.raises(pdf_qa.argparse.ArgumentTypeError):
+        pdf_qa.weight(value)
+    assert pdf_qa.weight("0.25") == 0.25
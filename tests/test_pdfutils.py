@@ -0,0 +1,30 @@
+import os
+
+import pdfutils
+from benchmarks.synthetic import make_synthetic_pdf
+from highlight_cache import HighlightCache
+from pdfutils import find_highlights, render_highlights
+
+
+def test_matches_are_found_once_and_pages_rendered_on_demand(tmp_path, monkeypatch):
+    pdf_path = str(tmp_path / "dense.pdf")
+    content = make_synthetic_pdf(pdf_path, pages=3, paragraphs_per_page=8, words_per_paragraph=30)
+    cache = HighlightCache(str(tmp_path / "highlights"))
+    renders = []
+    render_page = pdfutils._render_page
+    monkeypatch.setattr(pdfutils, "_render_page", lambda *args: renders.append(args[3]) or render_page(*args))
+
+    hits = find_highlights(pdf_path, " ".join(content[2][3:6]), pages=[2])
+
+    assert [page_num for page_num, _ in hits] == [2]
+    assert len(hits[0][1]) >= 3
+    assert renders == [] and cache.entries() == []
+
+    previews = render_highlights(pdf_path, hits, doc_id="doc", cache=cache)
+    assert renders == ["png"]
+    assert render_highlights(pdf_path, hits, doc_id="doc", cache=cache) == previews
+    assert renders == ["png"]
+
+    [(page_num, page_pdf)] = render_highlights(pdf_path, hits, doc_id="doc", fmt="pdf", cache=cache)
+    assert renders == ["png", "pdf"]
+    assert page_num == 2 and page_pdf.endswith(".pdf") and os.path.exists(page_pdf)